@@ -0,0 +1,44 @@
+#!/usr/bin/python
+
+# compares the pyparsing engine of cpp_parser.scan_definitions with the token
+# engine (cpp_token_parser) and checks that both find the same definitions
+
+import sys; sys.path.append('..')
+
+import contextlib
+import io
+
+import cpp_lang
+import cpp_parser
+
+from synthetic import Generator, best_of
+
+
+def extract(source, engine):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [ (cpp_lang.structure(definition), start, end)
+                 for (definition, start, end) in cpp_parser.extract_definitions(source, engine) ]
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the token engine against the pyparsing engine'
+    )
+    parser.add_argument('--classes', type=int, default=50)
+    parser.add_argument('--repeat',  type=int, default=3)
+    parser.add_argument('--seed',    type=int, default=0)
+    args = parser.parse_args()
+
+    print('%15s %10s %14s %12s %10s' % ('template depth', 'bytes', 'pyparsing [s]', 'tokens [s]', 'speedup'))
+    for depth in [1, 2, 3, 4]:
+        source = Generator(seed=args.seed, classes=args.classes, template_depth=depth).header()
+        (t_pp,     res_pp    ) = best_of(args.repeat, lambda: extract(source, 'pyparsing'))
+        (t_tokens, res_tokens) = best_of(args.repeat, lambda: extract(source, 'tokens'))
+
+        if res_pp != res_tokens:
+            print('MISMATCH: the engines found different definitions (template depth %d)' % depth)
+
+        print('%15d %10d %14.3f %12.3f %9.1fx' % (depth, len(source), t_pp, t_tokens, t_pp / t_tokens))
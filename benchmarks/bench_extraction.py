@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+# compares the single-pass extraction of definitions with stripping the source
+# and searching it once per kind of definition
+#
+# both have to find the same definitions at the same offsets: the check runs the
+# single pass on the stripped source as well (the offsets of the three passes
+# are those of the stripped source)
+
+import sys; sys.path.append('..')
+
+import cpp_lang
+import cpp_parser
+
+from synthetic import Generator, best_of
+
+
+def strip(source):
+    return (cpp_parser.comment | cpp_parser.preprocessor).suppress().transformString(source)
+
+def three_pass(source):
+    stripped_source = strip(source)
+    class_finds = cpp_parser.hierarchical_type_def.scanString(stripped_source)
+    typedef_finds = cpp_parser.type_def.scanString(stripped_source)
+    return [ (tokens[0], start, end) for (tokens, start, end) in class_finds ] \
+         + [ (tokens[0], start, end) for (tokens, start, end) in typedef_finds ]
+
+def single_pass(source):
+    return list(cpp_parser.scan_definitions(source))
+
+def structures(definitions):
+    return sorted((start, end, cpp_lang.structure(definition)) for (definition, start, end) in definitions)
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the single-pass extraction against strip + scanString'
+    )
+    parser.add_argument('--classes', type=int, default=50)
+    parser.add_argument('--repeat',  type=int, default=3)
+    parser.add_argument('--seed',    type=int, default=0)
+    args = parser.parse_args()
+
+    source = Generator(seed=args.seed, classes=args.classes).header()
+    print('%d classes, %d bytes' % (args.classes, len(source)))
+
+    (t_three,  res_three ) = best_of(args.repeat, lambda: three_pass(source))
+    (t_single, res_single) = best_of(args.repeat, lambda: single_pass(source))
+
+    mismatches = 0
+    if structures(res_three) != structures(single_pass(strip(source))):
+        mismatches += 1
+        print('MISMATCH: three passes found other definitions (%d) than the single pass (%d)' % (len(res_three), len(res_single)))
+
+    print('strip + 2x scanString %8.3fs   single pass %8.3fs   speedup %6.1fx   (%d definitions)'
+            % (t_three, t_single, t_three / t_single, len(res_single)))
+
+    sys.exit(1 if mismatches else 0)
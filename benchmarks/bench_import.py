@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+# startup cost of cpp_parser: cold imports in new interpreters
+#
+# every statement is run in a new process (best of --repeat), the time of an
+# empty interpreter is given for reference. Importing cpp_parser does not
+# build the grammar (see cpp_parser.grammar), which the first parse with the
+# pyparsing engine does; the eager import of the former module corresponds to
+# 'import + grammar'.
+
+import sys; sys.path.append('..')
+
+import os
+import subprocess
+import tempfile
+import time
+
+from synthetic import Generator
+
+
+package_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# bytecode is written (and used) regardless of PYTHONDONTWRITEBYTECODE, the
+# first run of each statement only fills the cache
+def cold_run(statement, repeat=5):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [ sys.executable, '-c', 'import sys; sys.path.insert(0, %r); %s' % (package_dir, statement) ]
+
+    subprocess.check_call(command, env=env)
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.check_call(command, env=env)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+# the modules imported by statement, slowest first: (cumulative seconds, name)
+def import_profile(statement):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [ sys.executable, '-X', 'importtime', '-c', 'import sys; sys.path.insert(0, %r); %s' % (package_dir, statement) ]
+    output = subprocess.run(command, env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+
+    res = []
+    for line in output.split('\n'):
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        res.append((int(fields[1]) * 1e-6, fields[2].rstrip()))
+    return sorted(res, reverse=True)
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the cold import of cpp_parser and the first parse'
+    )
+    parser.add_argument('--repeat',  type=int, default=5)
+    parser.add_argument('--classes', type=int, default=1, help='classes of the header parsed first')
+    parser.add_argument('--modules', type=int, default=0, help='show the slowest imports of cpp_parser')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'header.h')
+    with open(path, 'w') as f:
+        f.write(Generator(seed=0, classes=args.classes).header())
+
+    statements = [
+        ('interpreter',             'pass'),
+        ('import pyparsing',        'import pyparsing'),
+        ('import cpp_parser',       'import cpp_parser'),
+        ('import + grammar',        'import cpp_parser; cpp_parser.grammar()'),
+        ('first parse (tokens)',    'import cpp_parser; cpp_parser.extract_definitions(open(%r).read(), "tokens")' % path),
+        ('first parse (pyparsing)', 'import cpp_parser; cpp_parser.extract_definitions(open(%r).read())' % path)
+    ]
+    try:
+        times = {}
+        for (name, statement) in statements:
+            times[name] = cold_run(statement, args.repeat)
+            print('%-24s %7.1fms  %+7.1fms' % (name, 1000 * times[name], 1000 * (times[name] - times['interpreter'])))
+
+        startup = times['import cpp_parser'] - times['interpreter']
+        eager = times['import + grammar'] - times['interpreter']
+        print('import of cpp_parser without the grammar: %.0f%% of the eager import' % (100 * startup / eager))
+
+        if args.modules:
+            print('')
+            for (dt, name) in import_profile('import cpp_parser')[:args.modules]:
+                print('%7.1fms %s' % (1000 * dt, name))
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
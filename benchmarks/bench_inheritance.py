@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+# inheritance graph (cpp_inheritance): queries answered from the precomputed
+# closure against walking the base classes of the symbol index, and the
+# incremental update of a reparsed file against building the graph again
+#
+# the project is generated as definitions (a random hierarchy with multiple
+# inheritance across files); after every update the graph is checked against
+# one built from scratch
+
+import sys; sys.path.append('..')
+
+import random
+import time
+
+import cpp_index
+import cpp_inheritance
+
+from cpp_lang import CppHierarchicalTypeDefinition, CppInheritance
+
+from synthetic import best_of
+
+
+# the classes of a file: (name, base names) with bases among the previous
+# classes, and an occasional unknown base
+def file_classes(rnd, f, classes, previous):
+    res = []
+    for c in range(classes):
+        name = 'F%dClass%d' % (f, c)
+        bases = rnd.sample(previous, min(len(previous), rnd.randrange(3))) if previous else []
+        if rnd.random() < 0.02:
+            bases.append('External%d' % rnd.randrange(10))
+        res.append((name, bases))
+        previous.append(name)
+    return res
+
+def definitions(classes):
+    return [ (CppHierarchicalTypeDefinition(CppHierarchicalTypeDefinition.CLASS, name,
+                                            [ CppInheritance(base) for base in bases ]), i * 10, i * 10 + 9)
+             for (i, (name, bases)) in enumerate(classes) ]
+
+def state(graph):
+    return (graph.base_sets, graph.unknown, graph.derived_sets, graph.ancestor_sets,
+            dict((name, descendants) for (name, descendants) in graph.descendant_sets.items() if descendants),
+            graph.cycle_of)
+
+# ancestor check by walking the base classes
+def walk_is_derived(index, name, base):
+    seen = set()
+    todo = [ name ]
+    while todo:
+        for symbol in index.lookup(todo.pop()):
+            for written in symbol.bases:
+                resolved = index.resolve(written, symbol.scope)
+                if resolved == base:
+                    return True
+                if resolved is not None and resolved not in seen:
+                    seen.add(resolved)
+                    todo.append(resolved)
+    return False
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='check and benchmark the inheritance graph'
+    )
+    parser.add_argument('--files',   type=int, default=200)
+    parser.add_argument('--classes', type=int, default=20, help='classes per file')
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--updates', type=int, default=20)
+    parser.add_argument('--seed',    type=int, default=0)
+    parser.add_argument('--repeat',  type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    previous = []
+    files = [ file_classes(rnd, f, args.classes, previous) for f in range(args.files) ]
+
+    index = cpp_index.SymbolIndex()
+    for (f, classes) in enumerate(files):
+        index.add_file('file%d.h' % f, definitions(classes))
+
+    (t_build, graph) = best_of(args.repeat, lambda: cpp_inheritance.InheritanceGraph(index))
+    print('%d classes, %d unknown bases, build %.3fs' % (len(graph.base_sets), len(graph.unknown_bases()), t_build))
+
+    pairs = [ (rnd.choice(previous), rnd.choice(previous)) for i in range(args.queries) ]
+    (t_walk, res_walk) = best_of(1, lambda: [ walk_is_derived(index, a, b) for (a, b) in pairs ])
+    (t_graph, res_graph) = best_of(args.repeat, lambda: [ graph.is_derived(a, b) for (a, b) in pairs ])
+    print('%d is_derived queries: walk %.3fs, closure %.4fs (%.0fx)' % (args.queries, t_walk, t_graph, t_walk / t_graph))
+
+    mismatches = 0 if res_walk == res_graph else 1
+    if mismatches:
+        print('MISMATCH: is_derived differs from the walk')
+
+    # reparsed files: changed bases, a cycle, removed and added files
+    t_update = 0.0
+    t_rebuild = 0.0
+    for u in range(args.updates):
+        f = rnd.randrange(args.files)
+        path = 'file%d.h' % f
+        classes = [ (name, rnd.sample(previous, rnd.randrange(3))) for (name, bases) in files[f] ]
+        # a class deriving from one of its descendants closes a cycle
+        descendants = sorted(graph.descendants(classes[0][0]))
+        if u % 5 == 2 and descendants:
+            classes[0][1].append(rnd.choice(descendants))
+        new_definitions = None if u % 5 == 4 else definitions(classes)
+
+        t0 = time.perf_counter()
+        graph.update_file(path, new_definitions)
+        t_update += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        fresh = cpp_inheritance.InheritanceGraph(index)
+        t_rebuild += time.perf_counter() - t0
+
+        if state(graph) != state(fresh):
+            mismatches += 1
+            print('MISMATCH: update %d of %s' % (u, path))
+
+    print('%d updates: incremental %.3fs, rebuild %.3fs (%.1fx), %d cycles'
+          % (args.updates, t_update, t_rebuild, t_rebuild / t_update, len(graph.cycles())))
+
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+
+# extraction of class definitions with template-heavy member declarations
+#
+# reports the time and how often the shared prefix of the member declarations
+# (the type expression) is attempted
+
+import sys; sys.path.append('..')
+
+import contextlib
+import io
+
+import cpp_parser
+import cpp_profiler
+
+from synthetic import Generator, best_of
+
+
+def type_expression_attempts(source):
+    with cpp_profiler.GrammarProfiler() as profiler:
+        cpp_parser.extract_definitions(source)
+    return profiler.stats['type_expression'].attempts
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the member declarations on template-heavy headers'
+    )
+    parser.add_argument('--classes', type=int, default=50)
+    parser.add_argument('--repeat',  type=int, default=3)
+    parser.add_argument('--seed',    type=int, default=0)
+    args = parser.parse_args()
+
+    print('%15s %10s %12s %16s' % ('template depth', 'bytes', 'time [s]', 'type attempts'))
+    for depth in [1, 2, 3, 4]:
+        source = Generator(seed=args.seed, classes=args.classes, template_depth=depth).header()
+        with contextlib.redirect_stdout(io.StringIO()):
+            (t, res) = best_of(args.repeat, lambda: cpp_parser.extract_definitions(source))
+            attempts = type_expression_attempts(source)
+        print('%15d %10d %12.3f %16d' % (depth, len(source), t, attempts))
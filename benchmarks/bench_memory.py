@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+# memory footprint of the cpp_lang model of a synthetic code base
+#
+# the objects are constructed directly (like the builders do), so the numbers
+# only reflect the representation of the model and not the parser
+
+import sys; sys.path.append('..')
+
+import random
+import tracemalloc
+
+from cpp_lang import *
+
+
+base_types = ['int', 'unsigned int', 'double', 'float', 'char', 'bool', 'long']
+
+def type_expression(rnd, i):
+    kind = rnd.randrange(4)
+    if kind == 0 or i == 0:
+        return CppTypeExpression(rnd.choice(base_types), 0, ())
+    elif kind == 1:
+        return CppTypeExpression('Class%d' % rnd.randrange(i), 0, ())
+    elif kind == 2:
+        inner = CppTypeExpression('Class%d' % rnd.randrange(i), 0, ())
+        return CppTypeExpression('std::vector', 0, [CppPointerTypeExpression(inner, CppPointerTypeExpression.POINTER_VAR, 0)])
+    else:
+        return CppTypeExpression('std::string', TypeArgs.CONST_TYPE, ())
+
+def class_def(rnd, i, members, methods):
+    base_types = []
+    if i > 0 and rnd.random() < 0.5:
+        base_types.append(CppInheritance('Class%d' % rnd.randrange(i), CppHierarchicalTypeDefinition.VISIBILITY_PUBLIC))
+
+    member_vars = [
+        CppMember(CppVarDeclaration(type_expression(rnd, i), 'm_%d' % m), CppHierarchicalTypeDefinition.VISIBILITY_PRIVATE)
+        for m in range(members)
+    ]
+    params = [
+        CppVarDeclaration(CppTypeExpression('int', 0, ()), 'a'),
+        CppVarDeclaration(CppTypeExpression('double', 0, ()), 'b')
+    ]
+    member_funs = [
+        CppMember(
+            CppFunctionDeclaration('method%d' % m, CppTypeExpression('int', 0, ()), params, FunctionArgs.CONST_FUNCTION),
+            CppHierarchicalTypeDefinition.VISIBILITY_PUBLIC
+        )
+        for m in range(methods)
+    ]
+
+    return CppHierarchicalTypeDefinition(
+            CppHierarchicalTypeDefinition.CLASS, 'Class%d' % i,
+            base_types=base_types, member_variables=member_vars, member_functions=member_funs
+    )
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='measure the memory used by the cpp_lang model of a synthetic code base'
+    )
+    parser.add_argument('--classes', type=int, default=100000)
+    parser.add_argument('--members', type=int, default=8)
+    parser.add_argument('--methods', type=int, default=4)
+    parser.add_argument('--seed',    type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    classes = [ class_def(rnd, i, args.members, args.methods) for i in range(args.classes) ]
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    n_members = args.classes * (args.members + args.methods)
+
+    print('%d classes, %d members: %.1f MB' % (args.classes, n_members, total / 1e6))
+    print('%8.0f bytes per class'  % (total / args.classes))
+    print('%8.0f bytes per member' % (total / n_members))
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+# measures packrat parsing (cpp_parser.enable_packrat) on increasingly nested
+# template arguments: time, hit rate and evictions for some cache sizes
+#
+# the classes use the nested type (e.g. std::map<K, std::vector<std::pair<A*, B&> > >)
+# in all kinds of members, followed by synthetic classes (see synthetic.py)
+
+import sys; sys.path.append('..')
+
+import cpp_lang
+import cpp_parser
+
+from synthetic import Generator, best_of
+
+
+def nested_type(depth):
+    t = 'A*'
+    for i in range(depth):
+        t = 'std::map<K%d, std::vector<std::pair<%s, B&> > >' % (i, t)
+    return t
+
+def nested_source(depth, classes):
+    t = nested_type(depth)
+    lines = []
+    for i in range(classes):
+        lines += [
+            'class Nested%d : public Base {' % i,
+            'public:',
+            '    %s m%d, *p%d;' % (t, i, i),
+            '    virtual %s f(const %s& a, %s b) const;' % (t, t, t),
+            '    %s g() { return %s(); }' % (t, t),
+            '    Nested%d(%s x) : m%d(x) {}' % (i, t, i),
+            '};',
+            'typedef %s Nested%dType;' % (t, i),
+            ''
+        ]
+    return '\n'.join(lines)
+
+def extract(source):
+    return [ (cpp_lang.structure(definition), start, end)
+             for (definition, start, end) in cpp_parser.extract_definitions(source) ]
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark packrat parsing on deeply templated code'
+    )
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--repeat',  type=int, default=3)
+    parser.add_argument('--seed',    type=int, default=0)
+    parser.add_argument('--sizes',   type=int, nargs='+', default=[256, cpp_parser.default_cache_size, 65536])
+    args = parser.parse_args()
+
+    print('%6s %10s %8s %10s %10s %12s' % ('depth', 'cache', 'time [s]', 'hit rate', 'hits', 'evictions'))
+    for depth in [1, 2, 3, 4, 5]:
+        source = nested_source(depth, args.classes) \
+               + Generator(seed=args.seed, classes=args.classes, template_depth=depth).header()
+
+        cpp_parser.disable_packrat()
+        (t, expected) = best_of(args.repeat, lambda: extract(source))
+        print('%6d %10s %8.3f' % (depth, 'off', t))
+
+        for size in args.sizes:
+            cpp_parser.enable_packrat(size)
+            (t, res) = best_of(args.repeat, lambda: extract(source))
+            stats = cpp_parser.packrat.stats()
+            print('%6d %10d %8.3f %9.1f%% %10d %12d' % (depth, size, t, 100 * stats['hit_rate'], stats['hits'], stats['evictions']))
+            if res != expected:
+                print('MISMATCH: packrat parsing changed the definitions (depth %d, cache %d)' % (depth, size))
+
+    cpp_parser.disable_packrat()
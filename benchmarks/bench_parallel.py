@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+# scaling of the class diagram construction with the number of worker processes
+
+import sys; sys.path.append('..'); sys.path.append('../examples')
+
+import os
+import shutil
+import tempfile
+import time
+
+import class_diagram
+
+from synthetic import Generator
+
+
+# writes a tree of synthetic headers, files_per_dir in each directory
+def write_tree(root, files, files_per_dir, classes, seed):
+    for i in range(files):
+        d = os.path.join(root, 'dir%d' % (i // files_per_dir))
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        with open(os.path.join(d, 'header%d.h' % i), 'w') as f:
+            f.write(Generator(seed=seed + i, classes=classes).header().replace('Class', 'F%dClass' % i))
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark Diagram.from_pathlist with 1/2/4/8 worker processes'
+    )
+    parser.add_argument('--files',   type=int, default=64)
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--jobs',    type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed',    type=int, default=0)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        write_tree(root, args.files, 8, args.classes, args.seed)
+        print('%d files with %d classes each, %d cpus' % (args.files, args.classes, os.cpu_count()))
+
+        reference = None
+        t_serial = None
+        for jobs in args.jobs:
+            t0 = time.perf_counter()
+            diag = class_diagram.Diagram.from_pathlist([root], jobs=jobs)
+            dt = time.perf_counter() - t0
+
+            rendered = diag.render()
+            if reference is None:
+                reference = rendered
+                t_serial = dt
+            elif rendered != reference:
+                print('MISMATCH: diagram with %d jobs differs' % jobs)
+
+            print('jobs %2d %8.3fs   speedup %5.2fx' % (jobs, dt, t_serial / dt))
+    finally:
+        shutil.rmtree(root)
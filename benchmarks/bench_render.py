@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+# rendering of a class diagram restricted to the classes of the project: the
+# names kept given as a list (linear lookups) and as the symbol index of the
+# diagram (cpp_index, hashed lookups)
+#
+# the generated files are parsed with the token engine
+
+import sys; sys.path.append('..'); sys.path.append('../examples')
+
+import contextlib
+import io
+
+import cpp_parser
+
+from synthetic import Generator, best_of
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the rendering of a class diagram with list and index lookups'
+    )
+    parser.add_argument('--files',   type=int, default=100)
+    parser.add_argument('--classes', type=int, default=10, help='classes per file')
+    parser.add_argument('--repeat',  type=int, default=3)
+    args = parser.parse_args()
+
+    import class_diagram
+
+    diagram = class_diagram.Diagram()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.files):
+            source = Generator(seed=i, classes=args.classes).header().replace('Class', 'F%dClass' % i)
+            path = 'header%d.h' % i
+            f = class_diagram.File.from_definitions(path, cpp_parser.extract_definitions(source, 'tokens'))
+            diagram.roots.append(f)
+            diagram.aliases.update_file(path, f.definitions)
+
+    names = list(diagram.internals())
+    print('%d files, %d classes and typedefs' % (args.files, len(names)))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        (t_list, res_list) = best_of(args.repeat, lambda: diagram.render(keep_only=names))
+        (t_index, res_index) = best_of(args.repeat, lambda: diagram.render(keep_only=diagram.index))
+
+    print('list  %.3fs' % t_list)
+    print('index %.3fs (%.1fx)' % (t_index, t_list / t_index))
+    if res_list != res_index:
+        print('MISMATCH: the diagrams differ')
+        sys.exit(1)
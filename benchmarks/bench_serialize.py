@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+# serialized definitions (cpp_serialize): round trip and load times
+#
+# checks that the definitions loaded from both encodings equal the parsed
+# ones (for every engine, on generated headers and on the given files), then
+# compares the time of loading them with that of parsing the source again
+
+import sys; sys.path.append('..')
+
+import os
+import pickle
+import shutil
+import tempfile
+
+import cpp_lang
+import cpp_parser
+import cpp_serialize
+
+from synthetic import Generator, best_of
+
+
+def structures(definitions):
+    return [ (cpp_lang.structure(definition), start, end) for (definition, start, end) in definitions ]
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='check and benchmark the serialized form of the definitions'
+    )
+    parser.add_argument('files',     nargs='*', help='additional sources to check')
+    parser.add_argument('--classes', type=int, default=100)
+    parser.add_argument('--seed',    type=int, default=0)
+    parser.add_argument('--repeat',  type=int, default=3)
+    args = parser.parse_args()
+
+    sources = [
+        ('synthetic', Generator(seed=args.seed, classes=args.classes).header()),
+        ('templates', Generator(seed=args.seed + 1, classes=args.classes // 4, template_depth=3).header())
+    ]
+    for path in args.files:
+        with open(path) as f:
+            sources.append((path, f.read()))
+
+    tmp = tempfile.mkdtemp()
+    try:
+        mismatches = 0
+        for (name, source) in sources:
+            for engine in sorted(cpp_parser.engines):
+                expected = cpp_parser.extract_definitions(source, engine)
+                for (encoding, extension) in [ ('jsonl', '.jsonl'), ('binary', '.cppast') ]:
+                    path = os.path.join(tmp, 'ast' + extension)
+                    cpp_serialize.dump(iter(expected), path, { 'path': name })
+                    (header, res) = cpp_serialize.load(path)
+                    if structures(res) != structures(expected) or header['path'] != name or header['encoding'] != encoding:
+                        mismatches += 1
+                        print('MISMATCH: %s, %s engine, %s' % (name, engine, encoding))
+
+        print('round trips: %d mismatches' % mismatches)
+
+        (name, source) = sources[0]
+        (t_parse, definitions) = best_of(args.repeat, lambda: cpp_parser.extract_definitions(source))
+        print('%s: %d bytes, %d definitions, parse %.3fs' % (name, len(source), len(definitions), t_parse))
+
+        # the type expressions are interned: loading them is only measured
+        # without the types of a previous load in place
+        def load(path):
+            cpp_lang.clear_interned_types()
+            return cpp_serialize.load(path)
+
+        def load_pickle(path):
+            cpp_lang.clear_interned_types()
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+
+        paths = []
+        for (encoding, extension) in [ ('jsonl', '.jsonl'), ('binary', '.cppast') ]:
+            path = os.path.join(tmp, 'ast' + extension)
+            (t_dump, count) = best_of(args.repeat, lambda: cpp_serialize.dump(definitions, path))
+            paths.append((encoding, path, t_dump, load))
+
+        path = os.path.join(tmp, 'ast.pickle')
+        def dump_pickle():
+            with open(path, 'wb') as f:
+                pickle.dump(definitions, f, pickle.HIGHEST_PROTOCOL)
+        (t_dump, res) = best_of(args.repeat, dump_pickle)
+        paths.append(('pickle', path, t_dump, load_pickle))
+
+        for (encoding, path, t_dump, load_fn) in paths:
+            (t_load, res) = best_of(args.repeat, lambda: load_fn(path))
+            print('  %-7s %8d bytes  dump %.4fs  load %.4fs  (%5.1fx faster than parsing)'
+                  % (encoding, os.path.getsize(path), t_dump, t_load, t_parse / t_load))
+    finally:
+        shutil.rmtree(tmp)
+
+    sys.exit(1 if mismatches else 0)
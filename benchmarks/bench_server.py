@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+# latency of the parse server (cpp_server) compared with a new process per
+# parse, and under concurrent clients
+
+import sys; sys.path.append('..')
+
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+import cpp_client
+import cpp_server
+
+from synthetic import Generator
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+def summary(latencies):
+    return 'p50 %7.2fms  p95 %7.2fms  max %7.2fms' % tuple(1000 * v for v in
+            (percentile(latencies, 50), percentile(latencies, 95), max(latencies)))
+
+# a new interpreter per parse: startup, imports and grammar construction included
+def cold_parse(path):
+    t0 = time.perf_counter()
+    subprocess.check_call([ sys.executable, '-c',
+            'import sys; sys.path.append(%r); import cpp_parser; cpp_parser.extract_definitions(open(%r).read())'
+            % (os.path.abspath('..'), path) ])
+    return time.perf_counter() - t0
+
+def client_requests(socket_path, path, requests, latencies):
+    with cpp_client.ParseClient(socket_path) as client:
+        for i in range(requests):
+            client.parse_file(path)
+            latencies.append(client.latency)
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the parse server against one process per parse'
+    )
+    parser.add_argument('--classes',  type=int, default=5)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--clients',  type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--cold',     type=int, default=5, help='number of parses in new processes')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'header.h')
+    with open(path, 'w') as f:
+        f.write(Generator(seed=0, classes=args.classes).header())
+    socket_path = os.path.join(tmp, 'server.sock')
+
+    print('%d bytes' % os.path.getsize(path))
+    print('%-24s %s' % ('new process per parse', summary([ cold_parse(path) for i in range(args.cold) ])))
+
+    server = cpp_server.ParseServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        for clients in args.clients:
+            latencies = []
+            threads = [ threading.Thread(target=client_requests, args=(socket_path, path, args.requests, latencies))
+                        for i in range(clients) ]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            dt = time.perf_counter() - t0
+            print('%-24s %s  %6.1f requests/s' % ('server, %d client(s)' % clients, summary(latencies), len(latencies) / dt))
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+        os.remove(path)
+        os.rmdir(tmp)
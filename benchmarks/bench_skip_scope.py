@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+# compares the recursive get_scope with the linear skip_scope on large and on
+# deeply nested function bodies
+
+import sys; sys.path.append('..')
+
+import pp_utils
+
+from synthetic import best_of
+
+
+def large_body(lines):
+    return '{\n' + ''.join('    if (a > %d) { b[%d] = f(a, "}"); }\n' % (i, i) for i in range(lines)) + '}'
+
+def nested_body(depth):
+    return '{ ' * depth + 'x;' + ' }' * depth
+
+def run(expr, body, repeat):
+    try:
+        (t, res) = best_of(repeat, lambda: expr.parseString(body))
+        return '%8.4fs' % t
+    except RecursionError:
+        return '%9s' % 'recursion'
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark skip_scope against get_scope'
+    )
+    parser.add_argument('--lines',  type=int, default=2000)
+    parser.add_argument('--depth',  type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # string literals are not understood by get_scope, keep them balanced for it
+    for (name, body) in [
+            ('%d line body'  % args.lines, large_body(args.lines).replace('"}"', '"{}"')),
+            ('nesting depth %d' % args.depth, nested_body(args.depth))
+    ]:
+        t_get  = run(pp_utils.get_scope ('{', '}'), body, args.repeat)
+        t_skip = run(pp_utils.skip_scope('{', '}'), body, args.repeat)
+        print('%-20s get_scope %s   skip_scope %s' % (name, t_get, t_skip))
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+
+# parallel extraction of a single large source (cpp_parser.extract_definitions_parallel)
+#
+# checks that the merged result of the parts equals the single-threaded parse
+# for many numbers of parts, then compares the times with several jobs
+
+import sys; sys.path.append('..')
+
+import time
+
+import cpp_lang
+import cpp_parser
+
+from synthetic import Generator
+
+
+def structures(definitions):
+    return [ (cpp_lang.structure(definition), start, end) for (definition, start, end) in definitions ]
+
+# a generated header in namespaces and an extern "C" block (transparent scopes
+# whose contents are split as well)
+def large_source(classes, seed):
+    header = Generator(seed=seed, classes=classes).header()
+    lines = header.split('\n')
+    third = len(lines) // 3
+    while lines[third].strip():
+        third += 1
+    return '\n'.join([ 'namespace outer { namespace inner {' ] + lines[:third] + [ '} }', 'extern "C" {' ]
+                     + lines[third:2*third] + [ '}' ] + lines[2*third:])
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='check and benchmark the parallel extraction of a single source'
+    )
+    parser.add_argument('files',     nargs='*', help='additional sources to check')
+    parser.add_argument('--classes', type=int, default=300)
+    parser.add_argument('--seed',    type=int, default=0)
+    parser.add_argument('--jobs',    type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--engine',  choices=sorted(cpp_parser.engines), default=cpp_parser.default_engine)
+    args = parser.parse_args()
+
+    sources = [ ('synthetic', large_source(args.classes, args.seed)) ]
+    for path in args.files:
+        with open(path) as f:
+            sources.append((path, f.read()))
+
+    mismatches = 0
+    for (name, source) in sources:
+        t0 = time.perf_counter()
+        expected = structures(cpp_parser.extract_definitions(source, args.engine))
+        t_single = time.perf_counter() - t0
+        print('%s: %d bytes, %d definitions, %.3fs single-threaded' % (name, len(source), len(expected), t_single))
+
+        # small parts: many cuts, also inside of the namespaces
+        for parts in [2, 3, 8, 32]:
+            part_size = max(1, len(source) // parts)
+            res = structures(cpp_parser.extract_definitions_parallel(source, 2, args.engine, part_size))
+            if res != expected:
+                mismatches += 1
+                print('MISMATCH: %s in %d parts' % (name, parts))
+
+        for jobs in args.jobs:
+            t0 = time.perf_counter()
+            res = structures(cpp_parser.extract_definitions_parallel(source, jobs, args.engine, max(1, len(source) // (4 * jobs))))
+            dt = time.perf_counter() - t0
+            if res != expected:
+                mismatches += 1
+                print('MISMATCH: %s with %d jobs' % (name, jobs))
+            print('  %2d jobs: %.3fs (%.1fx)' % (jobs, dt, t_single / dt))
+
+    print('%d mismatches' % mismatches)
+    sys.exit(1 if mismatches else 0)
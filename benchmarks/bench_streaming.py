@@ -0,0 +1,58 @@
+#!/usr/bin/python
+
+# peak memory of extracting the definitions of a large file at once compared
+# with the streaming iter_definitions
+
+import sys; sys.path.append('..')
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cpp_parser
+
+from synthetic import Generator
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    n = sum(1 for d in fn())
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (n, dt, peak)
+
+def extract_all(path):
+    with open(path) as f:
+        source = f.read()
+    # the definitions themselves are dropped right away, as in the streaming case
+    return iter(cpp_parser.scan_definitions(source))
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='compare the peak memory of whole-file and streaming extraction'
+    )
+    parser.add_argument('--classes', type=int, default=200)
+    parser.add_argument('--seed',    type=int, default=0)
+    args = parser.parse_args()
+
+    (fd, path) = tempfile.mkstemp(suffix='.h')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(Generator(seed=args.seed, classes=args.classes).header())
+        print('%d classes, %.2f MB' % (args.classes, os.path.getsize(path) / 1e6))
+
+        for (name, fn) in [
+                ('whole file',        lambda: extract_all(path)),
+                ('iter_definitions',  lambda: cpp_parser.iter_definitions(path))
+        ]:
+            (n, dt, peak) = measure(fn)
+            print('%-18s %8.3fs   peak %8.2f MB   (%d definitions)' % (name, dt, peak / 1e6, n))
+    finally:
+        os.remove(path)
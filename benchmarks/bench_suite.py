@@ -0,0 +1,158 @@
+#!/usr/bin/python
+
+# benchmark suite over the major grammar productions, the class diagram pipeline
+# and the cold import of cpp_parser
+#
+# the inputs come from the seeded synthetic generator. Timings are normalized by
+# a pure Python calibration loop, written as JSON and compared with a stored
+# baseline: a slowdown beyond the tolerance makes the run fail.
+
+import sys; sys.path.append('..'); sys.path.append('../examples')
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import cpp_parser
+
+from bench_import import cold_run
+from synthetic import Generator, best_of
+
+
+productions = ['var_decl', 'var_decl_list', 'fun_decl', 'fun_def', 'type_def', 'hierarchical_type_def']
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+# time of a fixed pure Python workload (function calls, attribute and dict access)
+def calibration():
+    class Counter:
+        def __init__(self):
+            self.counts = {}
+        def add(self, key):
+            self.counts[key] = self.counts.get(key, 0) + 1
+    def loop():
+        c = Counter()
+        for i in range(200000):
+            c.add(i % 7)
+        return c
+    return best_of(10, loop)[0]
+
+def parse_all(expr, samples):
+    for sample in samples:
+        expr.parseString(sample)
+
+def production_benchmark(production, args):
+    samples = Generator(
+            seed=args.seed,
+            body_lines=args.body_lines,
+            comment_density=args.comment_density,
+            template_depth=args.template_depth,
+            members=args.members
+    ).samples(production, args.samples)
+    expr = getattr(cpp_parser, production)
+    return best_of(args.repeat, lambda: parse_all(expr, samples))[0]
+
+def pipeline_benchmark(args):
+    import class_diagram
+
+    root = tempfile.mkdtemp()
+    try:
+        for i in range(args.files):
+            with open(os.path.join(root, 'header%d.h' % i), 'w') as f:
+                f.write(Generator(
+                        seed=args.seed + i,
+                        classes=args.classes,
+                        members=args.members,
+                        body_lines=args.body_lines,
+                        comment_density=args.comment_density,
+                        template_depth=args.template_depth
+                ).header().replace('Class', 'F%dClass' % i))
+
+        def run():
+            diag = class_diagram.Diagram.from_pathlist([root])
+            diag.render(keep_only=diag.index, aliases=diag.aliases)
+
+        return best_of(args.repeat, run)[0]
+    finally:
+        shutil.rmtree(root)
+
+def run_benchmarks(args):
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for production in productions:
+            results[production] = production_benchmark(production, args)
+        results['class_diagram'] = pipeline_benchmark(args)
+    results['import_cpp_parser'] = cold_run('import cpp_parser', args.repeat)
+    return results
+
+# names of the benchmarks which are slower than in the baseline
+def regressions(report, baseline, tolerance):
+    if report['parameters'] != baseline['parameters']:
+        raise ValueError('the baseline has been measured with different parameters')
+
+    return [
+        name for (name, res) in report['benchmarks'].items()
+             if name in baseline['benchmarks']
+             and res['relative'] > baseline['benchmarks'][name]['relative'] * (1.0 + tolerance)
+    ]
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='benchmark the grammar productions, the class diagram pipeline and the import'
+    )
+    parser.add_argument('--samples',         type=int,   default=50,  help='samples per production')
+    parser.add_argument('--files',           type=int,   default=4,   help='files of the class diagram')
+    parser.add_argument('--classes',         type=int,   default=10,  help='classes per file')
+    parser.add_argument('--members',         type=int,   default=8,   help='member variables per class')
+    parser.add_argument('--template-depth',  type=int,   default=2,   help='maximal nesting of templates')
+    parser.add_argument('--body-lines',      type=int,   default=3,   help='lines per inline function body')
+    parser.add_argument('--comment-density', type=float, default=0.3, help='probability of a comment per member')
+    parser.add_argument('--seed',            type=int,   default=0)
+    parser.add_argument('--repeat',          type=int,   default=3)
+    parser.add_argument('--output',          help='write the results as JSON to this file')
+    parser.add_argument('--baseline',        default=default_baseline)
+    parser.add_argument('--tolerance',       type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args()
+
+    parameters = { name: getattr(args, name) for name in [
+            'samples', 'files', 'classes', 'members', 'template_depth', 'body_lines', 'comment_density', 'seed'
+    ] }
+
+    calib = calibration()
+    report = {
+        'parameters': parameters,
+        'calibration': calib,
+        'benchmarks': {
+            name: { 'seconds': t, 'relative': t / calib }
+            for (name, t) in run_benchmarks(args).items()
+        }
+    }
+
+    for (name, res) in sorted(report['benchmarks'].items()):
+        sys.stderr.write('%-22s %8.4fs %8.2f\n' % (name, res['seconds'], res['relative']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(report, baseline, args.tolerance)
+        if slower:
+            sys.stderr.write('REGRESSION: slower than the baseline: %s\n' % ', '.join(sorted(slower)))
+            sys.exit(1)
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+# typedef resolution (cpp_typedefs): member types expanded with the memoized
+# index against expanding the typedef chains for every lookup, and reparsed
+# files against building the index again
+#
+# the project is generated as definitions (classes with members of typedef
+# types, chains of typedefs across files); after every update the canonical
+# types are checked against those of a new index
+
+import sys; sys.path.append('..')
+
+import random
+import time
+
+import cpp_index
+import cpp_typedefs
+
+from cpp_lang import CppHierarchicalTypeDefinition, CppTypeDefinition, CppTypeExpression, CppVarDeclaration, CppMember
+
+from synthetic import best_of
+
+
+# a type naming one of the previous types (classes or typedefs)
+def type_expr(rnd, previous):
+    name = rnd.choice(previous)
+    if rnd.random() < 0.3:
+        return CppTypeExpression('std::vector', 0, [ CppTypeExpression(name) ])
+    return CppTypeExpression(name, rnd.choice([ 0, 1 ]))
+
+# the definitions of a file: classes with members, typedefs of the previous
+# types (a chain of them over the files)
+def file_definitions(rnd, f, classes, typedefs, previous):
+    res = []
+    for c in range(classes):
+        members = [ CppMember(CppVarDeclaration(type_expr(rnd, previous), 'm_%d' % m)) for m in range(4) ] if previous else []
+        res.append(CppHierarchicalTypeDefinition(CppHierarchicalTypeDefinition.CLASS, 'F%dClass%d' % (f, c), (), members))
+        previous.append('F%dClass%d' % (f, c))
+    for t in range(typedefs):
+        res.append(CppTypeDefinition(type_expr(rnd, previous), 'F%dType%d' % (f, t)))
+        previous.append('F%dType%d' % (f, t))
+    return [ (definition, i * 10, i * 10 + 9) for (i, definition) in enumerate(res) ]
+
+def member_types(index):
+    return [ (m.member_decl.data_type, symbol.name) for name in sorted(index.names()) for symbol in index.lookup(name)
+                                                    if type(symbol.definition) == CppHierarchicalTypeDefinition
+                                                    for m in symbol.definition.member_variables ]
+
+def state(typedefs):
+    return (dict((name, typedefs.canonical(name)) for name in typedefs.typedef_names()), typedefs.cycles())
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='check and benchmark the typedef resolution'
+    )
+    parser.add_argument('--files',    type=int, default=200)
+    parser.add_argument('--classes',  type=int, default=10, help='classes per file')
+    parser.add_argument('--typedefs', type=int, default=10, help='typedefs per file')
+    parser.add_argument('--updates',  type=int, default=20)
+    parser.add_argument('--seed',     type=int, default=0)
+    parser.add_argument('--repeat',   type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    previous = []
+    files = [ file_definitions(rnd, f, args.classes, args.typedefs, previous) for f in range(args.files) ]
+
+    index = cpp_index.SymbolIndex()
+    for (f, definitions) in enumerate(files):
+        index.add_file('file%d.h' % f, definitions)
+
+    typedefs = cpp_typedefs.TypedefIndex(index)
+    members = member_types(index)
+    print('%d classes and typedefs, %d members' % (len(index), len(members)))
+
+    # without memoization every lookup expands the typedef chains
+    def expand_all():
+        return [ cpp_typedefs.TypedefIndex(index).expand(member_type, scope, set()) for (member_type, scope) in members ]
+
+    (t_expand, res_expand) = best_of(1, expand_all)
+    (t_first, res_first) = best_of(1, lambda: [ typedefs.canonical_type(member_type, scope) for (member_type, scope) in members ])
+    (t_memo, res_memo) = best_of(args.repeat, lambda: [ typedefs.canonical_type(member_type, scope) for (member_type, scope) in members ])
+    print('member types: expanded %.3fs, first lookup %.3fs, memoized %.4fs (%.0fx)'
+          % (t_expand, t_first, t_memo, t_expand / t_memo))
+
+    mismatches = 0 if res_expand == res_first == res_memo else 1
+    if mismatches:
+        print('MISMATCH: the memoized types differ from the expanded ones')
+
+    # reparsed files: retargeted typedefs (some into cycles), removed files
+    t_update = 0.0
+    t_rebuild = 0.0
+    for u in range(args.updates):
+        f = rnd.randrange(args.files)
+        path = 'file%d.h' % f
+        new_definitions = None
+        if u % 5 != 4:
+            new_definitions = [ (CppTypeDefinition(type_expr(rnd, previous), definition.type_name), start, end)
+                                if type(definition) == CppTypeDefinition else (definition, start, end)
+                                for (definition, start, end) in files[f] ]
+        if u % 5 == 2 and args.typedefs > 1:
+            # the first two typedefs alias each other
+            (first, second) = [ (definition, start, end) for (definition, start, end) in new_definitions
+                                                         if type(definition) == CppTypeDefinition ][:2]
+            new_definitions.remove(first)
+            new_definitions.remove(second)
+            new_definitions += [ (CppTypeDefinition(CppTypeExpression(second[0].type_name), first[0].type_name),) + first[1:],
+                                 (CppTypeDefinition(CppTypeExpression(first[0].type_name), second[0].type_name),) + second[1:] ]
+
+        t0 = time.perf_counter()
+        typedefs.update_file(path, new_definitions)
+        res_update = [ typedefs.canonical_type(member_type, scope) for (member_type, scope) in members ]
+        t_update += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        fresh = cpp_typedefs.TypedefIndex(index)
+        res_fresh = [ fresh.canonical_type(member_type, scope) for (member_type, scope) in members ]
+        t_rebuild += time.perf_counter() - t0
+
+        if res_update != res_fresh or state(typedefs) != state(fresh):
+            mismatches += 1
+            print('MISMATCH: update %d of %s' % (u, path))
+
+    print('%d updates: incremental %.3fs, rebuild %.3fs (%.1fx), %d cycles'
+          % (args.updates, t_update, t_rebuild, t_rebuild / t_update, len(typedefs.cycles())))
+
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+# parses the same sources from many threads at once (cpp_parser.extract_batch)
+# and checks that every thread finds exactly what a single-threaded parse finds,
+# down to the identity of the (interned) type expressions
+
+import sys; sys.path.append('..')
+
+import time
+
+import cpp_lang
+import cpp_parser
+
+from synthetic import Generator
+
+
+def structures(results):
+    return [ [ (cpp_lang.structure(definition), start, end) for (definition, start, end) in res ]
+             for res in results ]
+
+# the type expressions of a node in the order of cpp_lang.structure; they are
+# interned, comparing lists of them compares their identities
+def type_exprs(node, res=None):
+    if res is None:
+        res = []
+    if isinstance(node, cpp_lang.CppInternedType):
+        res.append(node)
+    elif isinstance(node, (list, tuple)):
+        for child in node:
+            type_exprs(child, res)
+    else:
+        for cls in type(node).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                type_exprs(getattr(node, name), res)
+    return res
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description='parse sources concurrently and compare with a single-threaded parse'
+    )
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--sources', type=int, default=8)
+    parser.add_argument('--rounds',  type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--engine',  choices=sorted(cpp_parser.engines), default=cpp_parser.default_engine)
+    parser.add_argument('--packrat', action='store_true')
+    args = parser.parse_args()
+
+    sources = [ Generator(seed=seed, classes=args.classes, template_depth=1 + seed % 3).header()
+                for seed in range(args.sources) ]
+
+    # (the definitions are kept: their type expressions stay interned)
+    t0 = time.perf_counter()
+    single = [ cpp_parser.CppParser(args.engine, args.packrat).extract_definitions(source) for source in sources ]
+    t_single = time.perf_counter() - t0
+    expected = structures(single)
+    expected_types = [ type_exprs(res) for res in single ]
+
+    # every source is parsed by several threads at the same time
+    batch = [ source for source in sources for i in range(args.rounds) ]
+    t0 = time.perf_counter()
+    batch_results = cpp_parser.extract_batch(batch, args.threads, args.engine, args.packrat)
+    t_batch = time.perf_counter() - t0
+    results = structures(batch_results)
+
+    mismatches = 0
+    for (i, res) in enumerate(results):
+        if res != expected[i // args.rounds]:
+            mismatches += 1
+            print('MISMATCH: source %d, round %d' % (i // args.rounds, i % args.rounds))
+        elif type_exprs(batch_results[i]) != expected_types[i // args.rounds]:
+            mismatches += 1
+            print('MISMATCH: source %d, round %d: equal but distinct type expressions' % (i // args.rounds, i % args.rounds))
+
+    print('%d sources x %d rounds on %d threads: %d mismatches' % (args.sources, args.rounds, args.threads, mismatches))
+    print('single-threaded: %.3f s per round, batch: %.3f s per round' % (t_single, t_batch / args.rounds))
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,130 @@
+# seeded generator for synthetic C++ headers used by the benchmarks
+#
+# besides whole headers, it generates samples for single grammar productions.
+# best_of is the timing helper shared by the benchmarks.
+
+import random
+import time
+
+
+# (best time of repeat calls of fn, result of the last call)
+def best_of(repeat, fn):
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return (best, res)
+
+
+base_types = ['int', 'unsigned int', 'double', 'float', 'char', 'bool', 'long']
+
+class Generator:
+    def __init__(self, seed=0, classes=100, members=8, methods=4, functions=2, body_lines=3, comment_density=0.3,
+                 template_depth=1):
+        self.rnd = random.Random(seed)
+        self.classes = classes
+        self.members = members
+        self.methods = methods
+        self.functions = functions
+        self.body_lines = body_lines
+        self.comment_density = comment_density
+        self.template_depth = template_depth
+
+    def comment(self, lines):
+        if self.rnd.random() < self.comment_density:
+            if self.rnd.random() < 0.5:
+                lines.append('    // struct Commented%d { int x; };' % self.rnd.randrange(1000))
+            else:
+                lines.append('    /* class Commented%d\n     * typedef int NotAType;\n     */' % self.rnd.randrange(1000))
+
+    def type_name(self, i, depth=None):
+        if depth is None:
+            depth = self.template_depth
+
+        kind = self.rnd.randrange(5)
+        if kind == 0 or i == 0:
+            return self.rnd.choice(base_types)
+        elif kind == 1 or (kind >= 3 and depth == 0):
+            return 'Class%d' % self.rnd.randrange(i)
+        elif kind == 2:
+            return 'const std::string'
+        elif kind == 3:
+            return 'std::vector<%s*>' % self.type_name(i, depth - 1)
+        else:
+            return 'std::map<%s, %s>' % (self.rnd.choice(base_types), self.type_name(i, depth - 1))
+
+    def class_def(self, i, lines):
+        self.comment(lines)
+        if i > 0 and self.rnd.random() < 0.5:
+            lines.append('class Class%d : public Class%d {' % (i, self.rnd.randrange(i)))
+        else:
+            lines.append('class Class%d {' % i)
+        for m in range(self.members):
+            self.comment(lines)
+            lines.append('    %s m_%d;' % (self.type_name(i), m))
+        lines.append('public:')
+        lines.append('    Class%d();' % i)
+        lines.append('    virtual ~Class%d();' % i)
+        for m in range(self.methods):
+            self.comment(lines)
+            lines.append('    int method%d(int a, double b) const {' % m)
+            self.body('        ', lines)
+            lines.append('        return 0;')
+            lines.append('    }')
+        lines.append('};')
+        lines.append('')
+
+    def body(self, indent, lines):
+        for l in range(self.body_lines):
+            lines.append(indent + 'if (a > %d) { log("class %d { };"); return a * %d; }' % (l, l, l))
+
+    # free inline function operating on a class
+    def function_def(self, i, f, lines):
+        self.comment(lines)
+        lines.append('inline double function%d_%d(const Class%d & obj, int a) {' % (i, f, i))
+        self.body('    ', lines)
+        lines.append('    return obj.method0(a, 1.0);')
+        lines.append('}')
+        lines.append('')
+
+    # samples for single productions of cpp_parser
+
+    def var_decl(self, i):
+        return '%s %sv_%d' % (self.type_name(i), self.rnd.choice(['', '*', '&', '* const ']), i)
+
+    def var_decl_list(self, i):
+        return '%s a_%d, *b_%d, c_%d[3]' % (self.type_name(i), i, i, i)
+
+    def fun_decl(self, i):
+        params = ', '.join('%s p%d' % (self.type_name(i), p) for p in range(self.rnd.randrange(4)))
+        return 'virtual %s method%d(%s) const' % (self.type_name(i), i, params)
+
+    def fun_def(self, i):
+        lines = [ 'inline %s function%d(int a, double b) {' % (self.type_name(i), i) ]
+        self.body('    ', lines)
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def type_def(self, i):
+        return 'typedef %s Type%d' % (self.type_name(i), i)
+
+    def hierarchical_type_def(self, i):
+        lines = []
+        self.class_def(i, lines)
+        return '\n'.join(lines)
+
+    def samples(self, production, n):
+        return [ getattr(self, production)(i + 1) for i in range(n) ]
+
+    def header(self):
+        lines = ['#include <vector>', '#include <string>', '']
+        for i in range(self.classes):
+            self.class_def(i, lines)
+            for f in range(self.functions):
+                self.function_def(i, f, lines)
+            if self.rnd.random() < 0.3:
+                lines.append('typedef std::vector<Class%d*> Class%dList;' % (i, i))
+                lines.append('')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,95 @@
+# time and step budgets of a parse
+#
+# a ParseBudget limits the parse of one source file as a whole and, optionally,
+# of each top-level definition. The engines of cpp_parser.scan_definitions
+# count a step for every attempt of a production (the token engine only for
+# type expressions and members, it needs far fewer steps). When a limit is exceeded,
+# the definition being parsed is abandoned and its span (from its start to the
+# furthest location the parse reached) is recorded in aborted. After the
+# definition limits the scan goes on with the next definition, after the file
+# limits it ends: either way the definitions found so far are kept.
+#
+# create one budget per source file, the clock starts with its first definition.
+
+import time
+
+
+class BudgetExceeded(Exception):
+    # scope: 'file' or 'definition'
+    def __init__(self, scope, limit):
+        super(BudgetExceeded, self).__init__('%s budget exceeded: %s' % (scope, limit))
+        self.scope = scope
+        self.limit = limit
+
+
+class ParseBudget:
+    CLOCK_INTERVAL = 16
+
+    # time in seconds, steps in attempts of productions (None: unlimited)
+    def __init__(self, time=None, steps=None, definition_time=None, definition_steps=None):
+        self.time = time
+        self.max_steps = steps
+        self.definition_time = definition_time
+        self.max_definition_steps = definition_steps
+
+        self.started = None
+        self.steps = 0
+        # (start, end, scope) of the abandoned definitions
+        self.aborted = []
+        # the file limits were exceeded, nothing more is parsed
+        self.exhausted = False
+        # added to the locations (for sources parsed in parts)
+        self.offset = 0
+
+        self.definition_started = None
+        self.definition_steps = 0
+        self.definition_start = 0
+        # furthest location reached in the current definition
+        self.loc = 0
+
+    def start_definition(self, loc):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        self.definition_started = now
+        self.definition_steps = 0
+        self.definition_start = loc
+        self.loc = loc
+
+    def step(self, loc):
+        self.steps += 1
+        self.definition_steps += 1
+        if loc > self.loc:
+            self.loc = loc
+
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExceeded('file', '%d steps' % self.max_steps)
+        if self.max_definition_steps is not None and self.definition_steps > self.max_definition_steps:
+            raise BudgetExceeded('definition', '%d steps' % self.max_definition_steps)
+
+        # the clock is read every CLOCK_INTERVAL steps
+        if self.steps % self.CLOCK_INTERVAL == 0 and (self.time is not None or self.definition_time is not None):
+            now = time.perf_counter()
+            if self.time is not None and now - self.started > self.time:
+                raise BudgetExceeded('file', '%gs' % self.time)
+            if self.definition_time is not None and now - self.definition_started > self.definition_time:
+                raise BudgetExceeded('definition', '%gs' % self.definition_time)
+
+    # records the definition abandoned with exc
+    def abort(self, exc):
+        self.aborted.append((self.offset + self.definition_start, self.offset + self.loc, exc.scope))
+        if exc.scope == 'file':
+            self.exhausted = True
+
+    # seconds since the start of the first definition
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'time': self.elapsed(),
+            'steps': self.steps,
+            'aborted': [ { 'start': start, 'end': end, 'scope': scope } for (start, end, scope) in self.aborted ]
+        }
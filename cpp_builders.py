@@ -1,9 +1,18 @@
 
 # builder functions for the hierarchical types
+#
+# the builders are parse actions without side effects: they neither modify the
+# parse results they are given nor any other state. They take all three
+# arguments of a parse action, so pyparsing calls them directly instead of
+# finding out their number of arguments on the first calls (which is not
+# thread-safe).
+#
+# the token engine (see cpp_token_parser) uses these as well, so pyparsing is
+# only imported where a parse has to fail.
 
 from cpp_lang import *
 
-def build_type_expression(tokens):
+def build_type_expression(instring, loc, tokens):
     name = tokens.name[0]
     args = tokens.args
     templates = tokens.template
@@ -11,23 +20,24 @@ def build_type_expression(tokens):
     return CppTypeExpression(name, args, templates)
 
 def build_pointer_type_expression(inner_type, refs_list):
+    for el in refs_list:
+        ref_type = el[0]
+        if len(el) > 1:
+            ref_vol = el[1]
+        else:
+            ref_vol = 0
 
-    if not refs_list:
-        return inner_type
-    el = refs_list.pop(0)
+        inner_type = CppPointerTypeExpression(inner_type, ref_type, ref_vol)
+    return inner_type
 
-    ref_type = el[0]
-    if len(el) > 1:
-        ref_vol = el[1]
-    else:
-        ref_vol = 0
+# a type argument of a template (refs: pointers and references to the type)
+def build_template_type_param(instring, loc, res):
+    return build_pointer_type_expression(res[0], res.refs)
 
-    return build_pointer_type_expression(
-        CppPointerTypeExpression(inner_type, ref_type, ref_vol),
-        refs_list
-    )
+def build_var_declaration(instring, loc, res):
+    return CppVarDeclaration(build_pointer_type_expression(res.type_id[0], res.refs), res.name)
 
-def build_declaration_list(res):
+def build_declaration_list(instring, loc, res):
     return [
         CppVarDeclaration(
             build_pointer_type_expression( res.type_id[0], elem.refs ),
@@ -35,7 +45,7 @@ def build_declaration_list(res):
         ) for elem in res.ids
     ]
 
-def build_function( parse_result ):
+def build_function(instring, loc, parse_result):
     # build args bitmap
     args = 0
     if parse_result.abstract:
@@ -59,26 +69,58 @@ def build_function( parse_result ):
         tp = parse_result.decl.data_type
 
     if not parse_result.decl:
-        parse_result.name = None
+        name = None
     else:
-        parse_result.name = parse_result.decl.identifier
-    return CppFunctionDeclaration(parse_result.name, tp, parse_result.parameters, args)
-
-def build_function_definition(res):
+        name = parse_result.decl.identifier
+    return CppFunctionDeclaration(name, tp, parse_result.parameters, args)
+
+# function declaration, function definition or variable list (see member_decl)
+def build_member_declaration(instring, loc, res):
+    if 'parameters' in res:
+        args = 0
+        if res.abstract:
+            args += res.abstract[0]
+        if res.const:
+            args += res.const
+        if res.destructor:
+            args += res.destructor
+        if res.virtual:
+            args += res.virtual
+        if res.inline:
+            args += res.inline
+
+        if res.name:
+            name = res.name
+            tp = build_pointer_type_expression(res.type_id[0], res.refs)
+        else:
+            # constructor or destructor
+            name = None
+            tp = res.type_id[0]
+            args += FunctionArgs.CONSTRUCTOR_FUNCTION
+
+        decl = CppFunctionDeclaration(name, tp, res.parameters, args)
+        if res.body:
+            return CppFunctionDefinition(decl)
+        return decl
+
+    if res.virtual or res.inline:
+        import pyparsing as pp
+        raise pp.ParseException(instring, loc, 'variables cannot be virtual or inline')
+
+    if not res.name:
+        return []
+    return [ CppVarDeclaration(build_pointer_type_expression(res.type_id[0], res.refs), res.name) ] \
+         + [ CppVarDeclaration(build_pointer_type_expression(res.type_id[0], elem.refs), elem.name) for elem in res.ids ]
+
+def build_function_definition(instring, loc, res):
     return CppFunctionDefinition(res.fdecl)
 
-def build_hierarchical_type(res):
+def build_hierarchical_type(instring, loc, res):
     member_vars = []
     methods = []
 
-    # very unsatisfying! Why do we sometimes get a list and sometimes not?
-    base_types = []
-    for inh in res.base_classes:
-        try:
-            print('BUG: %s\'s base class %s in list!' % (res.name, inh[0].base_id))
-            base_types.append(inh[0])
-        except IndexError:
-            base_types.append(inh)
+    # the base classes are grouped (see hierarchical_type_def)
+    base_types = list(res.base_classes[0]) if res.base_classes else []
 
     for dec in res.default_vis_space:
         if type(dec) == CppVarDeclaration:
@@ -95,5 +137,13 @@ def build_hierarchical_type(res):
                 methods.append(CppMember(dec, visib))
 
 
-    return CppHierarchicalTypeDefinition(res.decl.struct_type, res.decl.name, base_types=base_types, member_variables=member_vars, member_functions=methods)
+    # the results names of hierarchical_type_decl are not kept in its group,
+    # the kind and the name are its tokens
+    (struct_type, name) = res.decl
+    return CppHierarchicalTypeDefinition(struct_type, name, base_types=base_types, member_variables=member_vars, member_functions=methods)
+
+def build_inheritance(instring, loc, res):
+    return CppInheritance(res.base_class_name, res.visibility if res.visibility != '' else CppHierarchicalTypeDefinition.VISIBILITY_DEFAULT)
 
+def build_type_definition(instring, loc, res):
+    return CppTypeDefinition(res.expr[0], res.name)
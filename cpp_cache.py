@@ -0,0 +1,164 @@
+# persistent cache of extracted definitions
+#
+# entries are keyed by a hash of the source and of the grammar configuration, so
+# unchanged files skip the parser entirely. Each entry is a separate pickle file,
+# written atomically (temporary file + rename), which makes the cache safe to be
+# shared by several processes. When the cache grows beyond its size limit, the
+# least recently used entries are evicted.
+#
+# loading a pickle runs code of whoever wrote it: the directory is created only
+# accessible to the user, and a directory that is not owned by the user or that
+# others can write to is refused.
+
+import hashlib
+import os
+import pickle
+import stat
+import tempfile
+
+import cpp_parser
+
+
+class ParseCache:
+    DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+    # eviction shrinks the cache below this fraction of its maximal size
+    EVICTION_TARGET = 0.9
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        # estimated size of the cache directory, determined on the first store
+        self.size = None
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        ParseCache.check_directory(directory)
+
+    # raises PermissionError if the entries of directory may have been written
+    # by another user
+    @staticmethod
+    def check_directory(directory):
+        st = os.stat(directory)
+        if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+            raise PermissionError('cache directory %s is not owned by the current user' % directory)
+        if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError('cache directory %s is writable by other users' % directory)
+
+    def key(self, source, engine=None):
+        h = hashlib.sha256(cpp_parser.grammar_key(engine).encode('utf-8'))
+        h.update(b'\0')
+        h.update(source.encode('utf-8', 'surrogateescape'))
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    # cached definitions of the source, None if there are none
+    def get(self, source, engine=None):
+        path = self.entry_path(self.key(source, engine))
+        try:
+            with open(path, 'rb') as f:
+                definitions = pickle.load(f)
+        except Exception:
+            # missing, concurrently evicted or written by an incompatible version
+            self.misses += 1
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return definitions
+
+    def put(self, source, definitions, engine=None):
+        path = self.entry_path(self.key(source, engine))
+        data = pickle.dumps(definitions, protocol=pickle.HIGHEST_PROTOCOL)
+
+        (fd, tmp_path) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self.stores += 1
+        if self.size is None:
+            self.size = self.disk_size()
+        else:
+            self.size += len(data)
+
+        if self.size > self.max_size:
+            self.evict()
+
+    # (definition, start, end) triples of cpp_parser.extract_definitions
+    def definitions(self, source, engine=None):
+        definitions = self.get(source, engine)
+        if definitions is None:
+            definitions = cpp_parser.extract_definitions(source, engine)
+            self.put(source, definitions, engine)
+        return definitions
+
+    def entries(self):
+        res = []
+        for e in os.scandir(self.directory):
+            if not e.name.endswith('.pickle'):
+                continue
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            res.append((st.st_mtime, st.st_size, e.path))
+        return res
+
+    def disk_size(self):
+        return sum(size for (mtime, size, path) in self.entries())
+
+    # remove least recently used entries until the cache is below its target size
+    def evict(self):
+        entries = sorted(self.entries())
+        size = sum(size for (mtime, size, path) in entries)
+        target = self.max_size * ParseCache.EVICTION_TARGET
+
+        for (mtime, entry_size, path) in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                # removed by another process
+                pass
+            size -= entry_size
+
+        self.size = size
+
+    # the statistics, e.g. of a cache in a worker process, and the sum with
+    # those of another one
+    def counts(self):
+        return { 'hits': self.hits, 'misses': self.misses, 'stores': self.stores, 'evictions': self.evictions }
+
+    def add_counts(self, counts):
+        self.hits += counts['hits']
+        self.misses += counts['misses']
+        self.stores += counts['stores']
+        self.evictions += counts['evictions']
+
+    def stats_str(self):
+        lookups = self.hits + self.misses
+        return 'cache: %d hits, %d misses (%.1f%% hit rate), %d stores, %d evictions' % (
+                self.hits, self.misses, 100.0 * self.hits / lookups if lookups else 0.0, self.stores, self.evictions
+        )
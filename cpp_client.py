@@ -0,0 +1,68 @@
+# client of the parse server (see cpp_server)
+#
+# only uses the standard library: importing it does not build the grammar
+
+import json
+import socket
+import time
+
+
+class ServerError(Exception):
+    pass
+
+
+class ParseClient:
+    def __init__(self, socket_path, timeout=None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path)
+        self.stream = self.socket.makefile('rwb')
+        self.next_id = 0
+        # round trip time of the last request
+        self.latency = None
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # sends a request, returns the response (raises ServerError for errors)
+    def request(self, op, **fields):
+        self.next_id += 1
+        fields['op'] = op
+        fields['id'] = self.next_id
+
+        t0 = time.perf_counter()
+        self.stream.write(json.dumps(fields).encode('utf-8') + b'\n')
+        self.stream.flush()
+        line = self.stream.readline()
+        self.latency = time.perf_counter() - t0
+
+        if not line:
+            raise ServerError('connection closed by the server')
+        response = json.loads(line.decode('utf-8'))
+        if not response.get('ok'):
+            raise ServerError(response.get('error'))
+        return response
+
+    # classes and typedefs of a file (the server resolves the path)
+    def parse_file(self, path, engine=None):
+        return self.request('parse', path=path, engine=engine)
+
+    # classes and typedefs of a buffer, path is only used for messages
+    def parse_source(self, source, path=None, engine=None):
+        return self.request('parse', source=source, path=path, engine=engine)
+
+    def stats(self):
+        return self.request('stats')
+
+    def ping(self):
+        return self.request('ping')
+
+    def shutdown(self):
+        return self.request('shutdown')
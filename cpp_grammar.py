@@ -0,0 +1,245 @@
+# C++ Syntax Description
+#
+# the pyparsing grammar of cpp_parser. Building it takes a good part of the
+# startup time, so cpp_parser imports this module only when the grammar is
+# first needed (see cpp_parser.grammar): use the accessor or the names forwarded
+# by cpp_parser rather than importing this module directly.
+
+import pyparsing as pp
+
+from cpp_lang import TypeArgs, FunctionArgs, CppPointerTypeExpression, CppHierarchicalTypeDefinition
+from cpp_builders import build_type_expression, build_var_declaration, build_declaration_list, \
+        build_function, build_member_declaration, build_function_definition, build_hierarchical_type, \
+        build_inheritance, build_type_definition, build_template_type_param
+from pp_utils import csl, skip_scope
+import cpp_lexer
+
+# comments need to be removed
+comment = (pp.cStyleComment | pp.cppStyleComment)
+preprocessor = pp.lineStart() + pp.Word('#', pp.alphas) + pp.SkipTo( pp.lineEnd() )
+preprocessor.setWhitespaceChars(' \r\t')
+
+# the productions are named right away (before copies of them are made by
+# setting results names), the names show up in error messages and profiles
+
+identifier  = pp.Word( pp.alphas + '_', pp.alphanums + '_' ).setName('identifier')
+persistency = pp.Keyword('static'  ).setParseAction( pp.replaceWith(TypeArgs.STATIC_TYPE)   )
+volatility  = pp.Keyword('const'   ).setParseAction( pp.replaceWith(TypeArgs.CONST_TYPE )   ) \
+            | pp.Keyword('volatile').setParseAction( pp.replaceWith(TypeArgs.VOLATILE_TYPE) )
+
+reference = pp.Literal('*').setParseAction( pp.replaceWith(CppPointerTypeExpression.POINTER_VAR  ) ) \
+          | pp.Literal('&').setParseAction( pp.replaceWith(CppPointerTypeExpression.REFERENCE_VAR) )
+
+# member function on const object
+const_function    = pp.Keyword('const'  ).setParseAction( pp.replaceWith(FunctionArgs.CONST_FUNCTION     ) )
+virtual_function  = pp.Keyword('virtual').setParseAction( pp.replaceWith(FunctionArgs.VIRTUAL_FUNCTION   ) )
+inline_function   = pp.Keyword('inline' ).setParseAction( pp.replaceWith(FunctionArgs.INLINE_FUNCTION) )
+
+destructor_tag    = pp.Literal('~'      ).setParseAction( pp.replaceWith(FunctionArgs.DESTRUCTOR_FUNCTION) )
+abstract_function = (pp.Literal('=') + pp.Literal('0')).setParseAction( pp.replaceWith(FunctionArgs.ABSTRACT_FUNCTION))
+
+hierarchical_type_kind = pp.Keyword('class' ).setParseAction(pp.replaceWith(CppHierarchicalTypeDefinition.CLASS )) \
+             | pp.Keyword('struct').setParseAction(pp.replaceWith(CppHierarchicalTypeDefinition.STRUCT)) \
+             | pp.Keyword('union' ).setParseAction(pp.replaceWith(CppHierarchicalTypeDefinition.UNION ))
+
+enum_type = pp.Keyword('enum')
+
+int_value = pp.Optional(pp.Literal('+') | pp.Literal('-'))('sign') + pp.Word(pp.nums)('value')
+int_value.setParseAction(lambda s, loc, res: int(res.value) * ((-1) if res.sign == '-' else 1))
+int_value.setName('int_value')
+long_value = int_value + pp.Literal('L').suppress()
+
+ref = (reference + pp.Optional(volatility)).setName('ref')
+
+value_expression = pp.Forward()
+#value_expression <<= identifier | 
+
+signer = pp.Keyword('unsigned') | pp.Keyword('signed')
+signable = pp.Keyword('char') | pp.Keyword('short') | pp.Keyword('int') \
+         | pp.Keyword('long') | pp.Keyword('float') | pp.Keyword('double')
+base_type = (pp.Optional(signer) + signable) | signer | pp.Keyword('bool') | pp.Keyword('void')
+base_type.setParseAction( lambda s, loc, tokens: ' '.join(tokens) )
+base_type.setName('base_type')
+
+
+# all type names
+#
+# type expressions can be recursive due to templates
+# TODO: don't suppress hierarchical type
+type_expression = pp.Forward().setName('type_expression')
+
+template_type_param = (type_expression + pp.ZeroOrMore( pp.Group(ref) )('refs'))
+template_type_param.setParseAction( build_template_type_param )
+template_param = (template_type_param | int_value | long_value).setName('template_param')
+template = (pp.Literal('<').suppress() + csl(template_param, 1) + pp.Literal('>').suppress()).setName('template')
+
+general_flags = pp.ZeroOrMore(persistency | volatility).setParseAction(sum).setName('general_flags')
+# sum: combine bitmasks
+
+hierarchical_type = (
+          pp.Optional(hierarchical_type_kind).suppress() \
+        + identifier + pp.ZeroOrMore(pp.Literal('::') + identifier)
+).setParseAction( lambda s, loc, tokens: ''.join(tokens) ).setName('hierarchical_type')
+
+type_expression <<= (general_flags('args') \
+                + pp.Group(base_type | hierarchical_type)('name') \
+                + pp.Optional(template)('template')
+).setParseAction( build_type_expression )
+
+# declaration: <type> <address-stars> <var-name> <array-brackets>
+var_decl = type_expression('type_id') \
+     + pp.ZeroOrMore( pp.Group(ref) )('refs') + identifier('name') \
+     + pp.ZeroOrMore( skip_scope('[',']') ).suppress() \
+     + pp.Optional(pp.Literal('=').suppress() + pp.SkipTo(pp.Literal(';')))
+var_decl.setParseAction( build_var_declaration )
+var_decl.setName('var_decl')
+
+var_decl_list = type_expression('type_id') \
+          + csl(
+                pp.Group(
+                    pp.ZeroOrMore( pp.Group(ref) )('refs') + identifier('name') \
+                  + pp.ZeroOrMore( skip_scope('[',']') ).suppress() \
+                  + pp.Optional(pp.Literal('=') + pp.SkipTo(pp.Literal(',') | pp.Literal(';')))
+                )
+          )('ids')
+var_decl_list.setParseAction( build_declaration_list )
+var_decl_list.setName('var_decl_list')
+
+# parameter list: '(' <list of parameter declarations> or 'void' ')'
+# important: '+' has precedence over '|' -> brackets after the '(' literals are semantically needed!
+parameter_list = pp.Literal('(').suppress() \
+               + pp.Optional( csl(var_decl) | pp.Keyword('void').suppress()) \
+               + pp.Literal(')').suppress()
+parameter_list.setName('parameter_list')
+
+#+ type_expression('ret_type') \
+#+ pp.Optional(
+#    pp.Group(
+#        pp.ZeroOrMore( ref )
+#    )('refs') + identifier('name')
+#) \
+
+fun_decl = pp.ZeroOrMore(virtual_function('virtual') | inline_function('inline')) \
+         + (var_decl('decl') | (pp.Optional(destructor_tag('destructor')) + type_expression('constructor'))) \
+         + pp.Group(parameter_list)('parameters') \
+         + pp.Optional(const_function('const')) \
+         + pp.Optional(abstract_function('abstract'))
+
+fun_decl.setParseAction( build_function )
+fun_decl.setName('fun_decl')
+
+# TODO: quick and dirty hack to catch function calls
+fun_call = (identifier + skip_scope('(', ')')).setName('fun_call')
+
+fun_def = fun_decl('fdecl') \
+        + pp.Optional(pp.Literal(':') + fun_call + pp.ZeroOrMore(pp.Literal(',').suppress() + fun_call)) \
+        + skip_scope('{', '}')
+fun_def.setParseAction( build_function_definition )
+fun_def.setName('fun_def')
+
+hierarchical_type_decl = (hierarchical_type_kind('struct_type') + identifier('name')).setName('hierarchical_type_decl')
+enum_type_decl = enum_type.suppress() + identifier('name')
+
+friend_decl = (pp.Keyword('friend') + csl(fun_def | fun_decl | hierarchical_type_decl | identifier)).setName('friend_decl')
+
+decl = (fun_decl | var_decl_list | friend_decl).setName('decl')
+
+# member declarations
+#
+# functions, function definitions and variable lists share their prefix: the
+# type expression and the declarator of the function or of the first variable.
+# The prefix is parsed once, the rest of the declaration decides what it is.
+# Only functions may be preceded by flags: if a variable list follows flags (or
+# the declaration starts with 'friend'), the flag is reparsed as in decl.
+fun_flag = virtual_function('virtual') | inline_function('inline')
+
+declarator = (pp.ZeroOrMore( pp.Group(ref) )('refs') + identifier('name') \
+           + pp.ZeroOrMore( skip_scope('[',']') ).suppress()).setName('declarator')
+
+fun_signature = (pp.Group(parameter_list)('parameters') \
+              + pp.Optional(const_function('const')) \
+              + pp.Optional(abstract_function('abstract'))).setName('fun_signature')
+
+fun_body = pp.Optional(pp.Literal(':') + fun_call + pp.ZeroOrMore(pp.Literal(',').suppress() + fun_call)) \
+         + skip_scope('{', '}')
+fun_body.setParseAction( pp.replaceWith(True) )
+
+fun_end = fun_signature + (fun_body('body') | pp.Literal(';').suppress())
+
+var_end = pp.Optional(pp.Literal('=') + pp.SkipTo(pp.Literal(',') | pp.Literal(';'))).suppress() \
+        + pp.ZeroOrMore(
+                pp.Literal(',').suppress() \
+              + pp.Group(
+                    declarator \
+                  + pp.Optional(pp.Literal('=') + pp.SkipTo(pp.Literal(',') | pp.Literal(';')))
+                )
+          )('ids') \
+        + pp.Literal(';').suppress()
+
+member_decl = pp.ZeroOrMore(fun_flag) + (
+          (type_expression('type_id') + ((declarator + (fun_end | var_end)) | fun_end | pp.Literal(';').suppress()))
+        | (destructor_tag('destructor') + type_expression('type_id') + fun_end)
+)
+member_decl.setParseAction( build_member_declaration )
+member_decl.setName('member_decl')
+
+member = member_decl \
+       | (pp.FollowedBy(fun_flag | pp.Keyword('friend')) + decl + pp.Literal(';').suppress()) \
+       | pp.Literal(';').suppress()
+
+visibility = pp.Keyword('private'  ).setParseAction( pp.replaceWith( CppHierarchicalTypeDefinition.VISIBILITY_PRIVATE   ) ) \
+           | pp.Keyword('public'   ).setParseAction( pp.replaceWith( CppHierarchicalTypeDefinition.VISIBILITY_PUBLIC    ) ) \
+           | pp.Keyword('protected').setParseAction( pp.replaceWith( CppHierarchicalTypeDefinition.VISIBILITY_PROTECTED ) )
+
+visibility_space = pp.Group(visibility + pp.Literal(':').suppress() + pp.ZeroOrMore(member | (identifier + pp.Literal(';'))))
+visibility_space.setName('visibility_space')
+
+inheritance = pp.Optional(visibility)('visibility') + identifier('base_class_name')
+inheritance.setParseAction( build_inheritance )
+inheritance.setName('inheritance')
+
+type_def = pp.Keyword('typedef') + pp.Optional(pp.Literal('typename')) + type_expression('expr') + identifier('name')
+type_def.setParseAction( build_type_definition )
+type_def.setName('type_def')
+
+hierarchical_type_def   = pp.Forward().setName('hierarchical_type_def')
+hierarchical_type_def <<= pp.Optional(visibility) + hierarchical_type_decl('decl') + \
+              pp.Optional(pp.Group(pp.Literal(':').suppress() + csl(inheritance)))('base_classes') \
+            + pp.Literal('{') \
+                + pp.Group(pp.ZeroOrMore(member))('default_vis_space') \
+                + pp.ZeroOrMore(visibility_space)('vis_spaces') \
+                + pp.SkipTo(pp.Literal('}'), ignore=skip_scope('{','}')) \
+            + pp.Literal('}')
+hierarchical_type_def.setParseAction(build_hierarchical_type)
+
+
+# keyword-anchored scanning
+#
+# all matches of the top-level definitions start with one of these keywords,
+# so the grammar only has to be tried where the keywords appear as tokens
+hierarchical_type_def_keywords = ('class', 'struct', 'union')
+type_def_keywords = ('typedef',)
+
+
+# single-pass extraction
+#
+# comments and preprocessor directives are ignored by the top-level definitions
+# themselves, so these can be matched directly on the unmodified source
+#
+# ignorables are tried in front of every token, hence a single regular expression
+# (outside of literals, a '#' in declarations can only start a directive)
+ignorable = pp.Regex('|'.join([cpp_lexer.c_comment, cpp_lexer.cpp_comment, cpp_lexer.directive]))
+
+# kinds of top-level definitions and the keywords their matches start with
+definition_kinds = [
+    (hierarchical_type_def, hierarchical_type_def_keywords),
+    (type_def,              type_def_keywords)
+]
+
+# ignores expr in front of every token of the top-level definitions (see
+# cpp_parser.ignore, which keeps track of the expressions ignored)
+def ignore(expr):
+    for (definition, keywords) in definition_kinds:
+        definition.ignore(expr)
+
+ignore(ignorable)
@@ -0,0 +1,207 @@
+# project-wide symbol index
+#
+# maps the names of the classes (structs, unions) and typedefs of a project to
+# their definitions and files, with reverse indexes of the type names referred
+# to by members, function signatures and typedefs, and of the base class names.
+# All lookups are hashed. Files are added with the (definition, start, end)
+# triples of cpp_parser.scan_definitions and can be replaced or removed one by
+# one (e.g. when a file is reparsed).
+#
+# qualified names: definitions inside of another definition of the same file
+# (e.g. a typedef in a class body) are qualified by the name of the enclosing
+# one ('Outer::Alias'). Namespaces are not seen by the parser, so names written
+# with a namespace that is not part of the qualified name of a definition are
+# resolved through their last component (see resolve).
+
+from cpp_lang import CppHierarchicalTypeDefinition, CppTypeDefinition, CppInternedType, CppPointerTypeExpression
+
+
+# a named definition of a file
+class Symbol:
+    __slots__ = ('name', 'path', 'definition', 'start', 'end', 'scope', 'references', 'bases')
+
+    # scope: qualified name of the enclosing definition ('' at the top level)
+    def __init__(self, name, path, definition, start, end, scope=''):
+        self.name = name
+        self.path = path
+        self.definition = definition
+        self.start = start
+        self.end = end
+        self.scope = scope
+
+        # the type names referred to and the base class names, as written
+        self.references = frozenset(referenced_type_names(definition))
+        if type(definition) == CppHierarchicalTypeDefinition:
+            self.bases = tuple(base.base_id for base in definition.base_types)
+        else:
+            self.bases = ()
+
+    def short_name(self):
+        return self.name.rpartition('::')[2]
+
+    # scope in which the names used by the definition are looked up
+    def lookup_scope(self):
+        if type(self.definition) == CppHierarchicalTypeDefinition:
+            return self.name
+        return self.scope
+
+
+# names of the (non-pointer) type expressions in a type expression, including
+# its template arguments
+def type_names(type_expr):
+    while type(type_expr) == CppPointerTypeExpression:
+        type_expr = type_expr.inner_type
+    yield type_expr.type_name
+    for arg in type_expr.template_args:
+        if isinstance(arg, CppInternedType):
+            for name in type_names(arg):
+                yield name
+
+def referenced_type_names(definition):
+    if type(definition) == CppTypeDefinition:
+        return type_names(definition.type_expr)
+
+    res = set()
+    for m in definition.member_variables:
+        res.update(type_names(m.member_decl.data_type))
+    for m in definition.member_functions:
+        res.update(type_names(m.member_decl.return_type))
+        for p in m.member_decl.params:
+            res.update(type_names(p.data_type))
+    return res
+
+def definition_name(definition):
+    if type(definition) == CppTypeDefinition:
+        return definition.type_name
+    return definition.name
+
+
+def add_to(index, key, value):
+    try:
+        index[key].append(value)
+    except KeyError:
+        index[key] = [value]
+
+def remove_from(index, key, value):
+    values = index[key]
+    values.remove(value)
+    if not values:
+        del index[key]
+
+
+class SymbolIndex:
+    def __init__(self):
+        # the symbols by qualified name (a name may be defined in several files)
+        self.symbols = {}
+        # the symbols by the last component of their names
+        self.short_names = {}
+        # the symbols of each file
+        self.files = {}
+        # the symbols referring to type names and deriving from base class
+        # names, by the last component of the names (as written)
+        self.referrers_by_name = {}
+        self.derived_by_name = {}
+
+    # adds the (definition, start, end) triples of a file, replacing those
+    # added for it before
+    def add_file(self, path, definitions):
+        self.remove_file(path)
+
+        symbols = []
+        # enclosing definitions: (end, qualified name)
+        enclosing = []
+        for (definition, start, end) in sorted(definitions, key=lambda d: d[1]):
+            name = definition_name(definition)
+            if not name:
+                continue
+
+            while enclosing and enclosing[-1][0] <= start:
+                enclosing.pop()
+            scope = enclosing[-1][1] if enclosing else ''
+
+            symbol = Symbol(scope + '::' + name if scope else name, path, definition, start, end, scope)
+            symbols.append(symbol)
+            enclosing.append((end, symbol.name))
+
+        self.files[path] = symbols
+        for symbol in symbols:
+            add_to(self.symbols, symbol.name, symbol)
+            add_to(self.short_names, symbol.short_name(), symbol)
+            for name in short_names(symbol.references):
+                add_to(self.referrers_by_name, name, symbol)
+            for name in short_names(symbol.bases):
+                add_to(self.derived_by_name, name, symbol)
+        return symbols
+
+    def remove_file(self, path):
+        for symbol in self.files.pop(path, ()):
+            remove_from(self.symbols, symbol.name, symbol)
+            remove_from(self.short_names, symbol.short_name(), symbol)
+            for name in short_names(symbol.references):
+                remove_from(self.referrers_by_name, name, symbol)
+            for name in short_names(symbol.bases):
+                remove_from(self.derived_by_name, name, symbol)
+
+    # whether name is defined, either as a qualified name or as the last
+    # component of one (e.g. the names of the classes in a diagram)
+    def __contains__(self, name):
+        return name in self.symbols or name in self.short_names
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def names(self):
+        return self.symbols.keys()
+
+    # the symbols of a qualified name (empty if it is not defined)
+    def lookup(self, name):
+        return self.symbols.get(name, [])
+
+    # the first symbol of a qualified name, None if it is not defined
+    def get(self, name):
+        symbols = self.symbols.get(name)
+        return symbols[0] if symbols else None
+
+    # the qualified name a type name written in scope refers to, None if it is
+    # not defined in the project (or ambiguous)
+    #
+    # like in C++, the name is looked up in the enclosing scopes from the
+    # innermost one outwards. Otherwise a name whose last component is that of
+    # exactly one qualified name refers to it.
+    def resolve(self, name, scope=''):
+        while scope:
+            qualified = scope + '::' + name
+            if qualified in self.symbols:
+                return qualified
+            scope = scope.rpartition('::')[0]
+        if name in self.symbols:
+            return name
+
+        candidates = self.short_names.get(name.rpartition('::')[2], ())
+        names = set(symbol.name for symbol in candidates)
+        if len(names) == 1:
+            return names.pop()
+        return None
+
+    # the symbols referring to the type with the qualified name (through
+    # members, function signatures or typedefs)
+    def referrers(self, name):
+        return [ symbol for symbol in self.referrers_by_name.get(name.rpartition('::')[2], ())
+                        if self.refers_to(symbol, symbol.references, name) ]
+
+    # the symbols with the qualified name as a direct base class
+    def derived(self, name):
+        return [ symbol for symbol in self.derived_by_name.get(name.rpartition('::')[2], ())
+                        if self.refers_to(symbol, symbol.bases, name) ]
+
+    # whether one of the names written in symbol resolves to the qualified name
+    def refers_to(self, symbol, written_names, name):
+        short_name = name.rpartition('::')[2]
+        scope = symbol.lookup_scope()
+        return any(written.rpartition('::')[2] == short_name and self.resolve(written, scope) == name
+                   for written in written_names)
+
+
+# the distinct last components of names
+def short_names(names):
+    return set(name.rpartition('::')[2] for name in names)
@@ -0,0 +1,233 @@
+# inheritance graph of a project
+#
+# built from the base classes (CppHierarchicalTypeDefinition.base_types) of the
+# classes of a cpp_index.SymbolIndex. The transitive closure is precomputed:
+# the ancestors and descendants of every class are sets, so whether a class
+# derives (directly or not) from another is a hashed lookup. Base class names
+# are resolved like other names of the index (see SymbolIndex.resolve, looked
+# up in the scope enclosing the class), those that do not resolve to a class
+# of the project are reported as unknown. Classes deriving from each other
+# form cycles, which are reported too: the classes of a cycle are among their
+# own ancestors.
+#
+# when a file is reparsed (see update_file), only the classes whose base
+# classes may resolve differently and their descendants are recomputed.
+
+from cpp_lang import CppHierarchicalTypeDefinition
+
+
+class InheritanceGraph:
+    def __init__(self, index):
+        self.index = index
+
+        # direct base classes (qualified names) of each class, and the base
+        # class names which do not resolve to a class
+        self.base_sets = {}
+        self.unknown = {}
+        # direct derived classes of each class
+        self.derived_sets = {}
+        # transitive closure
+        self.ancestor_sets = {}
+        self.descendant_sets = {}
+        # the classes of each cycle, by class
+        self.cycle_of = {}
+
+        self.recompute(self.class_names())
+
+    def class_names(self):
+        return [ name for name in self.index.names() if self.is_class(name) ]
+
+    def is_class(self, name):
+        return any(type(symbol.definition) == CppHierarchicalTypeDefinition for symbol in self.index.lookup(name))
+
+    # queries
+
+    def __contains__(self, name):
+        return name in self.base_sets
+
+    # direct base classes and derived classes
+    def bases(self, name):
+        return self.base_sets.get(name, frozenset())
+
+    def derived(self, name):
+        return self.derived_sets.get(name, frozenset())
+
+    # all classes name derives from and all classes deriving from name (the
+    # sets must not be modified)
+    def ancestors(self, name):
+        return self.ancestor_sets.get(name, frozenset())
+
+    def descendants(self, name):
+        return self.descendant_sets.get(name, frozenset())
+
+    # whether the class name derives (directly or not) from the class base
+    def is_derived(self, name, base):
+        return base in self.ancestor_sets.get(name, ())
+
+    # (class name, base class name as written) of the base classes which are
+    # not classes of the project
+    def unknown_bases(self):
+        return [ (name, base) for (name, bases) in sorted(self.unknown.items()) for base in bases ]
+
+    # the cycles (sorted lists of class names)
+    def cycles(self):
+        return sorted(set(self.cycle_of.values()))
+
+    # updates
+
+    # adds, replaces (with definitions) or removes (definitions None) the
+    # definitions of a file in the index and updates the graph
+    def update_file(self, path, definitions=None):
+        index = self.index
+        changed = set(symbol.name for symbol in index.files.get(path, ()))
+        if definitions is None:
+            index.remove_file(path)
+        else:
+            index.add_file(path, definitions)
+        changed.update(symbol.name for symbol in index.files.get(path, ()))
+
+        # the base classes which may resolve differently are those with the
+        # last component of a changed name
+        affected = set(changed)
+        for name in changed:
+            affected.update(symbol.name for symbol in index.derived_by_name.get(name.rpartition('::')[2], ()))
+        self.recompute(affected)
+
+    # recomputes the base classes of the named classes (which may have been
+    # removed) and the closure of them and of their descendants
+    def recompute(self, names):
+        index = self.index
+
+        # descendants before and after the update
+        region = set(names)
+        for name in names:
+            region.update(self.descendant_sets.get(name, ()))
+
+        for name in names:
+            for base in self.base_sets.pop(name, ()):
+                self.derived_sets[base].discard(name)
+            self.unknown.pop(name, None)
+
+        for name in names:
+            if not self.is_class(name):
+                continue
+
+            bases = set()
+            unknown = []
+            for symbol in index.lookup(name):
+                if type(symbol.definition) != CppHierarchicalTypeDefinition:
+                    continue
+                for written in symbol.bases:
+                    base = index.resolve(written, symbol.scope)
+                    if base is not None and self.is_class(base):
+                        bases.add(base)
+                    elif written not in unknown:
+                        unknown.append(written)
+
+            self.base_sets[name] = frozenset(bases)
+            if unknown:
+                self.unknown[name] = tuple(unknown)
+            for base in bases:
+                self.derived_sets.setdefault(base, set()).add(name)
+
+        todo = list(names)
+        while todo:
+            name = todo.pop()
+            for derived in self.derived_sets.get(name, ()):
+                if derived not in region:
+                    region.add(derived)
+                    todo.append(derived)
+
+        self.close(region)
+
+    # recomputes the ancestors of the classes in region, which contains all
+    # descendants of its classes
+    def close(self, region):
+        old = {}
+        for name in region:
+            old[name] = self.ancestor_sets.pop(name, frozenset())
+            self.cycle_of.pop(name, None)
+
+        # the strongly connected components of the region, bases first
+        for component in strongly_connected_components(region, lambda name: self.base_sets.get(name, ())):
+            ancestors = set()
+            for name in component:
+                for base in self.base_sets.get(name, ()):
+                    ancestors.add(base)
+                    if base not in component:
+                        ancestors.update(self.ancestor_sets[base])
+            ancestors = frozenset(ancestors)
+
+            cyclic = len(component) > 1 or component[0] in ancestors
+            for name in component:
+                if name in self.base_sets:
+                    self.ancestor_sets[name] = ancestors
+                if cyclic:
+                    self.cycle_of[name] = tuple(sorted(component))
+
+        for name in region:
+            before = old[name]
+            after = self.ancestor_sets.get(name, frozenset())
+            for ancestor in before - after:
+                descendants = self.descendant_sets.get(ancestor)
+                if descendants is not None:
+                    descendants.discard(name)
+            for ancestor in after - before:
+                self.descendant_sets.setdefault(ancestor, set()).add(name)
+
+        for name in region:
+            if name not in self.base_sets:
+                self.descendant_sets.pop(name, None)
+                self.derived_sets.pop(name, None)
+        for name in list(self.derived_sets):
+            if not self.derived_sets[name]:
+                del self.derived_sets[name]
+
+
+# the strongly connected components (lists of nodes) of the subgraph of nodes,
+# each one after those it has edges to (Tarjan's algorithm, without recursion)
+#
+# edges: the successors of a node (those not in nodes are ignored)
+def strongly_connected_components(nodes, edges):
+    number = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    res = []
+
+    for root in nodes:
+        if root in number:
+            continue
+
+        number[root] = lowlink[root] = len(number)
+        stack.append(root)
+        on_stack.add(root)
+        work = [ (root, iter(edges(root))) ]
+        while work:
+            (node, successors) = work[-1]
+            for succ in successors:
+                if succ not in nodes:
+                    continue
+                if succ not in number:
+                    number[succ] = lowlink[succ] = len(number)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(edges(succ))))
+                    break
+                elif succ in on_stack:
+                    lowlink[node] = min(lowlink[node], number[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == number[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    res.append(component)
+    return res
@@ -1,6 +1,11 @@
 # datastructures for C++ syntax
+#
+# the node classes use __slots__ and store sequences as tuples: the model of a
+# whole code base consists of millions of these objects
 
-import pyparsing as pp
+import sys
+import threading
+import weakref
 
 class TypeArgs:
     CONST_TYPE = 1
@@ -18,12 +23,14 @@ class CppHierarchicalTypeDefinition:
     VISIBILITY_PROTECTED = 2
     VISIBILITY_PUBLIC = 3
 
-    def __init__(self, hierarchical_type, name, base_types=[], member_variables=[], member_functions=[]):
+    __slots__ = ('hierarchical_type', 'name', 'base_types', 'member_variables', 'member_functions')
+
+    def __init__(self, hierarchical_type, name, base_types=(), member_variables=(), member_functions=()):
         self.hierarchical_type = hierarchical_type
         self.name = name
-        self.base_types = base_types
-        self.member_variables = member_variables
-        self.member_functions = member_functions
+        self.base_types = tuple(base_types)
+        self.member_variables = tuple(member_variables)
+        self.member_functions = tuple(member_functions)
 
 
 class FunctionArgs:
@@ -34,55 +41,125 @@ class FunctionArgs:
     ABSTRACT_FUNCTION = 16
     INLINE_FUNCTION = 32
 
-class CppTypeExpression:
-    def __init__(self, type_name, type_args=0, template_args=[], refs=[]):
-        self.type_args = type_args
-        self.type_name = type_name
-        # if this type is a template type, this will contain the template argument values
-        self.template_args = template_args
+# type expressions are hash-consed: constructing a type expression structurally
+# equal to an existing one returns the existing object. They are immutable, so
+# equal type expressions are identical and compare (and hash) in O(1).
+#
+# the table only holds weak references: a type expression no longer used by any
+# definition is dropped from it (long-running processes such as the watch mode
+# of the class diagram or the parse server do not accumulate types)
+#
+# a lookup of an existing type expression is not locked. A new one is
+# inserted under interned_lock: WeakValueDictionary.setdefault is not atomic,
+# threads constructing the same type would get distinct objects
+interned_types = weakref.WeakValueDictionary()
+interned_lock = threading.Lock()
+
+# empties the table: type expressions constructed afterwards are distinct from
+# the existing ones, so types of definitions from before and after do not
+# compare equal
+def clear_interned_types():
+    with interned_lock:
+        interned_types.clear()
+
+class CppInternedType:
+    __slots__ = ('_hash', '__weakref__')
+
+    # fields: values of the subclass' __slots__ (in the order of its constructor)
+    @staticmethod
+    def intern(cls, fields):
+        key = (cls,) + fields
+        try:
+            return interned_types[key]
+        except KeyError:
+            pass
+
+        self = object.__new__(cls)
+        for (name, value) in zip(cls.__slots__, fields):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_hash', hash(key))
+
+        with interned_lock:
+            res = interned_types.get(key)
+            if res is None:
+                interned_types[key] = res = self
+            return res
+
+    def __setattr__(self, name, value):
+        raise AttributeError('type expressions are immutable')
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __hash__(self):
+        return self._hash
+
+    # (un)pickling and copying go through the constructor and hence the interning
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, name) for name in type(self).__slots__))
+
+class CppTypeExpression(CppInternedType):
+    __slots__ = ('type_name', 'type_args', 'template_args')
+
+    # if this type is a template type, template_args will contain the template argument values
+    def __new__(cls, type_name, type_args=0, template_args=(), refs=()):
+        return CppInternedType.intern(cls, (type_name, type_args, tuple(template_args)))
 
     def content_name(self):
         return self.type_name
 
-class CppPointerTypeExpression:
+class CppPointerTypeExpression(CppInternedType):
     POINTER_VAR   = 1
     REFERENCE_VAR = 2
 
-    def __init__(self, inner_type, ref_type, ref_volatility):
-        self.inner_type = inner_type
-        self.ref_type = ref_type
-        self.ref_volatility = ref_volatility
+    __slots__ = ('inner_type', 'ref_type', 'ref_volatility')
+
+    def __new__(cls, inner_type, ref_type, ref_volatility):
+        return CppInternedType.intern(cls, (inner_type, ref_type, ref_volatility))
 
     def content_name(self):
         return self.inner_type.content_name()
 
 class CppTypeDefinition:
+    __slots__ = ('type_expr', 'type_name')
+
     def __init__(self, type_expr, type_name):
         self.type_expr = type_expr
         self.type_name = type_name
 
 class CppVarDeclaration:
+    __slots__ = ('data_type', 'identifier')
+
     def __init__(self, data_type, identifier):
         self.data_type = data_type
         self.identifier = identifier
 
 class CppInheritance:
+    __slots__ = ('vis', 'base_id')
+
     def __init__(self, base_class_id, visibility=0):
         self.vis = visibility
         self.base_id = base_class_id
 
 class CppMember:
+    __slots__ = ('member_decl', 'vis')
+
     def __init__(self, member_decl, visibility=CppHierarchicalTypeDefinition.VISIBILITY_DEFAULT):
         self.member_decl = member_decl
         self.vis = visibility
 
 class CppFunctionDeclaration:
-    def __init__(self, name, return_type, params, args, template_params=[]):
+    __slots__ = ('name', 'return_type', 'params', 'args', 'template_params')
+
+    def __init__(self, name, return_type, params, args, template_params=()):
         self.name = name
         self.return_type = return_type
-        self.params = params
+        self.params = tuple(params)
         self.args = args
-        self.template_params = template_params
+        self.template_params = tuple(template_params)
 
     def isAbstract(self):
         return bool(self.args & FunctionArgs.ABSTRACT_FUNCTION)
@@ -107,17 +184,37 @@ class CppFunctionDeclaration:
         return bool(self.args & FunctionArgs.VIRTUAL_FUNCTION)
 
 class CppFunctionDefinition(CppFunctionDeclaration):
+    __slots__ = ()
+
     def __init__(self, decl):
         CppFunctionDeclaration.__init__(self, decl.name, decl.return_type, decl.params, decl.args)
 
 class CppClass:
-    def __init__(self, name, fields=[], member_functions=[], inheritances=[]):
+    __slots__ = ('name', 'fields', 'member_functions', 'inheritances')
+
+    def __init__(self, name, fields=(), member_functions=(), inheritances=()):
         self.name = name
-        self.fields = fields
-        self.member_functions = member_functions
-        self.inheritances = inheritances
+        self.fields = tuple(fields)
+        self.member_functions = tuple(member_functions)
+        self.inheritances = tuple(inheritances)
 
 class CppEnumTypeDefiniton:
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
+
+# the structure of a node as nested tuples: (class name, values of the slots),
+# e.g. for comparing the results of different parsers
+#
+# ParseResults can only occur once pyparsing has been imported (the module
+# does not import it itself, see cpp_parser)
+def structure(node):
+    pp = sys.modules.get('pyparsing')
+    if isinstance(node, (list, tuple)) or (pp is not None and isinstance(node, pp.ParseResults)):
+        return tuple(structure(child) for child in node)
+    slots = [ name for cls in reversed(type(node).__mro__) for name in getattr(cls, '__slots__', ()) if name not in ('_hash', '__weakref__') ]
+    if not slots:
+        return node
+    return (type(node).__name__,) + tuple(structure(getattr(node, name)) for name in slots)
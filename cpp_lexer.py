@@ -0,0 +1,270 @@
+# lexical helpers for C++ source
+#
+# these work directly on the characters of the source with regular expressions
+# and are used to narrow down the places at which the (much slower) pyparsing
+# grammar has to be tried
+
+from array import array
+import re
+
+# regions which may contain text looking like code, but have to be skipped
+string_literal = r'"(?:[^"\\\n]|\\.)*"'
+char_literal   = r"'(?:[^'\\\n]|\\.)*'"
+c_comment      = r'/\*(?:[^*]|\*(?!/))*\*/'
+# (a line continuation is a '\' at the end of the line, which may end in \r\n)
+cpp_comment    = r'//(?:\\\r?\n|[^\n])*'
+# '#' only introduces a directive at the beginning of a line
+preprocessor   = r'^[ \t]*#(?:\\\r?\n|[^\n])*'
+# the rest of a directive, for use where the '#' is known to start one
+directive      = r'#(?:\\\r?\n|[^\n])*'
+
+skipped = '|'.join([string_literal, char_literal, c_comment, cpp_comment, preprocessor])
+
+
+_keyword_regex_cache = {}
+
+def keyword_regex(keywords):
+    keywords = tuple(keywords)
+    try:
+        return _keyword_regex_cache[keywords]
+    except KeyError:
+        regex = re.compile(
+                '(?:' + skipped + ')|\\b(?P<keyword>' + '|'.join(map(re.escape, keywords)) + ')\\b',
+                re.MULTILINE
+        )
+        _keyword_regex_cache[keywords] = regex
+        return regex
+
+# (offset, keyword) for each keyword appearing as a real token
+# (i.e. not inside of a string/char literal, a comment or a preprocessor line)
+def keyword_scan(source, keywords, start=0, end=None):
+    regex = keyword_regex(keywords)
+    if end is None:
+        end = len(source)
+    for m in regex.finditer(source, start, end):
+        keyword = m.group('keyword')
+        if keyword:
+            yield (m.start(), keyword)
+
+
+# top-level boundaries
+#
+# positions at which a source can be cut without splitting a definition: after
+# a ';' or '}' (or after the '{' of a namespace) where all enclosing braces
+# belong to namespaces or extern "C" blocks
+
+boundary_regex = re.compile(
+        '(?P<skip>' + skipped + ')' +
+        '|(?P<open>\\{)|(?P<close>\\})|(?P<semi>;)' +
+        # only reached if the complete comment did not match
+        '|(?P<incomplete>/\\*)',
+        re.MULTILINE
+)
+
+# statements opening a scope whose contents are at top-level
+transparent_scope_regex = re.compile(r'\s*(?:(?:inline\s+)?namespace\b[\w\s:]*|extern\s*"[^"]*"\s*)$')
+
+# the state is kept between calls of feed, so a growing buffer (see
+# cpp_parser.iter_definitions) is only scanned once
+class TopLevelSplitter:
+    def __init__(self):
+        # scanned up to this position
+        self.pos = 0
+        # start of the current statement
+        self.stmt_start = 0
+        # for each open brace: whether its scope is transparent (e.g. a namespace)
+        self.scopes = []
+        # number of open braces which are not transparent
+        self.opaque = 0
+        # the last boundary found
+        self.boundary = 0
+
+    # scans the new part of the buffer, returns the last boundary in it
+    #
+    # unless the buffer is complete, it is only scanned up to its last complete
+    # line (a preprocessor line or comment may continue in the next chunk)
+    #
+    # end: the buffer is treated as if it ended there
+    def feed(self, buf, complete=False, end=None):
+        limit = len(buf) if end is None else end
+        if not complete:
+            limit = buf.rfind('\n', self.pos, limit) + 1
+            while limit > 1 and (buf[limit-2] == '\\' or buf[limit-3:limit-1] == '\\\r'):
+                limit = buf.rfind('\n', self.pos, limit - 1) + 1
+            if limit <= self.pos:
+                return self.boundary
+
+        pos = self.pos
+        for m in boundary_regex.finditer(buf, self.pos, limit):
+            kind = m.lastgroup
+            pos = m.end()
+            if kind == 'skip':
+                if not buf[self.stmt_start:m.start()].strip():
+                    self.stmt_start = m.end()
+            elif kind == 'open':
+                transparent = self.opaque == 0 \
+                        and transparent_scope_regex.match(buf, self.stmt_start, m.start()) is not None
+                self.scopes.append(transparent)
+                if transparent:
+                    self.boundary = m.end()
+                else:
+                    self.opaque += 1
+                self.stmt_start = m.end()
+            elif kind == 'close':
+                if self.scopes and not self.scopes.pop():
+                    self.opaque -= 1
+                if self.opaque == 0:
+                    self.boundary = m.end()
+                self.stmt_start = m.end()
+            elif kind == 'semi':
+                if self.opaque == 0:
+                    self.boundary = m.end()
+                self.stmt_start = m.end()
+            else:
+                # unterminated comment: wait for the rest of it
+                pos = m.start()
+                break
+        else:
+            pos = limit
+
+        self.pos = pos
+        return self.boundary
+
+    # the first n characters have been removed from the buffer
+    def shift(self, n):
+        self.pos -= n
+        self.stmt_start = max(0, self.stmt_start - n)
+        self.boundary = max(0, self.boundary - n)
+
+
+# token buffer
+#
+# the source lexed once into parallel arrays: kind, start and end offset and
+# symbol of each token. Identifiers, numbers and punctuation are interned per
+# buffer, their symbol is an index into names (the symbols given to the
+# constructor get the first indices, so parsers can compare with constants).
+# For each opening bracket the index after its closing bracket is stored.
+#
+# whitespace, comments and directives are skipped, like cpp_grammar.ignorable
+
+token_regex = re.compile(
+        '(?P<skip>[ \t\r\n\f\v]+|' + c_comment + '|' + cpp_comment + '|' + directive + ')' +
+        '|(?P<ident>[A-Za-z_][A-Za-z0-9_]*)' +
+        '|(?P<number>[0-9]+)' +
+        '|(?P<string>' + string_literal + ')' +
+        '|(?P<char>' + char_literal + ')' +
+        '|(?P<punct>::|.)'
+)
+
+class TokenBuffer:
+    END    = 0
+    IDENT  = 1
+    NUMBER = 2
+    PUNCT  = 3
+    STRING = 4
+    CHAR   = 5
+
+    kind_of = {'ident': IDENT, 'number': NUMBER, 'punct': PUNCT, 'string': STRING, 'char': CHAR}
+
+    brackets = {'(': ')', '[': ']', '{': '}'}
+
+    # skipped_spans: sorted (start, end) spans of further text to be skipped,
+    # a span is only skipped if it starts at a token
+    def __init__(self, source, symbols=(), skipped_spans=()):
+        self.source = source
+        self.kinds = array('b')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.symbols = array('i')
+        self.matches = array('q')
+
+        self.names = list(symbols)
+        self.symbol_ids = dict((name, i) for (i, name) in enumerate(self.names))
+
+        self.tokenize(dict(skipped_spans))
+
+    def tokenize(self, skipped_spans):
+        kinds = self.kinds
+        starts = self.starts
+        ends = self.ends
+        symbols = self.symbols
+        matches = self.matches
+        names = self.names
+        symbol_ids = self.symbol_ids
+        kind_of = self.kind_of
+
+        # indices of the open brackets
+        stacks = dict((bracket, []) for bracket in self.brackets)
+        closing = dict((close, stacks[bracket]) for (bracket, close) in self.brackets.items())
+
+        skip_until = 0
+        for m in token_regex.finditer(self.source):
+            kind = m.lastgroup
+            if kind == 'skip':
+                continue
+
+            (start, end) = m.span()
+            if start < skip_until:
+                continue
+            if start in skipped_spans:
+                skip_until = skipped_spans[start]
+                continue
+
+            index = len(kinds)
+            kinds.append(kind_of[kind])
+            starts.append(start)
+            ends.append(end)
+            matches.append(-1)
+
+            if kind == 'string' or kind == 'char':
+                symbols.append(-1)
+                continue
+
+            text = m.group()
+            try:
+                symbols.append(symbol_ids[text])
+            except KeyError:
+                symbol_ids[text] = len(names)
+                symbols.append(len(names))
+                names.append(text)
+
+            if text in stacks:
+                stacks[text].append(index)
+            elif text in closing and closing[text]:
+                matches[closing[text].pop()] = index + 1
+
+        # sentinel: no production matches it, so the parsers need no bounds checks
+        end = len(self.source)
+        kinds.append(self.END)
+        starts.append(end)
+        ends.append(end)
+        symbols.append(-1)
+        matches.append(-1)
+
+    # number of tokens (without the sentinel)
+    def __len__(self):
+        return len(self.kinds) - 1
+
+    def text(self, i):
+        symbol = self.symbols[i]
+        if symbol >= 0:
+            return self.names[symbol]
+        return self.source[self.starts[i]:self.ends[i]]
+
+# splits source at top-level boundaries into at most the given number of parts
+# of similar size, returns their (start, end) offsets
+#
+# no definition spans a top-level boundary, so the parts can be parsed
+# separately (see cpp_parser.extract_definitions_parallel)
+def split_top_level(source, parts):
+    splitter = TopLevelSplitter()
+    spans = []
+    start = 0
+    for i in range(1, parts):
+        cut = splitter.feed(source, end=len(source) * i // parts)
+        if cut > start:
+            spans.append((start, cut))
+            start = cut
+    if start < len(source) or not spans:
+        spans.append((start, len(source)))
+    return spans
@@ -1,148 +1,392 @@
 # C++ Syntax Description
-
-import pyparsing as pp
-
-from cpp_lang import *
-from cpp_builders import *
-from pp_utils import *
-
-# comments need to be removed
-comment = (pp.cStyleComment | pp.cppStyleComment)
-preprocessor = pp.lineStart() + pp.Word('#', pp.alphas) + pp.SkipTo( pp.lineEnd() )
-preprocessor.setWhitespaceChars(' \r\t')
-
-identifier  = pp.Word( pp.alphas + '_', pp.alphanums + '_' )
-persistency = pp.Keyword('static'  ).setParseAction( pp.replaceWith(TypeArgs.STATIC_TYPE)   )
-volatility  = pp.Keyword('const'   ).setParseAction( pp.replaceWith(TypeArgs.CONST_TYPE )   ) \
-            | pp.Keyword('volatile').setParseAction( pp.replaceWith(TypeArgs.VOLATILE_TYPE) )
-
-reference = pp.Literal('*').setParseAction( pp.replaceWith(CppPointerTypeExpression.POINTER_VAR  ) ) \
-          | pp.Literal('&').setParseAction( pp.replaceWith(CppPointerTypeExpression.REFERENCE_VAR) )
-
-# member function on const object
-const_function    = pp.Keyword('const'  ).setParseAction( pp.replaceWith(FunctionArgs.CONST_FUNCTION     ) )
-virtual_function  = pp.Keyword('virtual').setParseAction( pp.replaceWith(FunctionArgs.VIRTUAL_FUNCTION   ) )
-inline_function   = pp.Keyword('inline' ).setParseAction( pp.replaceWith(FunctionArgs.INLINE_FUNCTION) )
-
-destructor_tag    = pp.Literal('~'      ).setParseAction( pp.replaceWith(FunctionArgs.DESTRUCTOR_FUNCTION) )
-abstract_function = (pp.Literal('=') + pp.Literal('0')).setParseAction( pp.replaceWith(FunctionArgs.ABSTRACT_FUNCTION))
-
-hierarchical_type_kind = pp.Keyword('class' ).setParseAction(pp.replaceWith(CppHierarchicalTypeDefinition.CLASS )) \
-             | pp.Keyword('struct').setParseAction(pp.replaceWith(CppHierarchicalTypeDefinition.STRUCT)) \
-             | pp.Keyword('union' ).setParseAction(pp.replaceWith(CppHierarchicalTypeDefinition.UNION ))
-
-enum_type = pp.Keyword('enum')
-
-int_value = pp.Optional(pp.Literal('+') | pp.Literal('-'))('sign') + pp.Word(pp.nums)('value')
-int_value.setParseAction(lambda res: int(res.value) * ((-1) if res.sign == '-' else 1))
-long_value = int_value + pp.Literal('L').suppress()
-
-ref = reference + pp.Optional(volatility)
-
-value_expression = pp.Forward()
-#value_expression <<= identifier | 
-
-signer = pp.Keyword('unsigned') | pp.Keyword('signed')
-signable = pp.Keyword('char') | pp.Keyword('short') | pp.Keyword('int') \
-         | pp.Keyword('long') | pp.Keyword('float') | pp.Keyword('double')
-base_type = (pp.Optional(signer) + signable) | signer | pp.Keyword('bool') | pp.Keyword('void')
-base_type.setParseAction( lambda tokens: ' '.join(tokens) )
-
-
-# all type names
 #
-# type expressions can be recursive due to templates
-# TODO: don't suppress hierarchical type
-type_expression = pp.Forward()
-
-template_param = (type_expression + pp.ZeroOrMore(ref)) | int_value | long_value
-template = pp.Literal('<').suppress() + csl(template_param, 1) + pp.Literal('>').suppress()
-
-general_flags = pp.ZeroOrMore(persistency | volatility).setParseAction(sum)
-# sum: combine bitmasks
-
-hierarchical_type = (
-          pp.Optional(hierarchical_type_kind).suppress() \
-        + identifier + pp.ZeroOrMore(pp.Literal('::') + identifier)
-).setParseAction( lambda tokens: ''.join(tokens) )
-
-type_expression <<= (general_flags('args') \
-                + pp.Group(base_type | hierarchical_type)('name') \
-                + pp.Optional(template)('template')
-).setParseAction( build_type_expression )
+# extraction of the top-level definitions of C++ sources. The pyparsing grammar
+# (see cpp_grammar) is built on first use, and the modules which depend on
+# pyparsing as well as the process and thread pools are imported where they
+# are used: importing this module stays cheap for short-lived tools, the token
+# engine does not need pyparsing at all.
 
-# declaration: <type> <address-stars> <var-name> <array-brackets>
-var_decl = type_expression('type_id') \
-     + pp.ZeroOrMore( pp.Group(ref) )('refs') + identifier('name') \
-     + pp.ZeroOrMore( get_scope('[',']') ).suppress() \
-     + pp.Optional(pp.Literal('=').suppress() + pp.SkipTo(pp.Literal(';')))
-var_decl.setParseAction(lambda res: CppVarDeclaration(build_pointer_type_expression(res.type_id[0], res.refs), res.name))
+import threading
 
-var_decl_list = type_expression('type_id') \
-          + csl(
-                pp.Group(
-                    pp.ZeroOrMore( pp.Group(ref) )('refs') + identifier('name') \
-                  + pp.ZeroOrMore( get_scope('[',']') ).suppress() \
-                  + pp.Optional(pp.Literal('=') + pp.SkipTo(pp.Literal(',') | pp.Literal(';')))
-                )
-          )('ids')
-var_decl_list.setParseAction( build_declaration_list )
+import cpp_token_parser
+from cpp_budget import BudgetExceeded, ParseBudget
+from cpp_lexer import keyword_scan, split_top_level, TopLevelSplitter
 
-# parameter list: '(' <list of parameter declarations> or 'void' ')'
-# important: '+' has precedence over '|' -> brackets after the '(' literals are semantically needed!
-parameter_list = pp.Literal('(').suppress() \
-               + pp.Optional( csl(var_decl) | pp.Keyword('void').suppress()) \
-               + pp.Literal(')').suppress()
 
-#+ type_expression('ret_type') \
-#+ pp.Optional(
-#    pp.Group(
-#        pp.ZeroOrMore( ref )
-#    )('refs') + identifier('name')
-#) \
+# the grammar
+#
+# grammar() returns the module cpp_grammar, after building it (with the
+# expressions passed to ignore so far) on the first call. Its names are also
+# forwarded as attributes of this module (e.g. cpp_parser.type_def), which
+# builds the grammar as well.
+grammar_module = None
+grammar_lock = threading.Lock()
+
+def grammar():
+    global grammar_module
+    if grammar_module is None:
+        with grammar_lock:
+            if grammar_module is None:
+                import cpp_grammar
+                for expr in ignored:
+                    cpp_grammar.ignore(expr)
+                grammar_module = cpp_grammar
+    return grammar_module
+
+def __getattr__(name):
+    if not name.startswith('__'):
+        try:
+            return getattr(grammar(), name)
+        except AttributeError:
+            pass
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+# expressions which have been passed to ignore(), besides the comments and
+# directives ignored by the grammar itself (cpp_grammar.ignorable)
+ignored = []
+
+def ignore(expr):
+    with grammar_lock:
+        ignored.append(expr)
+        if grammar_module is not None:
+            grammar_module.ignore(expr)
+
+# to be increased with every change of the grammar or the builders that changes
+# the extracted definitions (invalidates persistent caches)
+grammar_version = 5
+
+# identifies the current configuration of the grammar (see ignore) and the
+# engine used
+def grammar_key(engine=None):
+    return '%d:%s:%s' % (grammar_version, engine or default_engine, '|'.join(str(e) for e in ignored))
+
+# the productions among the values of scope (e.g. vars(grammar()))
+def productions(scope):
+    import pyparsing as pp
+    return [ value for value in scope.values() if isinstance(value, pp.ParserElement) ]
+
+# packrat parsing
+#
+# without it, alternatives failing late (e.g. after a long template argument
+# list) parse the same productions again at the same location. Memoizing the
+# productions of the module grammar is process-wide, but bounded in size (see
+# PackratCache) and reset for every source parsed. Threads parsing at the same
+# time share the cache, its entries are kept apart by source.
+default_cache_size = 4096
 
-fun_decl = pp.ZeroOrMore(virtual_function('virtual') | inline_function('inline')) \
-         + (var_decl('decl') | (pp.Optional(destructor_tag('destructor')) + type_expression('constructor'))) \
-         + pp.Group(parameter_list)('parameters') \
-         + pp.Optional(const_function('const')) \
-         + pp.Optional(abstract_function('abstract'))
-
-fun_decl.setParseAction( build_function )
+packrat = None
 
-# TODO: quick and dirty hack to catch function calls
-fun_call = identifier + get_scope('(', ')')
+def enable_packrat(size=default_cache_size, eviction='lru'):
+    from pp_utils import PackratCache, memoize
 
-fun_def = fun_decl('fdecl') \
-        + pp.Optional(pp.Literal(':') + fun_call + pp.ZeroOrMore(pp.Literal(',').suppress() + fun_call)) \
-        + get_scope('{', '}')
-fun_def.setParseAction( build_function_definition )
+    global packrat
+    disable_packrat()
+    packrat = PackratCache(size, eviction)
+    memoize(productions(vars(grammar())), packrat)
 
-hierarchical_type_decl = hierarchical_type_kind('struct_type') + identifier('name')
-enum_type_decl = enum_type.suppress() + identifier('name')
+def disable_packrat():
+    from pp_utils import unmemoize
 
-friend_decl = pp.Keyword('friend') + csl(fun_def | fun_decl | hierarchical_type_decl | identifier)
+    global packrat
+    if grammar_module is not None:
+        unmemoize(productions(vars(grammar_module)))
+    packrat = None
 
-decl = fun_decl | var_decl_list | friend_decl
+# budgets on the module grammar
+#
+# a budget is enforced by patching the parse of the productions (see
+# pp_utils.limit), which must not happen to the productions of the module
+# grammar other threads are using. A budgeted module-level parse uses a private
+# CppParser of the thread instead, made again when the configuration changed
+# (see ignore, enable_packrat and the debug actions of cpp_profiler). It shares
+# the packrat cache of the module.
+budget_parsers = threading.local()
+
+def budget_parser():
+    config = (grammar_key('pyparsing'), packrat, tuple(e.debug for (e, keywords) in grammar().definition_kinds))
+    if getattr(budget_parsers, 'config', None) != config:
+        from pp_utils import memoize
+
+        parser = CppParser('pyparsing')
+        if packrat is not None:
+            memoize(parser.productions, packrat)
+            parser.cache = packrat
+        budget_parsers.parser = parser
+        budget_parsers.config = config
+    return budget_parsers.parser
+
+# yields (definition, start, end) for all class/struct/union definitions and
+# typedefs in source order
+#
+# the source is walked once, each kind of definition behaves as if it was
+# searched for separately (e.g. typedefs inside of class bodies are found)
+#
+# budget: optional cpp_budget.ParseBudget limiting the parse
+#
+# kinds, cache, elements: the grammar, its packrat cache and its productions
+# (default: those of the module grammar, see grammar())
+def pyparsing_scan_definitions(source, budget=None, kinds=None, cache=None, elements=None):
+    import pyparsing as pp
+    from pp_utils import limit, unlimit
+
+    if kinds is None and budget is not None:
+        parser = budget_parser()
+        for res in pyparsing_scan_definitions(source, budget, parser.definition_kinds, parser.cache, parser.productions):
+            yield res
+        return
+
+    if kinds is None:
+        module = grammar()
+        kinds = module.definition_kinds
+        cache = packrat
+        elements = productions(vars(module))
+        for (definition, keywords) in kinds:
+            definition.streamline()
+        pp.ParserElement.resetCache()
+
+    if cache is not None:
+        cache.reset()
+
+    kind_of = {}
+    for (i, (definition, keywords)) in enumerate(kinds):
+        for keyword in keywords:
+            kind_of[keyword] = i
+
+    ends = [0] * len(kinds)
+    for (loc, keyword) in keyword_scan(source, kind_of.keys()):
+        kind = kind_of[keyword]
+        if loc < ends[kind]:
+            continue
+
+        definition = kinds[kind][0]
+        if budget is not None:
+            if budget.exhausted:
+                return
+            budget.start_definition(loc)
+            saved = limit(elements, budget)
+        try:
+            nextloc, tokens = definition._parse(source, loc)
+        except pp.ParseBaseException:
+            continue
+        except BudgetExceeded as exc:
+            budget.abort(exc)
+            continue
+        finally:
+            if budget is not None:
+                unlimit(saved)
+
+        ends[kind] = nextloc
+        yield (tokens[0], loc, nextloc)
+
+# the same on a buffer of tokens lexed once (see cpp_token_parser)
+def token_scan_definitions(source, budget=None, ignored_exprs=None):
+    if ignored_exprs is None:
+        ignored_exprs = ignored
+    return cpp_token_parser.scan_definitions(source, ignored_exprs, budget)
+
+# engines of scan_definitions
+engines = {
+    'pyparsing': pyparsing_scan_definitions,
+    'tokens':    token_scan_definitions
+}
+default_engine = 'pyparsing'
+
+# budget: optional cpp_budget.ParseBudget, definitions exceeding it are skipped
+# (see cpp_budget)
+def scan_definitions(source, engine=None, budget=None):
+    return engines[engine or default_engine](source, budget)
+
+def extract_definitions(source, engine=None, budget=None):
+    return list(scan_definitions(source, engine, budget))
+
+# streaming extraction
+#
+# yields (definition, start, end) like scan_definitions, but reads the source
+# (a path or a stream) in chunks. Whenever the buffer contains a top-level
+# boundary, the part before it is parsed and dropped, so memory is bounded by
+# the largest definition (or function body) instead of the file.
+#
+# scan: the function parsing a part of the source with a budget (default:
+# scan_definitions with the engine)
+#
+# a path is read through cpp_source.SourceFile: line endings are not translated
+# (the offsets are those of the file, also for \r\n line endings)
+def iter_definitions(source, chunk_size=64*1024, engine=None, scan=None, budget=None):
+    if isinstance(source, str):
+        import cpp_source
+        with cpp_source.SourceFile(source) as source_file:
+            for res in iter_definitions(source_file.stream(), chunk_size, engine, scan, budget):
+                yield res
+        return
+
+    if scan is None:
+        scan = lambda buf, budget: scan_definitions(buf, engine, budget)
+
+    splitter = TopLevelSplitter()
+    buf = ''
+    base = 0
+    complete = False
+    while not complete:
+        chunk = source.read(chunk_size)
+        complete = not chunk
+        buf += chunk
+
+        cut = len(buf) if complete else splitter.feed(buf)
+        if cut == 0:
+            continue
+
+        if budget is not None:
+            if budget.exhausted:
+                return
+            budget.offset = base
+        for (definition, start, end) in scan(buf[:cut], budget):
+            yield (definition, base + start, base + end)
+
+        buf = buf[cut:]
+        base += cut
+        splitter.shift(cut)
+
+
+# parallel extraction
+#
+# the source is split at top-level boundaries (see cpp_lexer.split_top_level)
+# into parts of at least part_size characters (up to 4 per job), which are
+# parsed by a pool of jobs worker processes (default: one per CPU). The
+# definitions are merged in source order, with offsets into the whole source:
+# the result is that of extract_definitions.
+#
+# budget: optional cpp_budget.ParseBudget, each part is parsed with its limits
+# per definition (the limits of the file cannot be split between the parts);
+# the steps and the abandoned definitions of the parts are added to it
+#
+# the workers have to share the configuration of the grammar (see ignore): the
+# workers of a pool created here inherit it where processes are forked (the
+# default on Linux), a given pool may need an initializer repeating it
+def extract_definitions_parallel(source, jobs=None, engine=None, part_size=256*1024, pool=None, budget=None):
+    import multiprocessing
+
+    if part_size < 1:
+        raise ValueError('part_size must be at least 1: %r' % (part_size,))
+
+    jobs = jobs or multiprocessing.cpu_count()
+    parts = max(1, min(4 * jobs, len(source) // part_size))
+    spans = split_top_level(source, parts)
+    if len(spans) == 1:
+        return extract_definitions(source, engine, budget)
+
+    limits = None
+    if budget is not None:
+        limits = { 'definition_time': budget.definition_time, 'definition_steps': budget.max_definition_steps }
+
+    tasks = [ (source[start:end], start, engine or default_engine, limits) for (start, end) in spans ]
+    if pool is not None:
+        results = pool.map(extract_part, tasks)
+    else:
+        with multiprocessing.Pool(jobs) as own_pool:
+            results = own_pool.map(extract_part, tasks)
+
+    if budget is not None:
+        for (res, steps, aborted) in results:
+            budget.steps += steps
+            budget.aborted += aborted
+
+    return [ definition for (res, steps, aborted) in results for definition in res ]
+
+# task of extract_definitions_parallel: (part, offset of the part, engine,
+# budget limits per definition or None)
+#
+# returns the definitions, the steps and the abandoned definitions (offsets
+# into the whole source) of the part
+def extract_part(task):
+    (part, base, engine, limits) = task
+    if limits is None:
+        definitions = extract_definitions(part, engine)
+        return ([ (definition, base + start, base + end) for (definition, start, end) in definitions ], 0, [])
 
-visibility = pp.Keyword('private'  ).setParseAction( pp.replaceWith( CppHierarchicalTypeDefinition.VISIBILITY_PRIVATE   ) ) \
-           | pp.Keyword('public'   ).setParseAction( pp.replaceWith( CppHierarchicalTypeDefinition.VISIBILITY_PUBLIC    ) ) \
-           | pp.Keyword('protected').setParseAction( pp.replaceWith( CppHierarchicalTypeDefinition.VISIBILITY_PROTECTED ) )
+    budget = ParseBudget(**limits)
+    budget.offset = base
+    definitions = extract_definitions(part, engine, budget)
+    return ([ (definition, base + start, base + end) for (definition, start, end) in definitions ], budget.steps, budget.aborted)
 
-visibility_space = pp.Group(visibility + pp.Literal(':').suppress() + pp.ZeroOrMore(fun_def | (pp.Optional(decl) + pp.Literal(';').suppress()) | (identifier + pp.Literal(';'))))
 
-inheritance = pp.Optional(visibility)('visibility') + identifier('base_class_name')
-inheritance.setParseAction(lambda res: CppInheritance(res.base_class_name, res.visibility if len(res) != 0 else CppHierarchicalTypeDefinition.VISIBILITY_DEFAULT))
+# reentrant parser
+#
+# the module grammar is shared by all users of the module: its elements are
+# streamlined and reconfigured (see ignore) in place, and its packrat cache is
+# global. A CppParser owns a copy of the grammar (as configured when it is
+# created) and, with packrat=True, its own packrat cache (cache_size entries,
+# see PackratCache), which is reset for every source. An instance must only be
+# used by one thread at a time, separate instances can be used concurrently.
+class CppParser:
+    def __init__(self, engine=None, packrat=False, cache_size=default_cache_size, eviction='lru'):
+        import copy
+        import pyparsing as pp
+        from pp_utils import PackratCache, memoize, unmemoize
+
+        self.engine = engine or default_engine
+        module = grammar()
+        self.ignored = list(ignored)
+
+        # Optional marks a missing default value with a class attribute compared
+        # by identity, which must not be copied
+        not_matched = pp.Optional._Optional__optionalNotMatched
+        memo = { id(not_matched): not_matched }
+
+        # all productions are copied together, streamline may have inlined some
+        # of them into others
+        elements = dict((name, value) for (name, value) in vars(module).items() if isinstance(value, pp.ParserElement))
+        elements['definition_kinds'] = module.definition_kinds
+        elements = copy.deepcopy(elements, memo)
+        for (name, value) in elements.items():
+            setattr(self, name, value)
+
+        for (definition, keywords) in self.definition_kinds:
+            definition.streamline()
+
+        # the copies share the memoization of the module grammar, if enabled
+        self.productions = productions(elements)
+        unmemoize(self.productions)
+        self.cache = None
+        if packrat:
+            self.cache = PackratCache(cache_size, eviction)
+            memoize(self.productions, self.cache)
+
+    def ignore(self, expr):
+        self.ignored.append(expr)
+        for (definition, keywords) in self.definition_kinds:
+            definition.ignore(expr)
+
+    def grammar_key(self):
+        return '%d:%s:%s' % (grammar_version, self.engine, '|'.join(str(e) for e in self.ignored))
+
+    def scan_definitions(self, source, budget=None):
+        if self.engine == 'tokens':
+            return token_scan_definitions(source, budget, self.ignored)
+        return pyparsing_scan_definitions(source, budget, self.definition_kinds, self.cache, self.productions)
+
+    def extract_definitions(self, source, budget=None):
+        res = list(self.scan_definitions(source, budget))
+        if self.cache is not None:
+            self.cache.reset()
+        return res
+
+    def iter_definitions(self, source, chunk_size=64*1024, budget=None):
+        return iter_definitions(source, chunk_size, scan=self.scan_definitions, budget=budget)
+
+# parses the sources with a pool of threads, each with its own CppParser
+#
+# returns the lists of (definition, start, end) in the order of the sources
+def extract_batch(sources, threads=4, engine=None, packrat=False, cache_size=default_cache_size):
+    import concurrent.futures
 
-type_def = pp.Keyword('typedef') + pp.Optional(pp.Literal('typename')) + type_expression('expr') + identifier('name')
-type_def.setParseAction(lambda res: CppTypeDefinition(res.expr[0], res.name))
+    local = threading.local()
 
-hierarchical_type_def   = pp.Forward()
-hierarchical_type_def <<= pp.Optional(visibility) + hierarchical_type_decl('decl') + \
-              pp.Optional(pp.Group(pp.Literal(':').suppress() + csl(inheritance)))('base_classes') \
-            + pp.Literal('{') \
-                + pp.Group(pp.ZeroOrMore(fun_def | (pp.Optional(decl) + pp.Literal(';').suppress())))('default_vis_space') \
-                + pp.ZeroOrMore(visibility_space)('vis_spaces') \
-                + pp.SkipTo(pp.Literal('}'), ignore=get_scope('{','}')) \
-            + pp.Literal('}')
-hierarchical_type_def.setParseAction(build_hierarchical_type)
+    def extract(source):
+        parser = getattr(local, 'parser', None)
+        if parser is None:
+            parser = local.parser = CppParser(engine, packrat, cache_size)
+        return parser.extract_definitions(source)
 
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(extract, sources))
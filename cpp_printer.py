@@ -5,6 +5,10 @@ from cpp_lang import *
 
 class CppPrinter:
 
+    def __init__(self):
+        # string forms of the (interned) type expressions printed so far
+        self.type_expr_strs = {}
+
     def declaration_str(self, declaration):
         return self.type_expr_str(declaration.data_type) + ' ' + self.identifier_str(declaration.identifier)
 
@@ -48,6 +52,17 @@ class CppPrinter:
         return '(' + ', '.join(map(self.declaration_str, pl)) + ')'
 
     def type_expr_str(self, type_id):
+        try:
+            return self.type_expr_strs[type_id]
+        except (KeyError, TypeError):
+            pass
+
+        res = self.format_type_expr(type_id)
+        if isinstance(type_id, CppInternedType):
+            self.type_expr_strs[type_id] = res
+        return res
+
+    def format_type_expr(self, type_id):
         if type(type_id) == CppPointerTypeExpression:
             ref_str = '*' if type_id.ref_type == CppPointerTypeExpression.POINTER_VAR   else \
                       '&' if type_id.ref_type == CppPointerTypeExpression.REFERENCE_VAR else \
@@ -68,7 +83,7 @@ class CppPrinter:
             # format template args
             template_str = ''
             if type_id.template_args:
-                template_str = '<' + ', '.join(map(self.type_expr_str, type_id.template_args)) + '>'
+                template_str = '<' + ', '.join(map(self.template_arg_str, type_id.template_args)) + '>'
 
             res.append(type_id.type_name + template_str)
 
@@ -76,6 +91,12 @@ class CppPrinter:
         else:
             raise ValueError(str(type(type_id)) + ' is not a c++ type object!')
 
+    # a template argument is a type or a value (e.g. std::array<int, 3>)
+    def template_arg_str(self, arg):
+        if isinstance(arg, CppInternedType):
+            return self.type_expr_str(arg)
+        return str(arg)
+
     def typedef_str(self, typedef):
         return 'typedef' + ' ' + self.type_expr_str(typedef.type_expr) + ' ' + typedef.type_name
 
@@ -100,10 +121,7 @@ class CppPrinter:
         prefix_str = self.hierarchical_type_prefix_str(hierarchical_type.hierarchical_type)
         name_str = hierarchical_type.name
         
-        if hierarchical_type.base_types:
-            inherits = [self.inheritance_str(i) for i in hierarchical_type.base_types[0]]
-        else:
-            inherits = []
+        inherits = [self.inheritance_str(i) for i in hierarchical_type.base_types]
 
         default_vars   = ['\t' + self.declaration_str(m.member_decl) + ';' for m in hierarchical_type.member_variables if m.vis == CppHierarchicalTypeDefinition.VISIBILITY_DEFAULT]
         public_vars    = ['\t' + self.declaration_str(m.member_decl) + ';' for m in hierarchical_type.member_variables if m.vis == CppHierarchicalTypeDefinition.VISIBILITY_PUBLIC]
@@ -0,0 +1,175 @@
+# profiling of the grammar of cpp_parser (cpp_grammar)
+#
+# the named productions (see setName in cpp_grammar) and all scope skipping
+# elements are instrumented with pyparsing's debug actions. These are only
+# called for elements with debugging switched on, so the grammar runs at full
+# speed while the profiler is not enabled.
+
+import json
+import time
+
+import pyparsing as pp
+
+import cpp_parser
+import pp_utils
+
+
+productions = [
+    'identifier', 'int_value', 'ref', 'base_type',
+    'type_expression', 'template_param', 'template', 'general_flags', 'hierarchical_type',
+    'var_decl', 'var_decl_list', 'parameter_list', 'fun_decl', 'fun_call', 'fun_def',
+    'hierarchical_type_decl', 'friend_decl', 'decl', 'declarator', 'fun_signature', 'member_decl',
+    'visibility_space', 'inheritance',
+    'type_def', 'hierarchical_type_def'
+]
+
+
+class ProductionStats:
+    def __init__(self, name):
+        self.name = name
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        # time spent in the outermost attempts (recursive attempts are included)
+        self.time = 0.0
+        self.max_loc = -1
+        # number of attempts in progress
+        self.active = 0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'failures': self.failures,
+            'time': self.time,
+            'max_loc': self.max_loc
+        }
+
+
+# all elements reachable from the given ones
+def grammar_elements(roots):
+    seen = set()
+    todo = list(roots)
+    res = []
+    while todo:
+        e = todo.pop()
+        if id(e) in seen:
+            continue
+        seen.add(id(e))
+        res.append(e)
+
+        todo.extend(getattr(e, 'exprs', []))
+        todo.extend(e.ignoreExprs)
+        for attr in ['expr', 'ignoreExpr']:
+            child = getattr(e, attr, None)
+            if isinstance(child, pp.ParserElement):
+                todo.append(child)
+    return res
+
+
+class GrammarProfiler:
+    def __init__(self, roots=None):
+        if roots is None:
+            roots = [ definition for (definition, keywords) in cpp_parser.definition_kinds ]
+        self.roots = roots
+        self.stats = {}
+        # (statistics, start time) of the attempts in progress
+        self.stack = []
+        self.instrumented = []
+        # the previous parse of the roots (see pp_utils.limit)
+        self.guarded = []
+
+    def enable(self):
+        for e in grammar_elements(self.roots):
+            if isinstance(e, pp_utils.SkipScope):
+                name = 'skip_scope' + e.name
+            elif getattr(e, 'name', None) in productions:
+                name = e.name
+            else:
+                continue
+
+            if name not in self.stats:
+                self.stats[name] = ProductionStats(name)
+            stats = self.stats[name]
+
+            e.setDebugActions(
+                    lambda instring, loc, expr, stats=stats: self.start(stats),
+                    lambda instring, start, end, expr, tokens, stats=stats: self.success(stats, end),
+                    lambda instring, loc, expr, exc, stats=stats: self.failure(stats, exc)
+            )
+            self.instrumented.append(e)
+
+        # pyparsing calls the failure action for the exceptions derived from
+        # Exception (e.g. cpp_budget.BudgetExceeded). Others (KeyboardInterrupt)
+        # abandon the attempts in progress without it, the roots end them.
+        self.guarded = [ (e, vars(e).get('_parse')) for e in self.roots ]
+        for e in self.roots:
+            e._parse = self.guarded_parse(e._parse)
+
+    def disable(self):
+        for e in self.instrumented:
+            e.setDebug(False)
+        self.instrumented = []
+        pp_utils.unlimit(self.guarded)
+        self.guarded = []
+        self.abandon(0)
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+
+    def start(self, stats):
+        stats.attempts += 1
+        stats.active += 1
+        self.stack.append((stats, time.perf_counter()))
+
+    def finish(self, stats, loc):
+        t0 = self.stack.pop()[1]
+        stats.active -= 1
+        if stats.active == 0:
+            stats.time += time.perf_counter() - t0
+        if loc > stats.max_loc:
+            stats.max_loc = loc
+
+    def guarded_parse(self, parse):
+        def _parse(instring, loc, doActions=True, callPreParse=True):
+            depth = len(self.stack)
+            try:
+                return parse(instring, loc, doActions, callPreParse)
+            except BaseException:
+                self.abandon(depth)
+                raise
+        return _parse
+
+    # ends the attempts in progress above depth as failures
+    def abandon(self, depth):
+        while len(self.stack) > depth:
+            stats = self.stack[-1][0]
+            stats.failures += 1
+            self.finish(stats, -1)
+
+    def success(self, stats, loc):
+        stats.successes += 1
+        self.finish(stats, loc)
+
+    def failure(self, stats, exc):
+        stats.failures += 1
+        self.finish(stats, getattr(exc, 'loc', -1))
+
+    # statistics sorted by time (hot spots first)
+    def sorted_stats(self):
+        return sorted(self.stats.values(), key=lambda s: (-s.time, -s.attempts, s.name))
+
+    def report(self):
+        lines = [ '%-28s %10s %10s %10s %10s %10s' % ('production', 'attempts', 'successes', 'failures', 'time [s]', 'max loc') ]
+        for s in self.sorted_stats():
+            if s.attempts:
+                lines.append('%-28s %10d %10d %10d %10.4f %10d' % (s.name, s.attempts, s.successes, s.failures, s.time, s.max_loc))
+        return '\n'.join(lines)
+
+    def as_json(self):
+        return json.dumps([ s.as_dict() for s in self.sorted_stats() ], indent=2)
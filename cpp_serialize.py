@@ -0,0 +1,327 @@
+# serialized form of the extracted definitions
+#
+# downstream tools load the (definition, start, end) triples of
+# cpp_parser.scan_definitions from a file instead of parsing the sources again.
+# The definitions are written one by one, as they are parsed, as a stream of
+# records: plain lists of strings, ints and lists.
+#
+#   ['T', type_name, type_args, template_args]            type expression
+#   ['P', inner_type, ref_type, ref_volatility]           pointer or reference
+#   ['C', start, end, hierarchical_type, name, base_types, member_variables, member_functions]
+#   ['D', start, end, type_expr, type_name]               typedef
+#
+#   base_types:       [base_id, vis]
+#   member_variables: [vis, data_type, identifier]
+#   member_functions: [vis, is_definition, name, return_type, params, args, template_params]
+#   params:           [data_type, identifier]
+#
+# type expressions are interned (see cpp_lang.CppInternedType), each one is
+# written once per stream, before its first use, and referred to by its index
+# among the type records. Template arguments (and parameters) are type
+# references or, for values, lists of the value.
+#
+# the records are encoded either as JSON lines (a header object, then one
+# record per line) or in a compact binary form: MAGIC, the header as JSON and
+# a zlib stream of frames, each holding the records of one definition in
+# marshal format (version 4, read by all Python 3 versions from 3.4 on),
+# preceded by its length. The header holds the format
+# VERSION, increased with every incompatible change of the records, and the
+# metadata given to the writer (e.g. the path of the source and
+# cpp_parser.grammar_key()).
+#
+# only cpp_lang is needed to load the definitions (not the parser).
+
+import json
+import marshal
+import os
+import stat
+import struct
+import zlib
+
+from cpp_lang import CppHierarchicalTypeDefinition, CppTypeDefinition, CppFunctionDeclaration, \
+        CppFunctionDefinition, CppVarDeclaration, CppInheritance, CppMember, CppInternedType, \
+        CppTypeExpression, CppPointerTypeExpression
+
+FORMAT = 'cpp-ast'
+VERSION = 1
+
+MAGIC = b'CPPAST\n'
+MARSHAL_VERSION = 4
+
+# file name extensions of the encodings
+extensions = {
+    '.jsonl': 'jsonl',
+    '.cppast': 'binary'
+}
+
+
+class FormatError(Exception):
+    pass
+
+
+# definitions to records
+class Encoder:
+    def __init__(self):
+        # index of each type expression written
+        self.type_ids = {}
+        self.records = []
+
+    # the records of a definition and of the type expressions it introduces
+    def encode(self, definition, start, end):
+        if type(definition) == CppHierarchicalTypeDefinition:
+            record = ['C', start, end, definition.hierarchical_type, definition.name,
+                      [ [ base.base_id, base.vis ] for base in definition.base_types ],
+                      [ [ m.vis, self.type_ref(m.member_decl.data_type), m.member_decl.identifier ]
+                        for m in definition.member_variables ],
+                      [ self.function(m.vis, m.member_decl) for m in definition.member_functions ]]
+        elif type(definition) == CppTypeDefinition:
+            record = ['D', start, end, self.type_ref(definition.type_expr), definition.type_name]
+        else:
+            raise TypeError('cannot serialize %s' % type(definition).__name__)
+
+        records = self.records
+        records.append(record)
+        self.records = []
+        return records
+
+    def function(self, vis, decl):
+        return [ vis, 1 if type(decl) == CppFunctionDefinition else 0, decl.name, self.type_ref(decl.return_type),
+                 [ [ self.type_ref(p.data_type), p.identifier ] for p in decl.params ],
+                 decl.args, [ self.template_arg(a) for a in decl.template_params ] ]
+
+    def type_ref(self, type_expr):
+        try:
+            return self.type_ids[type_expr]
+        except KeyError:
+            pass
+
+        if type(type_expr) == CppPointerTypeExpression:
+            record = ['P', self.type_ref(type_expr.inner_type), type_expr.ref_type, type_expr.ref_volatility]
+        else:
+            record = ['T', type_expr.type_name, type_expr.type_args,
+                      [ self.template_arg(a) for a in type_expr.template_args ]]
+
+        self.records.append(record)
+        self.type_ids[type_expr] = len(self.type_ids)
+        return self.type_ids[type_expr]
+
+    def template_arg(self, arg):
+        if isinstance(arg, CppInternedType):
+            return self.type_ref(arg)
+        return [arg]
+
+
+# records to definitions
+class Decoder:
+    def __init__(self):
+        self.types = []
+
+    # (definition, start, end) of a record, None for a type expression
+    def decode(self, record):
+        tag = record[0]
+        types = self.types
+        if tag == 'T':
+            types.append(CppTypeExpression(record[1], record[2], [ self.template_arg(a) for a in record[3] ]))
+        elif tag == 'P':
+            types.append(CppPointerTypeExpression(types[record[1]], record[2], record[3]))
+        elif tag == 'C':
+            definition = CppHierarchicalTypeDefinition(
+                    record[3], record[4],
+                    base_types=[ CppInheritance(base_id, vis) for (base_id, vis) in record[5] ],
+                    member_variables=[ CppMember(CppVarDeclaration(types[data_type], identifier), vis)
+                                       for (vis, data_type, identifier) in record[6] ],
+                    member_functions=[ CppMember(self.function(f), f[0]) for f in record[7] ]
+            )
+            return (definition, record[1], record[2])
+        elif tag == 'D':
+            return (CppTypeDefinition(types[record[3]], record[4]), record[1], record[2])
+        else:
+            raise FormatError('unknown record: %r' % (tag,))
+        return None
+
+    def function(self, record):
+        (vis, is_definition, name, return_type, params, args, template_params) = record
+        types = self.types
+        decl = CppFunctionDeclaration(name, types[return_type],
+                                      [ CppVarDeclaration(types[data_type], identifier) for (data_type, identifier) in params ],
+                                      args, [ self.template_arg(a) for a in template_params ])
+        if is_definition:
+            return CppFunctionDefinition(decl)
+        return decl
+
+    def template_arg(self, arg):
+        if type(arg) == list:
+            return arg[0]
+        return self.types[arg]
+
+
+def header(encoding, meta):
+    res = dict(meta or {})
+    res.update({ 'format': FORMAT, 'version': VERSION, 'encoding': encoding })
+    return res
+
+def check_header(res):
+    if not isinstance(res, dict) or res.get('format') != FORMAT:
+        raise FormatError('not a serialized AST')
+    if res.get('version') != VERSION:
+        raise FormatError('unsupported version %r (expected %d)' % (res.get('version'), VERSION))
+    return res
+
+
+# writers of the encodings to a binary stream, write each definition as soon
+# as it is parsed and close the writer (not the stream) after the last one
+#
+# meta: additional fields of the header (must be JSON serializable)
+class JsonLinesWriter:
+    def __init__(self, stream, meta=None):
+        self.stream = stream
+        self.encoder = Encoder()
+        stream.write(json.dumps(header('jsonl', meta), sort_keys=True).encode('utf-8') + b'\n')
+
+    def write(self, definition, start, end):
+        records = self.encoder.encode(definition, start, end)
+        self.stream.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode('utf-8'))
+
+    def close(self):
+        pass
+
+class BinaryWriter:
+    def __init__(self, stream, meta=None):
+        self.stream = stream
+        self.encoder = Encoder()
+        data = json.dumps(header('binary', meta), sort_keys=True).encode('utf-8')
+        stream.write(MAGIC + struct.pack('<I', len(data)) + data)
+        self.compressor = zlib.compressobj()
+
+    def write(self, definition, start, end):
+        data = marshal.dumps(self.encoder.encode(definition, start, end), MARSHAL_VERSION)
+        self.stream.write(self.compressor.compress(struct.pack('<I', len(data)) + data))
+
+    def close(self):
+        self.stream.write(self.compressor.flush())
+
+writers = {
+    'jsonl': JsonLinesWriter,
+    'binary': BinaryWriter
+}
+
+
+# reads either encoding from a binary stream: the header is read right away,
+# iterating yields the (definition, start, end) triples
+class Reader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = Decoder()
+
+        start = stream.read(len(MAGIC))
+        if start == MAGIC:
+            (length,) = struct.unpack('<I', self.read_exactly(4))
+            self.header = check_header(self.loads_json(self.read_exactly(length)))
+        else:
+            self.header = check_header(self.loads_json(start + stream.readline()))
+
+    def __iter__(self):
+        decode = self.decoder.decode
+        if self.header['encoding'] == 'binary':
+            for frame in self.frames():
+                for record in marshal.loads(frame):
+                    res = decode(record)
+                    if res is not None:
+                        yield res
+        else:
+            for line in self.stream:
+                res = decode(self.loads_json(line))
+                if res is not None:
+                    yield res
+
+    # the frames of the binary encoding, decompressed in chunks
+    def frames(self, chunk_size=64*1024):
+        decompressor = zlib.decompressobj()
+        buf = b''
+        while True:
+            chunk = self.stream.read(chunk_size)
+            try:
+                buf += decompressor.decompress(chunk) if chunk else decompressor.flush()
+            except zlib.error as e:
+                raise FormatError('corrupt file: %s' % e)
+
+            pos = 0
+            while len(buf) - pos >= 4:
+                (length,) = struct.unpack_from('<I', buf, pos)
+                if len(buf) - pos - 4 < length:
+                    break
+                yield buf[pos + 4:pos + 4 + length]
+                pos += 4 + length
+            buf = buf[pos:]
+
+            if not chunk:
+                if buf or not decompressor.eof:
+                    raise FormatError('truncated file')
+                return
+
+    def read_exactly(self, length):
+        data = self.stream.read(length)
+        if len(data) != length:
+            raise FormatError('truncated file')
+        return data
+
+    @staticmethod
+    def loads_json(data):
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError as e:
+            raise FormatError('invalid JSON: %s' % e)
+
+
+# the encoding of a file by its extension (default: binary)
+def encoding_of(path):
+    return extensions.get(os.path.splitext(path)[1], 'binary')
+
+# creates a new file next to path for writing, returns (fd, its path)
+#
+# unlike with tempfile.mkstemp (0600) the file gets the permissions of any new
+# file: it is created with 0666 and the kernel applies the umask
+def create_temp_file(path):
+    (directory, name) = os.path.split(os.path.abspath(path))
+    while True:
+        tmp_path = os.path.join(directory, '.%s.%s.tmp' % (name, os.urandom(6).hex()))
+        try:
+            return (os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0), 0o666), tmp_path)
+        except FileExistsError:
+            pass
+
+# writes the (definition, start, end) triples to path while they are produced
+# (e.g. by cpp_parser.iter_definitions), returns their number
+#
+# the file is replaced atomically once all definitions are written, readers
+# never see a partially written file. A replaced file keeps its permissions.
+def dump(definitions, path, meta=None, encoding=None):
+    writer_class = writers[encoding or encoding_of(path)]
+
+    (fd, tmp_path) = create_temp_file(path)
+    try:
+        count = 0
+        with os.fdopen(fd, 'wb') as f:
+            writer = writer_class(f, meta)
+            for (definition, start, end) in definitions:
+                writer.write(definition, start, end)
+                count += 1
+            writer.close()
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+# (header, list of (definition, start, end)) of a file in either encoding
+def load(path):
+    with open(path, 'rb') as f:
+        reader = Reader(f)
+        return (reader.header, list(reader))
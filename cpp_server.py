@@ -0,0 +1,277 @@
+# parse server
+#
+# keeps the grammar warm in a long-running process: the parsers (see
+# cpp_parser.CppParser) are created once and reused by all requests, and an
+# optional cpp_cache.ParseCache is shared. Clients (see cpp_client) connect to a
+# Unix socket and send requests, one JSON object per line, each answered by one
+# JSON object per line. Connections are handled concurrently, each by its own
+# thread, which takes an idle parser from the pool for every parse.
+#
+# requests (all may carry an 'id', which is returned in the response):
+#   {"op": "parse", "path": "/abs/file.h"}          parse a file
+#   {"op": "parse", "source": "class A {...};"}     parse a buffer
+#       optional: "engine" (see cpp_parser.engines)
+#   {"op": "stats"}                                 request counts and latencies
+#   {"op": "ping"}
+#   {"op": "shutdown"}                              stop the server
+#
+# responses: {"ok": true, ...} or {"ok": false, "error": message}. A parse
+# returns the classes and typedefs (see definitions_json) and the time spent
+# on the request in the server.
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+import cpp_lang
+import cpp_parser
+import cpp_printer
+import cpp_source
+
+
+# JSON form of the (definition, start, end) of source (a cpp_source.SourceFile)
+def definitions_json(definitions, source):
+    printer = cpp_printer.CppPrinter()
+    classes = []
+    typedefs = []
+    for (definition, start, end) in definitions:
+        (line, column) = source.location(start)
+        if type(definition) == cpp_lang.CppHierarchicalTypeDefinition:
+            classes.append({
+                'name': definition.name,
+                'kind': printer.hierarchical_type_prefix_str(definition.hierarchical_type),
+                'start': start,
+                'end': end,
+                'line': line,
+                'column': column,
+                'bases': [ { 'name': base.base_id, 'visibility': printer.visibility_str(base.vis) }
+                           for base in definition.base_types ],
+                'members': [ { 'name': m.member_decl.identifier,
+                               'type': printer.type_expr_str(m.member_decl.data_type),
+                               'visibility': printer.visibility_str(m.vis) }
+                             for m in definition.member_variables ],
+                'methods': [ { 'name': m.member_decl.name,
+                               'declaration': printer.function_decl_str(m.member_decl),
+                               'visibility': printer.visibility_str(m.vis) }
+                             for m in definition.member_functions ]
+            })
+        else:
+            typedefs.append({
+                'name': definition.type_name,
+                'type': printer.type_expr_str(definition.type_expr),
+                'start': start,
+                'end': end,
+                'line': line,
+                'column': column
+            })
+    return { 'classes': classes, 'typedefs': typedefs }
+
+
+# latencies of the requests of one kind
+class LatencyStats:
+    # number of recent latencies kept for the percentiles
+    WINDOW = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = []
+
+    def add(self, latency, ok=True):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.recent.append(latency)
+        if len(self.recent) > self.WINDOW:
+            del self.recent[:len(self.recent) - self.WINDOW]
+
+    def percentile(self, p):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': self.max
+        }
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            # (requests which are not objects or whose op is not a string are
+            # recorded with op None)
+            t0 = time.perf_counter()
+            request = {}
+            op = None
+            try:
+                message = json.loads(line.decode('utf-8'))
+                if not isinstance(message, dict):
+                    raise ValueError('a request must be a JSON object')
+                request = message
+                if not isinstance(request.get('op'), str):
+                    raise ValueError('op must be a string: %r' % (request.get('op'),))
+                op = request['op']
+                response = self.server.dispatch(op, request)
+                response['ok'] = True
+            except Exception as e:
+                response = { 'ok': False, 'error': '%s: %s' % (type(e).__name__, e) }
+            latency = time.perf_counter() - t0
+
+            if 'id' in request:
+                response['id'] = request['id']
+            response['time'] = latency
+            self.server.record(op, latency, response['ok'])
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+            if op == 'shutdown':
+                return
+
+
+class ParseServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    # cache: optional cpp_cache.ParseCache, log: stream for a line per request
+    def __init__(self, socket_path, engine=None, cache=None, packrat=False, log=None):
+        if os.path.exists(socket_path):
+            remove_stale_socket(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, RequestHandler)
+
+        self.socket_path = socket_path
+        self.engine = engine or cpp_parser.default_engine
+        self.cache = cache
+        self.packrat = packrat
+        self.log = log
+
+        # idle parsers by engine, the first one of the default engine is created
+        # right away
+        self.parsers = {}
+        self.parsers_lock = threading.Lock()
+        self.release_parser(self.acquire_parser(self.engine))
+
+        self.started = time.time()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def acquire_parser(self, engine):
+        with self.parsers_lock:
+            idle = self.parsers.setdefault(engine, queue.LifoQueue())
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            return cpp_parser.CppParser(engine, self.packrat)
+
+    def release_parser(self, parser):
+        self.parsers[parser.engine].put(parser)
+
+    def dispatch(self, op, request):
+        if op == 'parse':
+            return self.parse(request)
+        elif op == 'stats':
+            return self.stats_json()
+        elif op == 'ping':
+            return {}
+        elif op == 'shutdown':
+            # shutdown waits for serve_forever, which runs in another thread
+            threading.Thread(target=self.shutdown).start()
+            return {}
+        raise ValueError('unknown op: %r' % (op,))
+
+    def parse(self, request):
+        engine = request.get('engine') or self.engine
+        if engine not in cpp_parser.engines:
+            raise ValueError('unknown engine: %r' % (engine,))
+
+        if 'source' in request:
+            source = cpp_source.SourceFile.from_text(request['source'], request.get('path'))
+        else:
+            source = cpp_source.SourceFile(request['path'])
+
+        with source:
+            definitions = None
+            if self.cache is not None:
+                definitions = self.cache.get(source.text, engine)
+
+            if definitions is None:
+                parser = self.acquire_parser(engine)
+                try:
+                    definitions = parser.extract_definitions(source.text)
+                finally:
+                    self.release_parser(parser)
+                if self.cache is not None:
+                    self.cache.put(source.text, definitions, engine)
+
+            return definitions_json(definitions, source)
+
+    def record(self, op, latency, ok):
+        with self.stats_lock:
+            if op not in self.stats:
+                self.stats[op] = LatencyStats()
+            self.stats[op].add(latency, ok)
+        if self.log is not None:
+            self.log.write('%s %s %.2fms\n' % (op, 'ok' if ok else 'error', 1000 * latency))
+            self.log.flush()
+
+    def stats_json(self):
+        with self.stats_lock:
+            res = {
+                'uptime': time.time() - self.started,
+                'requests': dict((str(op), stats.as_dict()) for (op, stats) in self.stats.items())
+            }
+        with self.parsers_lock:
+            res['parsers'] = dict((engine, idle.qsize()) for (engine, idle) in self.parsers.items())
+        if self.cache is not None:
+            res['cache'] = self.cache.stats_str()
+        return res
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+# removes the socket file of a server which is no longer running: only a
+# socket nobody listens on is removed, any other file is left alone
+def remove_stale_socket(socket_path):
+    if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        raise OSError('not a socket: ' + socket_path)
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        s.close()
+    raise OSError('a server is already listening on ' + socket_path)
+
+
+def serve(socket_path, engine=None, cache=None, packrat=False, log=None):
+    server = ParseServer(socket_path, engine, cache, packrat, log)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
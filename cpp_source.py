@@ -0,0 +1,87 @@
+# loading of source files
+#
+# files are memory-mapped instead of read line by line, they are only decoded
+# when their text is needed. Offsets (in characters) are translated to lines and
+# columns with an index of the line starts.
+
+import bisect
+import codecs
+import io
+import mmap
+import re
+
+
+class SourceFile:
+    def __init__(self, path, encoding='utf-8', errors='replace'):
+        self.path = path
+        self.encoding = encoding
+        self.errors = errors
+
+        self._text = None
+        self._line_starts = None
+
+        with open(path, 'rb') as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                self.data = b''
+
+    # a source which is not read from a file (e.g. an editor buffer)
+    @staticmethod
+    def from_text(text, path=None):
+        source = SourceFile.__new__(SourceFile)
+        source.path = path
+        source.encoding = 'utf-8'
+        source.errors = 'surrogateescape'
+        source.data = text.encode(source.encoding, source.errors)
+        source._text = text
+        source._line_starts = None
+        return source
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_ascii(self):
+        return re.search(b'[\x80-\xff]', self.data) is None
+
+    # the decoded source (decoded on first use)
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = codecs.decode(self.data, self.encoding, self.errors)
+        return self._text
+
+    # a text stream over the mapped file (for cpp_parser.iter_definitions)
+    def stream(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.seek(0)
+            raw = self.data
+        else:
+            raw = io.BytesIO(self.data)
+        return codecs.getreader(self.encoding)(raw, self.errors)
+
+    # offsets of the first character of each line
+    @property
+    def line_starts(self):
+        if self._line_starts is None:
+            if self.is_ascii():
+                # byte and character offsets are the same, no need to decode
+                newlines = re.finditer(b'\n', self.data)
+            else:
+                newlines = re.finditer('\n', self.text)
+            self._line_starts = [0] + [ m.end() for m in newlines ]
+        return self._line_starts
+
+    # (line, column) of the offset, both starting at 1
+    def location(self, offset):
+        line = bisect.bisect_right(self.line_starts, offset)
+        return (line, offset - self.line_starts[line - 1] + 1)
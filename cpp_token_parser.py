@@ -0,0 +1,690 @@
+# parsing of the definitions on a buffer of tokens
+#
+# alternative engine for cpp_parser.scan_definitions: the source is lexed once
+# into a cpp_lexer.TokenBuffer and the productions of cpp_parser are functions
+# on token indices. Backtracking resets an index instead of matching
+# whitespace, comments and keywords again, scopes are skipped with the bracket
+# matches found while lexing.
+#
+# the functions follow the productions (and builders) of cpp_parser and create
+# the same cpp_lang objects. Unlike the character-level pp.SkipTo, skipping to
+# a ';', ',' or '}' never stops inside of a string literal or a comment.
+#
+# productions with a value return (index after the match, value) or None,
+# the others return the index after the match or -1
+
+from cpp_lang import *
+from cpp_builders import build_pointer_type_expression
+from cpp_budget import BudgetExceeded
+from cpp_lexer import TokenBuffer
+
+
+# symbols the grammar refers to (get the first symbol ids of each buffer)
+symbols = [
+    'static', 'const', 'volatile', 'unsigned', 'signed', 'char', 'short', 'int', 'long', 'float', 'double',
+    'bool', 'void', 'class', 'struct', 'union', 'virtual', 'inline', 'friend', 'typedef', 'typename',
+    'private', 'public', 'protected',
+    '::', ':', ',', ';', '<', '>', '(', ')', '[', ']', '{', '}', '*', '&', '~', '=', '+', '-', '0'
+]
+symbol_id = dict((name, i) for (i, name) in enumerate(symbols))
+
+STATIC    = symbol_id['static']
+CONST     = symbol_id['const']
+VOLATILE  = symbol_id['volatile']
+BOOL      = symbol_id['bool']
+VOID      = symbol_id['void']
+VIRTUAL   = symbol_id['virtual']
+INLINE    = symbol_id['inline']
+FRIEND    = symbol_id['friend']
+TYPEDEF   = symbol_id['typedef']
+TYPENAME  = symbol_id['typename']
+SCOPE     = symbol_id['::']
+COLON     = symbol_id[':']
+COMMA     = symbol_id[',']
+SEMICOLON = symbol_id[';']
+LESS      = symbol_id['<']
+GREATER   = symbol_id['>']
+LPAREN    = symbol_id['(']
+RPAREN    = symbol_id[')']
+LBRACKET  = symbol_id['[']
+LBRACE    = symbol_id['{']
+RBRACE    = symbol_id['}']
+STAR      = symbol_id['*']
+AMP       = symbol_id['&']
+TILDE     = symbol_id['~']
+ASSIGN    = symbol_id['=']
+PLUS      = symbol_id['+']
+MINUS     = symbol_id['-']
+ZERO      = symbol_id['0']
+
+signers   = frozenset([symbol_id['unsigned'], symbol_id['signed']])
+signables = frozenset(symbol_id[name] for name in ['char', 'short', 'int', 'long', 'float', 'double'])
+
+hierarchical_type_kinds = {
+    symbol_id['class']:  CppHierarchicalTypeDefinition.CLASS,
+    symbol_id['struct']: CppHierarchicalTypeDefinition.STRUCT,
+    symbol_id['union']:  CppHierarchicalTypeDefinition.UNION
+}
+
+visibilities = {
+    symbol_id['private']:   CppHierarchicalTypeDefinition.VISIBILITY_PRIVATE,
+    symbol_id['public']:    CppHierarchicalTypeDefinition.VISIBILITY_PUBLIC,
+    symbol_id['protected']: CppHierarchicalTypeDefinition.VISIBILITY_PROTECTED
+}
+
+IDENT  = TokenBuffer.IDENT
+NUMBER = TokenBuffer.NUMBER
+END    = TokenBuffer.END
+
+
+class TokenParser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.kinds = tokens.kinds
+        self.symbols = tokens.symbols
+        self.matches = tokens.matches
+        self.text = tokens.text
+        # optional cpp_budget.ParseBudget, a step is counted for every type
+        # expression and member
+        self.budget = None
+
+    # index of the next token with one of the symbols (pp.SkipTo)
+    def skip_to(self, i, stops):
+        symbols = self.symbols
+        kinds = self.kinds
+        while symbols[i] not in stops:
+            if kinds[i] == END:
+                return -1
+            i += 1
+        return i
+
+    # skip_scope: index after the bracket matching the one at i
+    def skip_scope(self, i, bracket):
+        if self.symbols[i] == bracket:
+            return self.matches[i]
+        return -1
+
+    # type expressions
+
+    def ref(self, i):
+        symbols = self.symbols
+        s = symbols[i]
+        if s == STAR:
+            ref = [CppPointerTypeExpression.POINTER_VAR]
+        elif s == AMP:
+            ref = [CppPointerTypeExpression.REFERENCE_VAR]
+        else:
+            return None
+
+        i += 1
+        s = symbols[i]
+        if s == CONST:
+            ref.append(TypeArgs.CONST_TYPE)
+            i += 1
+        elif s == VOLATILE:
+            ref.append(TypeArgs.VOLATILE_TYPE)
+            i += 1
+        return (i, ref)
+
+    def int_value(self, i):
+        sign = 1
+        s = self.symbols[i]
+        if s == PLUS:
+            i += 1
+        elif s == MINUS:
+            sign = -1
+            i += 1
+        if self.kinds[i] != NUMBER:
+            return None
+        return (i + 1, int(self.text(i)) * sign)
+
+    def hierarchical_type(self, i):
+        symbols = self.symbols
+        kinds = self.kinds
+        if symbols[i] in hierarchical_type_kinds:
+            i += 1
+        if kinds[i] != IDENT:
+            return None
+
+        name = self.text(i)
+        i += 1
+        while symbols[i] == SCOPE and kinds[i + 1] == IDENT:
+            name += '::' + self.text(i + 1)
+            i += 2
+        return (i, name)
+
+    # appends the value of the parameter (a type with its pointers and
+    # references, as in cpp_grammar.template_param)
+    def template_param(self, i, values):
+        r = self.type_expression(i)
+        if r is not None:
+            (i, type_expr) = r
+            refs = []
+            while True:
+                r = self.ref(i)
+                if r is None:
+                    values.append(build_pointer_type_expression(type_expr, refs))
+                    return i
+                (i, ref) = r
+                refs.append(ref)
+
+        # (long_value can only match where int_value does)
+        r = self.int_value(i)
+        if r is None:
+            return -1
+        (i, value) = r
+        values.append(value)
+        return i
+
+    def template(self, i):
+        symbols = self.symbols
+        values = []
+        i = self.template_param(i + 1, values)
+        if i < 0:
+            return None
+        while symbols[i] == COMMA:
+            j = self.template_param(i + 1, values)
+            if j < 0:
+                break
+            i = j
+        if symbols[i] != GREATER:
+            return None
+        return (i + 1, values)
+
+    def type_expression(self, i):
+        if self.budget is not None:
+            self.budget.step(self.tokens.starts[i])
+        symbols = self.symbols
+
+        # general_flags
+        args = 0
+        while True:
+            s = symbols[i]
+            if s == STATIC:
+                args += TypeArgs.STATIC_TYPE
+            elif s == CONST:
+                args += TypeArgs.CONST_TYPE
+            elif s == VOLATILE:
+                args += TypeArgs.VOLATILE_TYPE
+            else:
+                break
+            i += 1
+
+        # base_type | hierarchical_type
+        s = symbols[i]
+        if s in signers:
+            if symbols[i + 1] in signables:
+                name = self.text(i) + ' ' + self.text(i + 1)
+                i += 2
+            else:
+                name = self.text(i)
+                i += 1
+        elif s in signables or s == BOOL or s == VOID:
+            name = self.text(i)
+            i += 1
+        else:
+            r = self.hierarchical_type(i)
+            if r is None:
+                return None
+            (i, name) = r
+
+        template_args = ()
+        if symbols[i] == LESS:
+            r = self.template(i)
+            if r is not None:
+                (i, template_args) = r
+
+        return (i, CppTypeExpression(name, args, template_args))
+
+    # declarations
+
+    # refs, name and array brackets: (index, refs, name) or None
+    def declarator(self, i):
+        refs = []
+        while True:
+            r = self.ref(i)
+            if r is None:
+                break
+            (i, ref) = r
+            refs.append(ref)
+
+        if self.kinds[i] != IDENT:
+            return None
+        name = self.text(i)
+        i += 1
+
+        while True:
+            j = self.skip_scope(i, LBRACKET)
+            if j < 0:
+                return (i, refs, name)
+            i = j
+
+    def var_decl(self, i):
+        r = self.type_expression(i)
+        if r is None:
+            return None
+        (i, type_expr) = r
+
+        r = self.declarator(i)
+        if r is None:
+            return None
+        (i, refs, name) = r
+
+        if self.symbols[i] == ASSIGN:
+            j = self.skip_to(i + 1, (SEMICOLON,))
+            if j >= 0:
+                i = j
+
+        return (i, CppVarDeclaration(build_pointer_type_expression(type_expr, refs), name))
+
+    # declarator with an optional initializer, in a list of variables
+    def var_item(self, i):
+        r = self.declarator(i)
+        if r is None:
+            return None
+        (i, refs, name) = r
+
+        if self.symbols[i] == ASSIGN:
+            j = self.skip_to(i + 1, (COMMA, SEMICOLON))
+            if j >= 0:
+                i = j
+        return (i, refs, name)
+
+    def var_decl_list(self, i):
+        r = self.type_expression(i)
+        if r is None:
+            return None
+        (i, type_expr) = r
+
+        res = []
+        r = self.var_item(i)
+        while r is not None:
+            (i, refs, name) = r
+            res.append(CppVarDeclaration(build_pointer_type_expression(type_expr, refs), name))
+            if self.symbols[i] != COMMA:
+                break
+            r = self.var_item(i + 1)
+        return (i, res)
+
+    # functions
+
+    # virtual and inline flags: (index, function args)
+    def fun_flags(self, i):
+        symbols = self.symbols
+        args = 0
+        while True:
+            s = symbols[i]
+            if s == VIRTUAL:
+                args |= FunctionArgs.VIRTUAL_FUNCTION
+            elif s == INLINE:
+                args |= FunctionArgs.INLINE_FUNCTION
+            else:
+                return (i, args)
+            i += 1
+
+    def parameter_list(self, i):
+        symbols = self.symbols
+        if symbols[i] != LPAREN:
+            return None
+        i += 1
+
+        # (an empty list matches before 'void' is tried, as in cpp_parser)
+        params = []
+        r = self.var_decl(i)
+        while r is not None:
+            (i, param) = r
+            params.append(param)
+            if symbols[i] != COMMA:
+                break
+            r = self.var_decl(i + 1)
+
+        if symbols[i] != RPAREN:
+            return None
+        return (i + 1, params)
+
+    # parameters, const and '= 0': (index, params, function args) or None
+    def fun_signature(self, i):
+        r = self.parameter_list(i)
+        if r is None:
+            return None
+        (i, params) = r
+
+        symbols = self.symbols
+        args = 0
+        if symbols[i] == CONST:
+            args += FunctionArgs.CONST_FUNCTION
+            i += 1
+        if symbols[i] == ASSIGN and symbols[i + 1] == ZERO:
+            args += FunctionArgs.ABSTRACT_FUNCTION
+            i += 2
+        return (i, params, args)
+
+    def fun_call(self, i):
+        if self.kinds[i] != IDENT:
+            return -1
+        return self.skip_scope(i + 1, LPAREN)
+
+    # initializer list and body of a function definition
+    def fun_body(self, i):
+        if self.symbols[i] == COLON:
+            j = self.fun_call(i + 1)
+            if j >= 0:
+                i = j
+                while self.symbols[i] == COMMA:
+                    j = self.fun_call(i + 1)
+                    if j < 0:
+                        break
+                    i = j
+        return self.skip_scope(i, LBRACE)
+
+    def fun_decl(self, i):
+        (i, args) = self.fun_flags(i)
+
+        r = self.var_decl(i)
+        if r is not None:
+            (i, var) = r
+            name = var.identifier
+            return_type = var.data_type
+        else:
+            if self.symbols[i] == TILDE:
+                args += FunctionArgs.DESTRUCTOR_FUNCTION
+                i += 1
+            r = self.type_expression(i)
+            if r is None:
+                return None
+            (i, return_type) = r
+            name = None
+            args += FunctionArgs.CONSTRUCTOR_FUNCTION
+
+        r = self.fun_signature(i)
+        if r is None:
+            return None
+        (i, params, signature_args) = r
+
+        return (i, CppFunctionDeclaration(name, return_type, params, args + signature_args))
+
+    def fun_def(self, i):
+        r = self.fun_decl(i)
+        if r is None:
+            return None
+        (i, decl) = r
+
+        i = self.fun_body(i)
+        if i < 0:
+            return None
+        return (i, CppFunctionDefinition(decl))
+
+    # members
+
+    # a declaration of friend_decl: (index, function or None) or None
+    def friend_item(self, i):
+        r = self.fun_def(i) or self.fun_decl(i)
+        if r is not None:
+            return r
+        if self.symbols[i] in hierarchical_type_kinds and self.kinds[i + 1] == IDENT:
+            return (i + 2, None)
+        if self.kinds[i] == IDENT:
+            return (i + 1, None)
+        return None
+
+    # only the functions are kept (the builder of the hierarchical types ignores
+    # the rest)
+    def friend_decl(self, i):
+        if self.symbols[i] != FRIEND:
+            return None
+        i += 1
+
+        res = []
+        r = self.friend_item(i)
+        while r is not None:
+            (i, decl) = r
+            if decl is not None:
+                res.append(decl)
+            if self.symbols[i] != COMMA:
+                break
+            r = self.friend_item(i + 1)
+        return (i, res)
+
+    def decl(self, i):
+        r = self.fun_decl(i)
+        if r is not None:
+            return (r[0], [r[1]])
+        return self.var_decl_list(i) or self.friend_decl(i)
+
+    # see cpp_grammar.member_decl and cpp_builders.build_member_declaration
+    def member_decl(self, i):
+        symbols = self.symbols
+        (i, flags) = self.fun_flags(i)
+
+        r = self.type_expression(i)
+        if r is not None:
+            (j, type_expr) = r
+
+            r = self.declarator(j)
+            if r is not None:
+                (k, refs, name) = r
+                return_type = build_pointer_type_expression(type_expr, list(refs))
+
+                r = self.fun_end(k, name, return_type, flags)
+                if r is not None:
+                    return r
+
+                r = self.var_end(k)
+                if r is not None:
+                    if flags:
+                        return None
+                    (k, items) = r
+                    return (k, [ CppVarDeclaration(build_pointer_type_expression(type_expr, item_refs), item_name)
+                                 for (item_refs, item_name) in [(refs, name)] + items ])
+
+            r = self.fun_end(j, None, type_expr, flags + FunctionArgs.CONSTRUCTOR_FUNCTION)
+            if r is not None:
+                return r
+
+            if symbols[j] == SEMICOLON:
+                if flags:
+                    return None
+                return (j + 1, [])
+
+        elif symbols[i] == TILDE:
+            r = self.type_expression(i + 1)
+            if r is not None:
+                (j, type_expr) = r
+                return self.fun_end(j, None, type_expr,
+                        flags + FunctionArgs.DESTRUCTOR_FUNCTION + FunctionArgs.CONSTRUCTOR_FUNCTION)
+
+        return None
+
+    # signature and body or ';' of a member function
+    def fun_end(self, i, name, return_type, args):
+        r = self.fun_signature(i)
+        if r is None:
+            return None
+        (i, params, signature_args) = r
+
+        decl = CppFunctionDeclaration(name, return_type, params, args + signature_args)
+
+        j = self.fun_body(i)
+        if j >= 0:
+            return (j, [CppFunctionDefinition(decl)])
+        if self.symbols[i] == SEMICOLON:
+            return (i + 1, [decl])
+        return None
+
+    # rest of a list of variables: (index, [(refs, name)]) or None
+    def var_end(self, i):
+        symbols = self.symbols
+        if symbols[i] == ASSIGN:
+            j = self.skip_to(i + 1, (COMMA, SEMICOLON))
+            if j >= 0:
+                i = j
+
+        items = []
+        while symbols[i] == COMMA:
+            r = self.var_item(i + 1)
+            if r is None:
+                break
+            (i, refs, name) = r
+            items.append((refs, name))
+
+        if symbols[i] != SEMICOLON:
+            return None
+        return (i + 1, items)
+
+    def member(self, i):
+        if self.budget is not None:
+            self.budget.step(self.tokens.starts[i])
+        r = self.member_decl(i)
+        if r is not None:
+            return r
+
+        s = self.symbols[i]
+        if s == VIRTUAL or s == INLINE or s == FRIEND:
+            r = self.decl(i)
+            if r is not None and self.symbols[r[0]] == SEMICOLON:
+                return (r[0] + 1, r[1])
+        elif s == SEMICOLON:
+            return (i + 1, [])
+        return None
+
+    # members up to the first one not matching: (index, declarations)
+    def members(self, i, identifiers=False):
+        res = []
+        while True:
+            r = self.member(i)
+            if r is not None:
+                (i, decls) = r
+                res.extend(decls)
+            elif identifiers and self.kinds[i] == IDENT and self.symbols[i + 1] == SEMICOLON:
+                i += 2
+            else:
+                return (i, res)
+
+    # definitions
+
+    def inheritance(self, i):
+        visibility = visibilities.get(self.symbols[i])
+        if visibility is not None:
+            i += 1
+        else:
+            visibility = CppHierarchicalTypeDefinition.VISIBILITY_DEFAULT
+        if self.kinds[i] != IDENT:
+            return None
+        return (i + 1, CppInheritance(self.text(i), visibility))
+
+    def hierarchical_type_def(self, i):
+        symbols = self.symbols
+        kinds = self.kinds
+
+        if symbols[i] in visibilities:
+            i += 1
+        if symbols[i] not in hierarchical_type_kinds or kinds[i + 1] != IDENT:
+            return None
+        struct_type = hierarchical_type_kinds[symbols[i]]
+        name = self.text(i + 1)
+        i += 2
+
+        base_types = []
+        if symbols[i] == COLON:
+            i += 1
+            r = self.inheritance(i)
+            while r is not None:
+                (i, inheritance) = r
+                base_types.append(inheritance)
+                if symbols[i] != COMMA:
+                    break
+                r = self.inheritance(i + 1)
+
+        if symbols[i] != LBRACE:
+            return None
+        i += 1
+
+        member_vars = []
+        methods = []
+        (i, decls) = self.members(i)
+        self.add_members(decls, CppHierarchicalTypeDefinition.VISIBILITY_DEFAULT, member_vars, methods)
+
+        while symbols[i] in visibilities and symbols[i + 1] == COLON:
+            visibility = visibilities[symbols[i]]
+            (i, decls) = self.members(i + 2, identifiers=True)
+            self.add_members(decls, visibility, member_vars, methods)
+
+        # skip the rest of the body
+        while symbols[i] != RBRACE:
+            if kinds[i] == END:
+                return None
+            j = self.skip_scope(i, LBRACE)
+            i = j if j >= 0 else i + 1
+
+        return (i + 1, CppHierarchicalTypeDefinition(struct_type, name, base_types=base_types,
+                member_variables=member_vars, member_functions=methods))
+
+    @staticmethod
+    def add_members(decls, visibility, member_vars, methods):
+        for dec in decls:
+            if type(dec) == CppVarDeclaration:
+                member_vars.append(CppMember(dec, visibility))
+            elif type(dec) == CppFunctionDeclaration or type(dec) == CppFunctionDefinition:
+                methods.append(CppMember(dec, visibility))
+
+    def type_def(self, i):
+        if self.symbols[i] != TYPEDEF:
+            return None
+        i += 1
+        if self.symbols[i] == TYPENAME:
+            i += 1
+
+        r = self.type_expression(i)
+        if r is None or self.kinds[r[0]] != IDENT:
+            return None
+        (i, type_expr) = r
+        return (i + 1, CppTypeDefinition(type_expr, self.text(i)))
+
+
+# spans of the matches of further pyparsing expressions to be ignored (see
+# cpp_parser.ignore)
+def ignored_spans(source, ignored):
+    spans = []
+    for expr in ignored:
+        spans.extend((start, end) for (tokens, start, end) in expr.scanString(source))
+    return sorted(spans)
+
+# yields (definition, start, end) like cpp_parser.scan_definitions
+# budget: optional cpp_budget.ParseBudget (see cpp_parser.scan_definitions)
+def scan_definitions(source, ignored=(), budget=None):
+    tokens = TokenBuffer(source, symbols, ignored_spans(source, ignored))
+    parser = TokenParser(tokens)
+    parser.budget = budget
+
+    kinds = [ (parser.hierarchical_type_def, hierarchical_type_kinds), (parser.type_def, [TYPEDEF]) ]
+    kind_of = {}
+    for (i, (definition, keywords)) in enumerate(kinds):
+        for keyword in keywords:
+            kind_of[keyword] = i
+
+    ends = [0] * len(kinds)
+    token_symbols = tokens.symbols
+    starts = tokens.starts
+    for i in range(len(tokens)):
+        kind = kind_of.get(token_symbols[i])
+        if kind is None:
+            continue
+        start = starts[i]
+        if start < ends[kind]:
+            continue
+
+        if budget is not None:
+            if budget.exhausted:
+                return
+            budget.start_definition(start)
+        try:
+            r = kinds[kind][0](i)
+        except BudgetExceeded as exc:
+            budget.abort(exc)
+            continue
+        if r is None:
+            continue
+
+        (j, definition) = r
+        ends[kind] = tokens.ends[j - 1]
+        yield (definition, start, ends[kind])
@@ -0,0 +1,188 @@
+# typedef resolution
+#
+# expands the typedef names in type expressions to the types they alias, built
+# on the names of a cpp_index.SymbolIndex: the canonical type expression of a
+# type is the type with all typedef names (also those in template arguments
+# and in the aliased types, i.e. whole chains of typedefs) replaced by the
+# types they stand for. Other names are kept as written.
+#
+# the canonical types of the typedefs and of the type expressions asked for
+# are memoized. Each one records the last components of the names it was
+# resolved through (see SymbolIndex.resolve), so reparsing a file (see
+# update_file) only drops those resolved through the names it (re)defines.
+# Type expressions are interned (see cpp_lang), looking up an expanded type is
+# a hashed lookup.
+#
+# typedefs aliasing each other form cycles, which are reported: their names
+# are kept as written. A typedef naming itself (typedef struct Node Node; in C)
+# refers to the struct and is not a cycle.
+
+from cpp_lang import CppHierarchicalTypeDefinition, CppTypeDefinition, CppInternedType, \
+                     CppTypeExpression, CppPointerTypeExpression, TypeArgs
+
+
+class TypedefIndex:
+    def __init__(self, index):
+        self.index = index
+
+        # canonical types by (type expression, scope), and of the typedefs by
+        # qualified name: (canonical type, names resolved through), the type
+        # is None for names which are not typedefs and for cyclic typedefs
+        self.expansions = {}
+        self.typedefs = {}
+        # the keys of expansions and typedefs by the last components of the
+        # names they were resolved through
+        self.dependents = {}
+        # the typedefs of each cycle, by typedef
+        self.cycle_of = {}
+        # typedefs being expanded
+        self.expanding = []
+
+    # the typedef symbol of a qualified name, None if it is not a typedef (a
+    # class of the same name takes precedence)
+    #
+    # of a name defined by several typedefs (e.g. in headers for different
+    # platforms) the first one by path and offset counts, whatever the order
+    # in which the files were added
+    def typedef_symbol(self, name):
+        res = None
+        for symbol in self.index.lookup(name):
+            if type(symbol.definition) == CppHierarchicalTypeDefinition:
+                return None
+            if res is None or (symbol.path, symbol.start) < (res.path, res.start):
+                res = symbol
+        return res
+
+    def typedef_names(self):
+        return [ name for name in self.index.names() if self.typedef_symbol(name) is not None ]
+
+    # queries
+
+    # the canonical type of a type expression written in scope
+    def canonical_type(self, type_expr, scope=''):
+        key = (type_expr, scope)
+        try:
+            return self.expansions[key][0]
+        except KeyError:
+            pass
+
+        names = set()
+        res = self.expand(type_expr, scope, names)
+        self.memoize(self.expansions, key, res, names)
+        return res
+
+    # the canonical type a typedef (qualified name) aliases, None if name is
+    # not a typedef or a cyclic one
+    def canonical(self, name):
+        return self.typedef_type(name, set())
+
+    # the cycles (sorted lists of typedef names)
+    def cycles(self):
+        for name in self.typedef_names():
+            self.canonical(name)
+        return sorted(set(self.cycle_of.values()))
+
+    # updates
+
+    # adds, replaces (with definitions) or removes (definitions None) the
+    # definitions of a file in the index and drops the canonical types
+    # resolved through the names defined in the file
+    def update_file(self, path, definitions=None):
+        index = self.index
+        changed = set(symbol.short_name() for symbol in index.files.get(path, ()))
+        if definitions is None:
+            index.remove_file(path)
+        else:
+            index.add_file(path, definitions)
+        changed.update(symbol.short_name() for symbol in index.files.get(path, ()))
+        self.invalidate(changed)
+
+    # drops the canonical types resolved through names (last components)
+    def invalidate(self, names):
+        todo = list(names)
+        while todo:
+            for key in self.dependents.pop(todo.pop(), ()):
+                if type(key) == tuple:
+                    self.expansions.pop(key, None)
+                elif self.typedefs.pop(key, None) is not None:
+                    # the other typedefs of a cycle may not be resolved through
+                    # the name
+                    for member in self.cycle_of.pop(key, ()):
+                        if member in self.typedefs:
+                            todo.append(member.rpartition('::')[2])
+
+    # expansion
+
+    def memoize(self, memo, key, type_expr, names):
+        memo[key] = (type_expr, names)
+        for name in names:
+            try:
+                self.dependents[name].add(key)
+            except KeyError:
+                self.dependents[name] = set([ key ])
+
+    # the canonical type of a type expression, adds the last components of the
+    # names it is resolved through to names
+    def expand(self, type_expr, scope, names):
+        if type(type_expr) == CppPointerTypeExpression:
+            return CppPointerTypeExpression(self.expand(type_expr.inner_type, scope, names),
+                                            type_expr.ref_type, type_expr.ref_volatility)
+
+        template_args = tuple(self.expand(arg, scope, names) if isinstance(arg, CppInternedType) else arg
+                              for arg in type_expr.template_args)
+
+        names.add(type_expr.type_name.rpartition('::')[2])
+        name = self.index.resolve(type_expr.type_name, scope)
+        if name is not None and not template_args:
+            aliased = self.typedef_type(name, names)
+            if aliased is not None:
+                return qualified(aliased, type_expr.type_args)
+
+        return CppTypeExpression(type_expr.type_name, type_expr.type_args, template_args)
+
+    def typedef_type(self, name, names):
+        try:
+            (res, typedef_names) = self.typedefs[name]
+        except KeyError:
+            if name in self.expanding:
+                if name != self.expanding[-1]:
+                    self.add_cycle(self.expanding[self.expanding.index(name):])
+                return None
+
+            typedef_names = set([ name.rpartition('::')[2] ])
+            symbol = self.typedef_symbol(name)
+            if symbol is None:
+                res = None
+            else:
+                self.expanding.append(name)
+                try:
+                    res = self.expand(symbol.definition.type_expr, symbol.scope, typedef_names)
+                finally:
+                    self.expanding.pop()
+                if name in self.cycle_of:
+                    res = None
+            self.memoize(self.typedefs, name, res, typedef_names)
+
+        names.update(typedef_names)
+        return res
+
+    def add_cycle(self, members):
+        cycle = set(members)
+        for name in members:
+            cycle.update(self.cycle_of.get(name, ()))
+        cycle = tuple(sorted(cycle))
+        for name in cycle:
+            self.cycle_of[name] = cycle
+
+
+# the type expression with the qualifiers (TypeArgs) of a typedef name written
+# with them (const qualifies the pointer of a pointer type)
+def qualified(type_expr, type_args):
+    if not type_args:
+        return type_expr
+
+    if type(type_expr) == CppPointerTypeExpression:
+        volatility = type_expr.ref_volatility or type_args & TypeArgs.CONST_TYPE or type_args & TypeArgs.VOLATILE_TYPE
+        return CppPointerTypeExpression(type_expr.inner_type, type_expr.ref_type, volatility)
+
+    return CppTypeExpression(type_expr.type_name, type_expr.type_args | type_args, type_expr.template_args)
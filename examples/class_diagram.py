@@ -4,14 +4,23 @@ import sys; sys.path.append('..')
 
 import pyparsing as pp
 
+import cpp_budget
+import cpp_cache
+import cpp_index
+import cpp_typedefs
 import cpp_parser
 import cpp_lang
+import cpp_source
 
+import json
 import os
+import multiprocessing
+import time
 
 
 # in DSO eigen-macros tend to break things
 eigen_macro = 'EIGEN_' + pp.Word(pp.srange('[A-Z_]'))
+cpp_parser.ignore(eigen_macro)
 
 
 c_base_types = ['char', 'unsigned char', 'short', 'int', 'long', 'float', 'double', 'size_t']
@@ -34,16 +43,40 @@ def is_source_file(file_name):
     return False
 
 
+def read_source(path):
+    with cpp_source.SourceFile(path) as source:
+        return source.text
+
+
+# limits of the parse of each file (keyword arguments of cpp_budget.ParseBudget),
+# None: unlimited
+budget_limits = None
+
+
 class Node:
     def __init__(self, path):
         self.path = path
 
+    # files: already loaded File objects by path (None: load them on the way)
+    @staticmethod
+    def load_from_disk(path, files=None):
+        if os.path.isfile(path):
+            return File.load_from_disk(path) if files is None else files[path]
+        elif os.path.isdir(path):
+            return Directory.load_from_disk(path, files)
+
+    # paths of all files below path in the order in which load_from_disk visits them
     @staticmethod
-    def load_from_disk(path):
+    def source_files(path):
         if os.path.isfile(path):
-            return File.load_from_disk(path)
+            return [ path ]
         elif os.path.isdir(path):
-            return Directory.load_from_disk(path)
+            return [ file_path for name in os.listdir(path)
+                               if is_source_file(os.path.join(path, name))
+                               or  os.path.isdir(os.path.join(path, name))
+                               for file_path in Node.source_files(os.path.join(path, name)) ]
+        else:
+            return []
 
 
 class Directory(Node):
@@ -54,7 +87,10 @@ class Directory(Node):
     def internals(self):
         return ( internal for node in self.nodes for internal in node.internals() )
 
-    def render(self, keep_only=None):
+    def files(self):
+        return ( f for node in self.nodes for f in node.files() )
+
+    def render(self, keep_only=None, aliases=None):
         class_dot = [
                 'subgraph "cluster_%s" {' % self.path,
                 '\tlabel = "%s";'         % self.path
@@ -62,7 +98,7 @@ class Directory(Node):
         link_dot = []
 
         for n in self.nodes:
-            (node_class_dot, node_link_dot) = n.render(keep_only)
+            (node_class_dot, node_link_dot) = n.render(keep_only, aliases)
 
             class_dot += ['\t'+l for l in node_class_dot]
             link_dot  += node_link_dot
@@ -72,23 +108,30 @@ class Directory(Node):
         return (class_dot, link_dot)
 
     @staticmethod
-    def load_from_disk(path):
-        return Directory(path, [Node.load_from_disk(os.path.join(path, name))
+    def load_from_disk(path, files=None):
+        return Directory(path, [Node.load_from_disk(os.path.join(path, name), files)
                                     for name in os.listdir(path)
                                     if is_source_file(os.path.join(path,name))
                                     or  os.path.isdir(os.path.join(path,name))])
 
 
 class File(Node):
-    def __init__(self, path, class_defs, type_defs):
+    # definitions: the (definition, start, end) triples of the file
+    def __init__(self, path, class_defs, type_defs, parse_stats=None, definitions=()):
         super(File, self).__init__(path)
         self.class_defs = class_defs
         self.type_defs  = type_defs
+        self.definitions = definitions
+        # time, steps and aborted definitions of the parse (None: from the cache)
+        self.parse_stats = parse_stats
 
     def internals(self):
         return ( internal for obj_def in (self.class_defs + self.type_defs) for internal in obj_def.internals() )
 
-    def render(self, keep_only=None):
+    def files(self):
+        return [ self ]
+
+    def render(self, keep_only=None, aliases=None):
         # open file's subgraph
         class_dot = [
                 'subgraph "cluster_%s" {' % os.path.basename(self.path),
@@ -97,7 +140,7 @@ class File(Node):
         link_dot = []
 
         for obj_def in self.class_defs + self.type_defs:
-            (obj_class_dot, obj_link_dot) = obj_def.render(keep_only)
+            (obj_class_dot, obj_link_dot) = obj_def.render(keep_only, aliases)
 
             class_dot += ['\t'+l for l in obj_class_dot]
             link_dot  += obj_link_dot
@@ -106,22 +149,94 @@ class File(Node):
 
         return (class_dot, link_dot)
 
+    # cache: optional cpp_cache.ParseCache for the extracted definitions
     @staticmethod
-    def load_from_disk(path):
-        source_code = ''.join( open(path) )
-
-        # remove comments and preprocessor directives from the code
-        stripped_source = (cpp_parser.comment | cpp_parser.preprocessor | eigen_macro).suppress().transformString(source_code)
+    def load_from_disk(path, cache=None):
+        # the file is read once, for the cache lookup and the parse
+        source_code = read_source(path)
 
         # extract class/struct/union definitions and typedefs from the source code
-        class_finds = cpp_parser.hierarchical_type_def.searchString(stripped_source)
-        typedef_finds = cpp_parser.type_def.searchString(stripped_source)
+        # (comments, preprocessor directives and eigen-macros are skipped on the way)
+        if cache is not None:
+            definitions = cache.get(source_code)
+            if definitions is not None:
+                return File.from_definitions(path, definitions)
+
+        return File.parse_from_disk(path, cache, source_code)
+
+    # parse the file without looking it up in the cache, but store the result
+    #
+    # the parse is limited by budget_limits, definitions exceeding them are
+    # skipped (and the partial result is not stored)
+    #
+    # source_code: the text of the file if it has been read already
+    @staticmethod
+    def parse_from_disk(path, cache=None, source_code=None):
+        if source_code is None:
+            source_code = read_source(path)
+
+        budget = cpp_budget.ParseBudget(**budget_limits) if budget_limits is not None else None
+        t0 = time.perf_counter()
+        definitions = cpp_parser.extract_definitions(source_code, budget=budget)
+        stats = { 'path': path, 'time': time.perf_counter() - t0, 'steps': None, 'aborted': [] }
+        if budget is not None:
+            stats['steps'] = budget.steps
+            stats['aborted'] = [ { 'start': start, 'end': end, 'scope': scope, 'line': source_code.count('\n', 0, start) + 1 }
+                                 for (start, end, scope) in budget.aborted ]
+
+        if cache is not None and not stats['aborted']:
+            cache.put(source_code, definitions)
+
+        f = File.from_definitions(path, definitions)
+        f.parse_stats = stats
+        return f
+
+    # parse a large file in parts on the worker processes of pool (see
+    # cpp_parser.extract_definitions_parallel), limited by the per-definition
+    # limits of budget_limits
+    @staticmethod
+    def parse_in_parts(path, pool, jobs, part_size, cache=None):
+        source_code = read_source(path)
+
+        budget = cpp_budget.ParseBudget(**budget_limits) if budget_limits is not None else None
+        t0 = time.perf_counter()
+        definitions = cpp_parser.extract_definitions_parallel(source_code, jobs, part_size=part_size, pool=pool, budget=budget)
+        stats = { 'path': path, 'time': time.perf_counter() - t0, 'steps': None, 'aborted': [] }
+        if budget is not None:
+            stats['steps'] = budget.steps
+            stats['aborted'] = [ { 'start': start, 'end': end, 'scope': scope, 'line': source_code.count('\n', 0, start) + 1 }
+                                 for (start, end, scope) in budget.aborted ]
+
+        if cache is not None and not stats['aborted']:
+            cache.put(source_code, definitions)
 
-        return File(
-                path,
-                [ Class.from_class  (cf[0]) for cf in   class_finds ],
-                [ Class.from_typedef(tf[0]) for tf in typedef_finds ]
-        )
+        f = File.from_definitions(path, definitions)
+        f.parse_stats = stats
+        return f
+
+    @staticmethod
+    def from_definitions(path, definitions):
+        class_defs = []
+        type_defs = []
+        for (definition, start, end) in definitions:
+            if type(definition) == cpp_lang.CppHierarchicalTypeDefinition:
+                class_defs.append( Class.from_class(definition) )
+            else:
+                type_defs.append( Class.from_typedef(definition) )
+
+        return File(path, class_defs, type_defs, definitions=definitions)
+
+    # picklable form for the transfer from worker processes (the classes are
+    # built from the definitions again)
+    def as_tuple(self):
+        return (self.path, self.definitions, self.parse_stats)
+
+    @staticmethod
+    def from_tuple(data):
+        (path, definitions, parse_stats) = data
+        f = File.from_definitions(path, definitions)
+        f.parse_stats = parse_stats
+        return f
 
 
 class Class:
@@ -133,7 +248,7 @@ class Class:
     def internals(self):
         return [ self.identifier ]
 
-    def render(self, keep_only=None):
+    def render(self, keep_only=None, aliases=None):
         if keep_only is not None and self.identifier not in keep_only:
             return ([], [])
 
@@ -152,7 +267,7 @@ class Class:
                 )
 
         for member in self.members:
-            (member_class_dot, member_link_dot) = member.render(keep_only)
+            (member_class_dot, member_link_dot) = member.render(keep_only, aliases)
             class_dot += member_class_dot
             link_dot  += member_link_dot
 
@@ -197,16 +312,32 @@ class Class:
 
 
 class DirectedAssociation:
-    def __init__(self, orig_class_name, target_class_name, assoc_name):
+    # member_type: type expression of the member, the association points to the
+    # class of the type (of its first template element for vectors)
+    def __init__(self, orig_class_name, member_type, assoc_name):
         self.orig_class_name = orig_class_name
-        self.target_class_name = target_class_name
+        self.member_type = member_type
         self.assoc_name = assoc_name
 
-    def render(self, keep_only=None):
-        if keep_only is not None and self.target_class_name not in keep_only:
+    # aliases: cpp_typedefs.TypedefIndex the typedefs in the member type are
+    # expanded with (None: the type as written)
+    def target_class_name(self, aliases=None):
+        member_type = self.member_type
+        if aliases is not None:
+            member_type = aliases.canonical_type(member_type, self.orig_class_name)
+
+        if is_vector(member_type.content_name()):
+            # use first template element
+            # TODO: mark multiplicity
+            return member_type.template_args[0].content_name()
+        return member_type.content_name()
+
+    def render(self, keep_only=None, aliases=None):
+        target_class_name = self.target_class_name(aliases)
+        if keep_only is not None and target_class_name not in keep_only:
             return ([], [])
-        if not is_basetype(self.target_class_name):
-            link_dot = ['"%s" -> "%s" [label="%s"];' % (self.orig_class_name, self.target_class_name, self.assoc_name)]
+        if not is_basetype(target_class_name):
+            link_dot = ['"%s" -> "%s" [label="%s"];' % (self.orig_class_name, target_class_name, self.assoc_name)]
         else:
             link_dot = []
         return ([], link_dot)
@@ -217,18 +348,11 @@ class DirectedAssociation:
         member_ident = member_decl.identifier
         member_type_name = member_type.content_name()
 
-        if is_vector(member_type_name):
-            try:
-                # use first template element
-                template_type_name = member_type.template_args[0].content_name()
-                # TODO: mark multiplicity
-                return DirectedAssociation(orig_class_name, template_type_name, member_ident)
-            except IndexError:
-                print('BUG/WARNING: %s - member %s has vector type %s with empty template!' % (orig_class_name, member_ident, member_type_name))
-                return None
+        if is_vector(member_type_name) and not member_type.template_args:
+            print('BUG/WARNING: %s - member %s has vector type %s with empty template!' % (orig_class_name, member_ident, member_type_name))
+            return None
 
-        else:
-            return DirectedAssociation(orig_class_name, member_type_name, member_ident)
+        return DirectedAssociation(orig_class_name, member_type, member_ident)
 
 
 class Diagram:
@@ -236,19 +360,29 @@ class Diagram:
     # methods of Diagram class
     def __init__(self):
         self.roots = []
+        # the definitions of all files (see cpp_index) and the types their
+        # typedefs stand for
+        self.index = cpp_index.SymbolIndex()
+        self.aliases = cpp_typedefs.TypedefIndex(self.index)
 
-    def add_path(self, path):
-        self.roots.append( Node.load_from_disk(path) )
+    def add_path(self, path, files=None):
+        node = Node.load_from_disk(path, files)
+        self.roots.append(node)
+        for f in node.files():
+            self.aliases.update_file(f.path, f.definitions)
 
     def internals(self):
         return (internal for root in self.roots for internal in root.internals())
 
-    def render(self, keep_only=None):
+    def files(self):
+        return (f for root in self.roots for f in root.files())
+
+    def render(self, keep_only=None, aliases=None):
         class_dot = []
         link_dot = []
 
         for node in self.roots:
-            (node_class_dot, node_link_dot) = node.render(keep_only)
+            (node_class_dot, node_link_dot) = node.render(keep_only, aliases)
             class_dot += node_class_dot
             link_dot  += node_link_dot
 
@@ -261,23 +395,203 @@ class Diagram:
 
     def render_file(self, file_path, with_externals=False):
         with open(file_path, 'w') as f:
+            # the members are associated with the classes their typedefs stand for
             if with_externals:
-                f.write( '\n'.join(self.render()) )
+                f.write( '\n'.join(self.render(aliases=self.aliases)) )
             else:
-                ints = list(self.internals())
-                f.write( '\n'.join(self.render(keep_only=ints)) )
+                # the index has hashed lookups of the names of the classes
+                f.write( '\n'.join(self.render(keep_only=self.index, aliases=self.aliases)) )
         return
 
     @staticmethod
-    def from_pathlist(paths):
+    def from_pathlist(paths, jobs=1, cache=None, split_size=None):
         d = Diagram()
 
+        # load all files (from the cache or in worker processes) first, the tree
+        # is built afterwards
+        files = None
+        if jobs > 1 or cache is not None:
+            files = load_files(
+                    [ file_path for path in paths for file_path in Node.source_files(path) ],
+                    jobs,
+                    cache,
+                    split_size
+            )
+
         for path in paths:
-            d.add_path(path)
+            d.add_path(path, files)
 
         return d
 
 
+# cache of a worker process
+worker_cache = None
+
+def init_worker(cache_dir, cache_size, engine, limits):
+    global worker_cache, budget_limits
+    cpp_parser.default_engine = engine
+    budget_limits = limits
+    if cache_dir is not None:
+        worker_cache = cpp_cache.ParseCache(cache_dir, cache_size)
+
+# the file and the change of the statistics of the worker's cache (None
+# without cache), which are added to those of the cache of the main process
+def load_file_tuple(path):
+    if worker_cache is None:
+        return (File.parse_from_disk(path).as_tuple(), None)
+
+    before = worker_cache.counts()
+    data = File.parse_from_disk(path, worker_cache).as_tuple()
+    counts = dict((name, value - before[name]) for (name, value) in worker_cache.counts().items())
+    return (data, counts)
+
+# load files, returns the File objects by path
+#
+# files found in the cache are loaded directly, the others are parsed by a pool
+# of jobs worker processes (which store their results in the cache). Files of
+# at least split_size bytes are split into parts parsed by all workers.
+def load_files(paths, jobs=1, cache=None, split_size=None):
+    files = {}
+    if jobs <= 1:
+        for path in paths:
+            files[path] = File.load_from_disk(path, cache)
+        return files
+
+    missing = []
+    for path in paths:
+        definitions = cache.get(read_source(path)) if cache is not None else None
+        if definitions is None:
+            missing.append(path)
+        else:
+            files[path] = File.from_definitions(path, definitions)
+
+    large = []
+    if split_size is not None:
+        large = [ path for path in missing if os.path.getsize(path) >= split_size ]
+        missing = [ path for path in missing if path not in large ]
+
+    if len(missing) <= 1 and not large:
+        for path in missing:
+            files[path] = File.parse_from_disk(path, cache)
+        return files
+
+    chunksize = max(1, len(missing) // (4 * jobs))
+    pool = multiprocessing.Pool(
+            jobs,
+            initializer=init_worker,
+            initargs=((cache.directory, cache.max_size) if cache is not None else (None, None)) \
+                   + (cpp_parser.default_engine, budget_limits)
+    )
+    try:
+        for path in large:
+            files[path] = File.parse_in_parts(path, pool, jobs, max(1, split_size // jobs), cache)
+        for (data, counts) in pool.imap(load_file_tuple, missing, chunksize):
+            files[data[0]] = File.from_tuple(data)
+            if counts is not None:
+                cache.add_counts(counts)
+    finally:
+        pool.close()
+        pool.join()
+
+    return files
+
+
+# summary of the parse statistics of the files (see File.parse_stats): the
+# slowest files and those with aborted definitions are written to stderr, all
+# statistics to the JSON file json_path (if given)
+def report_parse_stats(files, slowest=10, json_path=None):
+    stats = sorted(( f.parse_stats for f in files if f.parse_stats is not None ),
+                   key=lambda st: -st['time'])
+    aborted = [ st for st in stats if st['aborted'] ]
+
+    lines = [ 'parsed %d file(s) in %.3fs, %d with aborted definitions' % (len(stats), sum(st['time'] for st in stats), len(aborted)) ]
+    if stats and slowest > 0:
+        lines.append('slowest files:')
+        for st in stats[:slowest]:
+            lines.append('  %8.3fs  %s' % (st['time'], st['path']))
+    for st in aborted:
+        for a in st['aborted']:
+            lines.append('aborted: %s:%d (offsets %d-%d, %s budget exceeded)' % (st['path'], a['line'], a['start'], a['end'], a['scope']))
+    sys.stderr.write('\n'.join(lines) + '\n')
+
+    if json_path is not None:
+        with open(json_path, 'w') as f:
+            json.dump({ 'files': stats, 'aborted': [ st['path'] for st in aborted ] }, f, indent=2)
+
+
+# keeps a diagram up to date with the source files
+#
+# the files are polled for changes of their modification time or size, changed
+# files are reparsed and the diagram is written again
+class Watcher:
+    def __init__(self, paths, output_file, jobs=1, cache=None, with_externals=False, split_size=None):
+        self.paths = paths
+        self.output_file = output_file
+        self.jobs = jobs
+        self.cache = cache
+        self.with_externals = with_externals
+        self.split_size = split_size
+
+        self.stats = self.snapshot()
+        self.diagram = Diagram.from_pathlist(paths, jobs=jobs, cache=cache, split_size=split_size)
+        self.diagram.render_file(output_file, with_externals)
+
+    # (modification time, size) of all source files by path
+    def snapshot(self):
+        stats = {}
+        for path in self.paths:
+            for file_path in Node.source_files(path):
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                stats[file_path] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    # reparses the files changed since the last update and rewrites the diagram,
+    # returns the paths of the changed (including added and removed) files
+    def update(self):
+        stats = self.snapshot()
+        changed = [ path for (path, st) in stats.items() if self.stats.get(path) != st ]
+        removed = [ path for path in self.stats if path not in stats ]
+        self.stats = stats
+
+        if not changed and not removed:
+            return []
+
+        reparsed = load_files(changed, self.jobs, self.cache, self.split_size)
+
+        files = { f.path: f for f in self.diagram.files() }
+        if removed or any(path not in files for path in changed):
+            # files were added or removed, the tree has to be rebuilt
+            for path in removed:
+                files.pop(path, None)
+            files.update(reparsed)
+
+            self.diagram = Diagram()
+            for path in self.paths:
+                self.diagram.add_path(path, files)
+        else:
+            for (path, f) in reparsed.items():
+                files[path].class_defs = f.class_defs
+                files[path].type_defs  = f.type_defs
+                files[path].definitions = f.definitions
+                self.diagram.aliases.update_file(path, f.definitions)
+
+        self.diagram.render_file(self.output_file, self.with_externals)
+        return changed + removed
+
+    def run(self, interval=0.5):
+        while True:
+            time.sleep(interval)
+
+            t0 = time.perf_counter()
+            changed = self.update()
+            if changed:
+                sys.stderr.write('updated %s, %d file(s) changed, %.3fs\n'
+                        % (self.output_file, len(changed), time.perf_counter() - t0))
+
+
 if __name__ == '__main__':
 
     import argparse
@@ -295,8 +609,112 @@ if __name__ == '__main__':
             nargs='+',
             help='files or directories in which contain the source code to render'
     )
+    parser.add_argument(
+            '-j', '--jobs',
+            type=int,
+            default=1,
+            help='number of worker processes parsing the source files'
+    )
+    parser.add_argument(
+            '--cache-dir',
+            help='directory of a persistent cache for the parsed files'
+    )
+    parser.add_argument(
+            '--cache-size',
+            type=int,
+            default=cpp_cache.ParseCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+            help='maximal size of the cache in MB'
+    )
+    parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='keep running and update the diagram whenever source files change'
+    )
+    parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='seconds between two checks for changed files in watch mode'
+    )
+    parser.add_argument(
+            '--engine',
+            choices=sorted(cpp_parser.engines),
+            default=cpp_parser.default_engine,
+            help='parser engine (see cpp_parser.engines)'
+    )
+    parser.add_argument(
+            '--split-size',
+            type=float,
+            help='with several jobs, files of at least this size in MB are split and parsed by all of them'
+    )
+    parser.add_argument(
+            '--time-budget',
+            type=float,
+            help='seconds after which the parse of a file is aborted (its definitions found so far are kept)'
+    )
+    parser.add_argument(
+            '--step-budget',
+            type=int,
+            help='parser steps after which the parse of a file is aborted'
+    )
+    parser.add_argument(
+            '--definition-time-budget',
+            type=float,
+            help='seconds after which a single definition is skipped'
+    )
+    parser.add_argument(
+            '--definition-step-budget',
+            type=int,
+            help='parser steps after which a single definition is skipped'
+    )
+    parser.add_argument(
+            '--slowest',
+            type=int,
+            help='number of slowest files listed in the parse summary (default: 10, with budgets)'
+    )
+    parser.add_argument(
+            '--parse-report',
+            help='JSON file for the parse statistics of all files'
+    )
     args = parser.parse_args()
 
-    diag = Diagram.from_pathlist(args.source_files)
-    diag.render_file(args.output_file)
+    cpp_parser.default_engine = args.engine
+
+    if args.split_size is not None and args.split_size <= 0:
+        parser.error('--split-size must be positive')
+    split_size = int(args.split_size * 1024 * 1024) if args.split_size is not None else None
+
+    limits = {
+        'time':             args.time_budget,
+        'steps':            args.step_budget,
+        'definition_time':  args.definition_time_budget,
+        'definition_steps': args.definition_step_budget
+    }
+    if any(limit is not None for limit in limits.values()):
+        budget_limits = limits
+
+    # the parse summary is written with budgets or on request
+    report = budget_limits is not None or args.slowest is not None or args.parse_report is not None
+    slowest = args.slowest if args.slowest is not None else 10
+
+    cache = None
+    if args.cache_dir:
+        cache = cpp_cache.ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    if args.watch:
+        watcher = Watcher(args.source_files, args.output_file, jobs=args.jobs, cache=cache, split_size=split_size)
+        if report:
+            report_parse_stats(watcher.diagram.files(), slowest, args.parse_report)
+        try:
+            watcher.run(args.interval)
+        except KeyboardInterrupt:
+            pass
+    else:
+        diag = Diagram.from_pathlist(args.source_files, jobs=args.jobs, cache=cache, split_size=split_size)
+        diag.render_file(args.output_file)
+        if report:
+            report_parse_stats(diag.files(), slowest, args.parse_report)
+
+    if cache is not None:
+        sys.stderr.write(cache.stats_str() + '\n')
 
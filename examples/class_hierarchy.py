@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+# queries on the inheritance graph of source files (see cpp_inheritance): the
+# base classes and derived classes of classes, whether a class derives from
+# another, and the cycles and unknown base classes of the hierarchy
+
+import sys; sys.path.append('..')
+
+import cpp_index
+import cpp_inheritance
+import cpp_parser
+import cpp_source
+
+from class_diagram import Node
+
+import argparse
+
+parser = argparse.ArgumentParser(
+        description='query the inheritance graph of source files'
+)
+parser.add_argument('paths', nargs='+', help='source files or directories')
+parser.add_argument(
+        '--show',
+        action='append',
+        default=[],
+        metavar='CLASS',
+        help='list the ancestors and descendants of a class'
+)
+parser.add_argument(
+        '--is-derived',
+        nargs=2,
+        action='append',
+        default=[],
+        metavar=('CLASS', 'BASE'),
+        help='whether CLASS derives from BASE'
+)
+parser.add_argument(
+        '--engine',
+        choices=sorted(cpp_parser.engines),
+        default=cpp_parser.default_engine,
+        help='parser engine (see cpp_parser.engines)'
+)
+args = parser.parse_args()
+
+index = cpp_index.SymbolIndex()
+for path in args.paths:
+    for file_path in Node.source_files(path):
+        with cpp_source.SourceFile(file_path) as source:
+            index.add_file(file_path, cpp_parser.extract_definitions(source.text, args.engine))
+
+graph = cpp_inheritance.InheritanceGraph(index)
+print('%d classes in %d files' % (len(graph.base_sets), len(index.files)))
+
+def resolve(name):
+    resolved = index.resolve(name)
+    if resolved is None or resolved not in graph:
+        sys.stderr.write('unknown class %s\n' % name)
+        sys.exit(1)
+    return resolved
+
+for name in args.show:
+    name = resolve(name)
+    print('%s:' % name)
+    print('  bases:       %s' % ', '.join(sorted(graph.bases(name))))
+    print('  ancestors:   %s' % ', '.join(sorted(graph.ancestors(name))))
+    print('  derived:     %s' % ', '.join(sorted(graph.derived(name))))
+    print('  descendants: %s' % ', '.join(sorted(graph.descendants(name))))
+
+for (name, base) in args.is_derived:
+    print('%s derives from %s: %s' % (name, base, graph.is_derived(resolve(name), resolve(base))))
+
+for cycle in graph.cycles():
+    print('cycle: %s' % ' <-> '.join(cycle))
+for (name, base) in graph.unknown_bases():
+    print('unknown base class of %s: %s' % (name, base))
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+
+# writes the definitions of source files to serialized files (see
+# cpp_serialize) for tools which should not parse the sources again, or lists
+# the definitions of such files
+#
+# every source is streamed through the parser, each definition is written as
+# soon as it is found
+
+import sys; sys.path.append('..')
+
+import os
+
+import cpp_lang
+import cpp_printer
+import cpp_serialize
+
+import argparse
+
+parser = argparse.ArgumentParser(
+        description='export the definitions of source files, or list those of exported files'
+)
+parser.add_argument('files', nargs='+', help='source files (or exported files with --show)')
+parser.add_argument(
+        '--output-dir',
+        default='.',
+        help='directory of the exported files (named after the sources)'
+)
+parser.add_argument(
+        '--format',
+        choices=sorted(cpp_serialize.writers),
+        default='binary',
+        help='encoding of the exported files'
+)
+parser.add_argument(
+        '--engine',
+        help='parser engine (see cpp_parser.engines)'
+)
+parser.add_argument('--show', action='store_true', help='list the definitions of exported files')
+args = parser.parse_args()
+
+if args.show:
+    # loading does not need the parser
+    printer = cpp_printer.CppPrinter()
+    for path in args.files:
+        (header, definitions) = cpp_serialize.load(path)
+        print('%s: %d definitions of %s' % (path, len(definitions), header.get('path')))
+        for (definition, start, end) in definitions:
+            if type(definition) == cpp_lang.CppHierarchicalTypeDefinition:
+                print('  %6d class %s (%d members, %d methods)' % (start, definition.name,
+                        len(definition.member_variables), len(definition.member_functions)))
+            else:
+                print('  %6d typedef %s %s' % (start, printer.type_expr_str(definition.type_expr), definition.type_name))
+    sys.exit(0)
+
+import cpp_parser
+
+extension = dict((encoding, ext) for (ext, encoding) in cpp_serialize.extensions.items())[args.format]
+engine = args.engine or cpp_parser.default_engine
+
+for path in args.files:
+    output = os.path.join(args.output_dir, os.path.basename(path) + extension)
+    count = cpp_serialize.dump(
+            cpp_parser.iter_definitions(path, engine=engine),
+            output,
+            { 'path': os.path.abspath(path), 'grammar': cpp_parser.grammar_key(engine) },
+            args.format
+    )
+    print('%s: %d definitions -> %s' % (path, count, output))
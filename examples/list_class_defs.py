@@ -4,9 +4,11 @@ import sys; sys.path.append('..')
 
 import os
 
+import cpp_cache
 import cpp_printer
 import cpp_parser
 import cpp_lang
+import cpp_source
 
 import argparse
 
@@ -14,23 +16,61 @@ parser = argparse.ArgumentParser(
         description='list class definitions in a source file'
 )
 parser.add_argument('source_file')
+parser.add_argument(
+        '--cache-dir',
+        help='directory of a persistent cache for the parsed files'
+)
+parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=cpp_cache.ParseCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+        help='maximal size of the cache in MB'
+)
+parser.add_argument(
+        '--engine',
+        choices=sorted(cpp_parser.engines),
+        default=cpp_parser.default_engine,
+        help='parser engine (see cpp_parser.engines)'
+)
+parser.add_argument(
+        '--packrat',
+        type=int,
+        default=0,
+        metavar='ENTRIES',
+        help='memoize the productions in a packrat cache of the given size (pyparsing engine)'
+)
 args = parser.parse_args()
 
-# load source file
-source_code = '\n'.join( open(args.source_file) )
+if args.packrat:
+    cpp_parser.enable_packrat(args.packrat)
+
+source = cpp_source.SourceFile(args.source_file)
 
-# remove comments and preprocessor directives from the code
-stripped_source = (cpp_parser.comment | cpp_parser.preprocessor).suppress().transformString(source_code)
+# extract the definitions (comments and preprocessor directives are skipped)
+cache = None
+if args.cache_dir:
+    cache = cpp_cache.ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    definitions = cache.definitions(source.text, args.engine)
+else:
+    # stream the mapped file instead of decoding it as a whole
+    definitions = cpp_parser.iter_definitions(source.stream(), engine=args.engine)
 
 printer = cpp_printer.CppPrinter()
-classes = (cpp_parser.hierarchical_type_def).searchString(stripped_source)
+classes = [ (definition, start) for (definition, start, end) in definitions
+                                if type(definition) == cpp_lang.CppHierarchicalTypeDefinition ]
 
 print('found %d classes:' % len(classes))
 
-for (i, cl) in enumerate(classes):
+for (i, (cl, start)) in enumerate(classes):
     print('-------------------')
     print('--- %2d ------------' % i)
     print('-------------------')
-    if type(cl[0]) == cpp_lang.CppHierarchicalTypeDefinition:
-        print(printer.hierarchical_type_str(cl[0]))
+    print('%s:%d:%d' % ((args.source_file,) + source.location(start)))
+    print(printer.hierarchical_type_str(cl))
+
+if cache is not None:
+    sys.stderr.write(cache.stats_str() + '\n')
 
+if cpp_parser.packrat is not None:
+    sys.stderr.write('packrat: %(hits)d hits, %(misses)d misses (%(hit_rate).1f%%), %(evictions)d evictions\n'
+                     % dict(cpp_parser.packrat.stats(), hit_rate=100 * cpp_parser.packrat.hit_rate()))
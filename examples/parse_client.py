@@ -0,0 +1,59 @@
+#!/usr/bin/python
+
+# sends parse requests to a parse server (see parse_server.py) and prints the
+# JSON responses, one per line
+#
+# only imports cpp_client, so it starts without building the grammar
+
+import sys; sys.path.append('..')
+
+import json
+import os
+
+import cpp_client
+
+import argparse
+
+parser = argparse.ArgumentParser(
+        description='query a parse server on a Unix socket'
+)
+parser.add_argument('socket_path')
+parser.add_argument('source_files', nargs='*')
+parser.add_argument(
+        '--stdin',
+        action='store_true',
+        help='parse the source read from stdin (e.g. an unsaved editor buffer)'
+)
+parser.add_argument(
+        '--engine',
+        help='parser engine (default: that of the server)'
+)
+parser.add_argument('--stats',    action='store_true', help='print the statistics of the server')
+parser.add_argument('--shutdown', action='store_true', help='stop the server')
+parser.add_argument(
+        '--latency',
+        action='store_true',
+        help='write the round trip and server time of each request to stderr'
+)
+args = parser.parse_args()
+
+def output(response):
+    sys.stdout.write(json.dumps(response) + '\n')
+    if args.latency:
+        sys.stderr.write('%s: %.2fms round trip, %.2fms in the server\n'
+                         % (response.get('id'), 1000 * client.latency, 1000 * response['time']))
+
+try:
+    with cpp_client.ParseClient(args.socket_path) as client:
+        if args.stdin:
+            output(client.parse_source(sys.stdin.read(), engine=args.engine))
+        for path in args.source_files:
+            # the server may run in another directory
+            output(client.parse_file(os.path.abspath(path), engine=args.engine))
+        if args.stats:
+            output(client.stats())
+        if args.shutdown:
+            output(client.shutdown())
+except (OSError, cpp_client.ServerError) as e:
+    sys.stderr.write('error: %s\n' % e)
+    sys.exit(1)
@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+# serves parse requests on a Unix socket (see cpp_server, parse_client.py)
+
+import sys; sys.path.append('..')
+
+import cpp_cache
+import cpp_parser
+import cpp_server
+
+import argparse
+
+parser = argparse.ArgumentParser(
+        description='run a parse server with a warm grammar on a Unix socket'
+)
+parser.add_argument('socket_path')
+parser.add_argument(
+        '--engine',
+        choices=sorted(cpp_parser.engines),
+        default=cpp_parser.default_engine,
+        help='default parser engine of the requests (see cpp_parser.engines)'
+)
+parser.add_argument(
+        '--cache-dir',
+        help='directory of a persistent cache for the parsed files'
+)
+parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=cpp_cache.ParseCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+        help='maximal size of the cache in MB'
+)
+parser.add_argument(
+        '--packrat',
+        action='store_true',
+        help='memoize the productions in a packrat cache of each parser'
+)
+parser.add_argument(
+        '--log',
+        action='store_true',
+        help='write a line with the latency of each request to stderr'
+)
+args = parser.parse_args()
+
+cache = None
+if args.cache_dir:
+    cache = cpp_cache.ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+try:
+    cpp_server.serve(args.socket_path, args.engine, cache, args.packrat, sys.stderr if args.log else None)
+except KeyboardInterrupt:
+    pass
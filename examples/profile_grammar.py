@@ -0,0 +1,33 @@
+#!/usr/bin/python
+
+import sys; sys.path.append('..')
+
+import cpp_parser
+import cpp_profiler
+import cpp_source
+
+import argparse
+
+parser = argparse.ArgumentParser(
+        description='profile the grammar productions while extracting the definitions of a source file'
+)
+parser.add_argument('source_file')
+parser.add_argument(
+        '--json',
+        help='write the statistics as JSON to this file instead of printing a report'
+)
+args = parser.parse_args()
+
+with cpp_source.SourceFile(args.source_file) as source:
+    source_code = source.text
+
+profiler = cpp_profiler.GrammarProfiler()
+with profiler:
+    definitions = cpp_parser.extract_definitions(source_code)
+
+if args.json:
+    with open(args.json, 'w') as f:
+        f.write(profiler.as_json())
+else:
+    print('%d definitions in %s' % (len(definitions), args.source_file))
+    print(profiler.report())
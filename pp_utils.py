@@ -1,5 +1,11 @@
+import collections
+import re
+import threading
+
 import pyparsing as pp
 
+import cpp_lexer
+
 # match unparsed scopes
 def get_scope(start, end):
     scope = pp.Forward()
@@ -8,6 +14,49 @@ def get_scope(start, end):
             + pp.Literal(end)
     return scope
 
+# skip an unparsed scope in a single linear scan for the matching bracket
+#
+# brackets inside of string/char literals and comments are not counted, nothing
+# is tokenized: the match either returns no tokens or, with span=True, a single
+# (start, end) tuple of offsets (including the brackets)
+class SkipScope(pp.Token):
+    def __init__(self, start, end, span=False):
+        super(SkipScope, self).__init__()
+        self.start = start
+        self.end = end
+        self.span = span
+        self.regex = re.compile(
+                '|'.join([cpp_lexer.string_literal, cpp_lexer.char_literal, cpp_lexer.c_comment, cpp_lexer.cpp_comment])
+                + '|(?P<bracket>' + re.escape(start) + '|' + re.escape(end) + ')'
+        )
+
+        self.name = start + '...' + end
+        self.errmsg = 'Expected ' + self.name
+        self.mayReturnEmpty = False
+        self.mayIndexError = False
+
+    def parseImpl(self, instring, loc, doActions=True):
+        if not instring.startswith(self.start, loc):
+            raise pp.ParseException(instring, loc, self.errmsg, self)
+
+        depth = 1
+        for m in self.regex.finditer(instring, loc + len(self.start)):
+            bracket = m.group('bracket')
+            if bracket is None:
+                continue
+            elif bracket == self.start:
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    end = m.end()
+                    return end, ([(loc, end)] if self.span else [])
+
+        raise pp.ParseException(instring, loc, 'Unbalanced ' + self.name, self)
+
+def skip_scope(start, end, span=False):
+    return SkipScope(start, end, span=span)
+
 def get_separated_list(sep, expr, min_len=0):
     if min_len == 0:
         return pp.Optional(expr + pp.ZeroOrMore(sep + expr))
@@ -18,3 +67,119 @@ def get_separated_list(sep, expr, min_len=0):
 
 def csl(expr, min_len=0):
     return get_separated_list(pp.Literal(',').suppress(), expr, min_len=min_len)
+
+# bounded memoization of the results of parser elements (packrat parsing)
+#
+# unlike pp.ParserElement.enablePackrat the memoization is restricted to the
+# given elements (see memoize) and each cache is separate. The entries are
+# keyed by the input string as well, a cache can be used by several threads
+# parsing different strings (e.g. that of the module grammar, see
+# cpp_parser.enable_packrat). Reset it before parsing another string to drop
+# the entries of the previous one.
+#
+# size: maximum number of entries, eviction: 'lru' or 'fifo'
+class PackratCache:
+    def __init__(self, size=4096, eviction='lru'):
+        if eviction not in ('lru', 'fifo'):
+            raise ValueError('unknown eviction policy: ' + eviction)
+        self.size = size
+        self.eviction = eviction
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # forget all entries (keeps the statistics), call before parsing another string
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            if self.eviction == 'lru':
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'eviction': self.eviction,
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate()
+        }
+
+# replacement of element._parse which memoizes its results (and failures) in cache
+def memoized_parse(element, cache):
+    parse = element._parseNoCache
+    def _parse(instring, loc, doActions=True, callPreParse=True):
+        key = (element, instring, loc, doActions, callPreParse)
+        try:
+            value = cache.get(key)
+        except KeyError:
+            try:
+                value = parse(instring, loc, doActions, callPreParse)
+            except pp.ParseBaseException as pe:
+                cache.put(key, pe.__class__(*pe.args))
+                raise
+            cache.put(key, (value[0], value[1].copy()))
+            return value
+
+        if isinstance(value, Exception):
+            raise value
+        return (value[0], value[1].copy())
+    return _parse
+
+# memoizes the results of the elements in cache
+def memoize(elements, cache):
+    for e in elements:
+        e._parse = memoized_parse(e, cache)
+
+# undoes memoize
+def unmemoize(elements):
+    for e in elements:
+        if '_parse' in vars(e):
+            del e._parse
+
+# calls budget.step(loc) (see cpp_budget) before every attempt of the elements
+#
+# returns the previous state of the elements for unlimit
+def limit(elements, budget):
+    saved = [ (e, vars(e).get('_parse')) for e in elements ]
+    for e in elements:
+        e._parse = budgeted_parse(e._parse, budget)
+    return saved
+
+def budgeted_parse(parse, budget):
+    def _parse(instring, loc, doActions=True, callPreParse=True):
+        budget.step(loc)
+        return parse(instring, loc, doActions, callPreParse)
+    return _parse
+
+# undoes limit
+def unlimit(saved):
+    for (e, parse) in saved:
+        if parse is None:
+            del e._parse
+        else:
+            e._parse = parse
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+# round trips of type expressions with pointer and reference template
+# arguments (std::vector<B*>, std::map<int, const C&>): for every engine the
+# arguments must be parsed as pointer type expressions, printed as written
+# (cpp_printer) and parsed back to the same (interned) types, and come back
+# unchanged from both serialized encodings (cpp_serialize)
+#
+# run with pytest, or as a script (exits non-zero on a mismatch)
+
+import os
+import sys; sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import tempfile
+
+import cpp_lang
+import cpp_parser
+import cpp_printer
+import cpp_serialize
+
+from cpp_lang import CppPointerTypeExpression
+
+
+# member declarations: (declaration, type as printed, template argument
+# expected to be a pointer or reference with its ref_type)
+samples = [
+    ('std::vector<B*> v',                'std::vector<B *>',              (0, CppPointerTypeExpression.POINTER_VAR)),
+    ('std::map<int, const C&> m',        'std::map<int, const C &>',      (1, CppPointerTypeExpression.REFERENCE_VAR)),
+    ('std::vector<D**> d',               'std::vector<D **>',             (0, CppPointerTypeExpression.POINTER_VAR)),
+    ('std::map<E*, std::vector<F&> > e', 'std::map<E *, std::vector<F &>>', (0, CppPointerTypeExpression.POINTER_VAR)),
+    ('std::array<G*, 3> g',              'std::array<G *, 3>',            (0, CppPointerTypeExpression.POINTER_VAR)),
+    ('std::vector<H> h',                 'std::vector<H>',                None),
+]
+
+def class_source(declarations):
+    return 'class A {\n' + ''.join('    %s;\n' % declaration for declaration in declarations) + '};\n'
+
+def member_types(source, engine):
+    definitions = cpp_parser.extract_definitions(source, engine)
+    return [ m.member_decl.data_type for m in definitions[0][0].member_variables ]
+
+source = class_source([ declaration for (declaration, printed, pointer_arg) in samples ])
+
+
+def test_parsed_as_pointers():
+    for engine in sorted(cpp_parser.engines):
+        types = member_types(source, engine)
+        assert len(types) == len(samples), engine
+        for ((declaration, printed, pointer_arg), type_expr) in zip(samples, types):
+            if pointer_arg is not None:
+                (i, ref_type) = pointer_arg
+                arg = type_expr.template_args[i]
+                assert type(arg) == CppPointerTypeExpression and arg.ref_type == ref_type, (engine, declaration, arg)
+
+def test_printed_as_written():
+    printer = cpp_printer.CppPrinter()
+    for engine in sorted(cpp_parser.engines):
+        for ((declaration, printed, pointer_arg), type_expr) in zip(samples, member_types(source, engine)):
+            assert printer.type_expr_str(type_expr) == printed, (engine, declaration)
+
+def test_printed_parse_back():
+    printer = cpp_printer.CppPrinter()
+    for engine in sorted(cpp_parser.engines):
+        definitions = cpp_parser.extract_definitions(source, engine)
+        printed = [ printer.declaration_str(m.member_decl) for m in definitions[0][0].member_variables ]
+        assert member_types(class_source(printed), engine) == member_types(source, engine), engine
+
+def test_serialized_round_trip():
+    tmp = tempfile.mkdtemp()
+    try:
+        for engine in sorted(cpp_parser.engines):
+            expected = cpp_parser.extract_definitions(source, engine)
+            for extension in sorted(cpp_serialize.extensions):
+                path = os.path.join(tmp, 'types' + extension)
+                cpp_serialize.dump(expected, path)
+                (header, res) = cpp_serialize.load(path)
+                assert [ cpp_lang.structure(d) for d in res ] == [ cpp_lang.structure(d) for d in expected ], \
+                       (engine, header['encoding'])
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+
+    failures = 0
+    for test in [ test_parsed_as_pointers, test_printed_as_written, test_printed_parse_back, test_serialized_round_trip ]:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print('MISMATCH: %s %s' % (test.__name__, e))
+
+    print('%d samples, %d engines: %d failures' % (len(samples), len(cpp_parser.engines), failures))
+    sys.exit(1 if failures else 0)